@@ -1,26 +1,198 @@
-from django.contrib import admin
-from .models import Customer, WasteItem, Bill, Feedback
+import base64
+import io
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db import router
+from django.http import FileResponse, Http404
+from django.shortcuts import redirect, render
+from django.urls import path
+from .models import Customer, WasteItem, Bill, BillItem, Feedback
+from .forms import BillItemForm, CustomerImportUploadForm, PaymentStatementUploadForm
+from .customer_import import detect_format, import_customers
+from .billing import set_bill_items
+from .qr_sheets import SheetJobLimit, sheet_jobs, sheets_dir, start_sheet_job
+from .reconciliation import reconcile_payments
+from .search import find_exact_customer, get_search_backend
+from .sqlite_backend.base import deferred_transactions
+
+
+class ReadOnlyFormsMixin:
+    """
+    The change and delete views run in an atomic block even on GET, where
+    they only read; keep those on a deferred BEGIN so they don't wait for
+    the SQLite write lock (core.sqlite_backend).
+    """
+
+    def changeform_view(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().changeform_view(request, *args, **kwargs)
+        with deferred_transactions(router.db_for_write(self.model)):
+            return super().changeform_view(request, *args, **kwargs)
+
+    def delete_view(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().delete_view(request, *args, **kwargs)
+        with deferred_transactions(router.db_for_write(self.model)):
+            return super().delete_view(request, *args, **kwargs)
+
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(ReadOnlyFormsMixin, admin.ModelAdmin):
     list_display = ('name', 'customer_type', 'monthly_rate', 'email')
     search_fields = ('name', 'email')
     list_filter = ('customer_type',)
+    actions = ['download_qr_sheets']
+    change_list_template = 'admin/core/customer/change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='core_customer_import'),
+            path('qr-sheets/', self.admin_site.admin_view(self.qr_sheets_view), name='core_customer_qr_sheets'),
+            path('qr-sheets/<str:name>/', self.admin_site.admin_view(self.qr_sheet_download),
+                 name='core_customer_qr_sheet_download'),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        """Upload a CSV/XLSX file and run it through core.customer_import."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = CustomerImportUploadForm(request.POST or None, request.FILES or None)
+        context = {**self.admin_site.each_context(request), 'opts': self.model._meta,
+                   'title': 'Import customers', 'form': form}
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            rejects = io.StringIO()
+            try:
+                stats = import_customers(upload.file, fmt=detect_format(upload.name), rejects=rejects)
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(request, f"{stats['created']} customers imported, {stats['rejected']} rejected.")
+                context['stats'] = stats
+                if stats['rejected']:
+                    csv_text = rejects.getvalue()
+                    context['rejects_preview'] = csv_text.splitlines()[:101]
+                    context['rejects_download'] = base64.b64encode(csv_text.encode()).decode()
+        return render(request, 'admin/core/customer/import.html', context)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Exact ID/phone or the full-text index instead of LIKE scans
+        if not search_term.strip():
+            return queryset, False
+        exact = find_exact_customer(search_term)
+        if exact is not None:
+            return queryset.filter(pk=exact.pk), False
+        return get_search_backend().filter_customers(queryset, search_term), False
+
+    @admin.action(description="Generate printable QR sheets (PDF)")
+    def download_qr_sheets(self, request, queryset):
+        # Thousands of codes take minutes to render, so the command runs in a
+        # background process and the PDF is fetched from the QR sheets page
+        try:
+            name = start_sheet_job(queryset)
+        except SheetJobLimit as e:
+            messages.error(request, str(e))
+        else:
+            messages.success(request, f"Generating {name}; it is listed below once it is ready.")
+        return redirect('admin:core_customer_qr_sheets')
+
+    def qr_sheets_view(self, request):
+        """QR sheet PDFs generated by the admin action, newest first."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        context = {**self.admin_site.each_context(request), 'opts': self.model._meta,
+                   'title': 'QR sheets', 'jobs': sheet_jobs()}
+        return render(request, 'admin/core/customer/qr_sheets.html', context)
+
+    def qr_sheet_download(self, request, name):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        if name not in {job['name'] for job in sheet_jobs() if job['status'] == 'ready'}:
+            raise Http404("No such QR sheet PDF.")
+        return FileResponse(open(sheets_dir() / name, 'rb'), as_attachment=True, filename=name)
 
 @admin.register(WasteItem)
-class WasteItemAdmin(admin.ModelAdmin):
+class WasteItemAdmin(ReadOnlyFormsMixin, admin.ModelAdmin):
     list_display = ('name', 'unit_price')
     search_fields = ('name',)
 
+class BillItemInline(admin.TabularInline):
+    model = BillItem
+    form = BillItemForm
+    extra = 1
+    fields = ('waste_item', 'quantity', 'amount')
+    readonly_fields = ('amount',)
+
 @admin.register(Bill)
-class BillAdmin(admin.ModelAdmin):
+class BillAdmin(ReadOnlyFormsMixin, admin.ModelAdmin):
     list_display = ('id', 'customer', 'total_amount', 'status', 'date_created', 'month', 'year', 'paid')
     search_fields = ('customer__name',)
     list_filter = ('status', 'month', 'year', 'paid')
     readonly_fields = ('total_amount',)
+    inlines = [BillItemInline]
+    change_list_template = 'admin/core/bill/change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path('reconcile/', self.admin_site.admin_view(self.reconcile_view), name='core_bill_reconcile'),
+        ]
+        return urls + super().get_urls()
+
+    def reconcile_view(self, request):
+        """Upload a payment statement and run it through core.reconciliation."""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        form = PaymentStatementUploadForm(request.POST or None, request.FILES or None)
+        context = {**self.admin_site.each_context(request), 'opts': self.model._meta,
+                   'title': 'Reconcile payments', 'form': form}
+        if request.method == 'POST' and form.is_valid():
+            exceptions = io.StringIO()
+            try:
+                stats = reconcile_payments(form.cleaned_data['file'].file, report=exceptions,
+                                           dry_run=form.cleaned_data['dry_run'])
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                verb = "would be marked" if form.cleaned_data['dry_run'] else "marked"
+                messages.success(request, f"{stats['bills_paid']} bills {verb} paid.")
+                context['stats'] = stats
+                if stats['exceptions']:
+                    csv_text = exceptions.getvalue()
+                    context['exceptions_preview'] = csv_text.splitlines()[:101]
+                    context['exceptions_download'] = base64.b64encode(csv_text.encode()).decode()
+        return render(request, 'admin/core/bill/reconcile.html', context)
+
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not BillItem:
+            return super().save_formset(request, form, formset, change)
+
+        # Collect the inline rows and write them through the bill builder so
+        # the items and the total are saved in one pass instead of per row.
+        formset.save(commit=False)
+        quantities = {}
+        for item_form in formset.forms:
+            data = getattr(item_form, 'cleaned_data', None)
+            if not data or formset._should_delete_form(item_form):
+                continue
+            waste_item = data['waste_item']
+            quantities[waste_item] = quantities.get(waste_item, 0) + (data['quantity'] or 0)
+
+        bill = form.instance
+        if quantities or formset.initial_form_count():
+            set_bill_items(bill, quantities)
 
 @admin.register(Feedback)
-class FeedbackAdmin(admin.ModelAdmin):
-    list_display = ('id', 'customer', 'comment', 'created_at')
+class FeedbackAdmin(ReadOnlyFormsMixin, admin.ModelAdmin):
+    list_display = ('id', 'customer', 'comment', 'sentiment', 'created_at')
+    # customer is nullable, so the changelist would not join it by itself
+    list_select_related = ('customer',)
     search_fields = ('customer__name', 'comment')
-    list_filter = ('created_at',)
+    list_filter = ('created_at', 'sentiment')
+    readonly_fields = ('sentiment', 'sentiment_score', 'sentiment_analyzed_at')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text index instead of LIKE '%term%' scans over every comment
+        if not search_term.strip():
+            return queryset, False
+        return get_search_backend().filter_feedback(queryset, search_term), False
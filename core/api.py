@@ -0,0 +1,152 @@
+"""
+JSON API for customers, bills, bill items and feedback.
+
+Designed for clients that page through large result sets:
+
+- Cursor pagination on the primary key (``?page_size=`` up to
+  API_MAX_PAGE_SIZE), so every page is an index range scan with no COUNT(*)
+  or OFFSET.
+- Related rows are joined (customer names) or prefetched (bill items) once
+  per page instead of once per row.
+- ``?fields=id,total_amount`` returns only those fields, and skips the
+  joins and prefetches the dropped fields would need.
+- ``POST /api/bill-items/`` accepts a list and inserts all of the items with
+  one bulk INSERT.
+"""
+from django.conf import settings
+from django.db.models import Prefetch
+from rest_framework import mixins, pagination, status, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .billing import add_bill_items
+from .models import Bill, BillItem, Customer, Feedback, WasteItem
+from .serializers import BillItemSerializer, BillSerializer, CustomerSerializer, FeedbackSerializer
+
+
+class IdCursorPagination(pagination.CursorPagination):
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        # Read per request so settings overrides apply
+        self.page_size = getattr(settings, 'API_PAGE_SIZE', 100)
+        self.max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 5000)
+
+
+class SparseFieldsetViewMixin:
+    """Pass ``?fields=`` to the serializer on reads."""
+
+    def requested_fields(self):
+        raw = self.request.query_params.get('fields', '') if self.request else ''
+        return [name.strip() for name in raw.split(',') if name.strip()] or None
+
+    def wants(self, name):
+        fields = self.requested_fields()
+        return fields is None or name in fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs.setdefault('fields', self.requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+def _int_filter(queryset, params, name, field=None):
+    value = params.get(name)
+    if value is None or value == '':
+        return queryset
+    if not value.isdigit():
+        raise ValidationError({name: "Must be a whole number."})
+    return queryset.filter(**{field or name: int(value)})
+
+
+def _ids(rows, name):
+    ids = set()
+    for row in rows:
+        try:
+            ids.add(int(row.get(name)))
+        except (AttributeError, TypeError, ValueError):
+            pass  # reported by the serializer
+    return ids
+
+
+# -------------------------
+# ViewSets
+# -------------------------
+class CustomerViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    serializer_class = CustomerSerializer
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        customers = Customer.objects.all()
+        customer_type = self.request.query_params.get('type')
+        if customer_type:
+            customers = customers.filter(customer_type=customer_type)
+        return customers
+
+
+class BillViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    serializer_class = BillSerializer
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        bills = Bill.objects.all()
+        if self.wants('customer_name'):
+            bills = bills.select_related('customer')
+        if self.wants('items'):
+            bills = bills.prefetch_related(
+                Prefetch('items', queryset=BillItem.objects.select_related('waste_item').order_by('id'))
+            )
+
+        params = self.request.query_params
+        bills = _int_filter(bills, params, 'year')
+        bills = _int_filter(bills, params, 'month')
+        bills = _int_filter(bills, params, 'customer', 'customer_id')
+        paid = params.get('paid')
+        if paid in ('true', 'false'):
+            bills = bills.filter(paid=paid == 'true')
+        return bills
+
+
+class BillItemViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                      mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = BillItemSerializer
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        items = BillItem.objects.select_related('waste_item')
+        return _int_filter(items, self.request.query_params, 'bill', 'bill_id')
+
+    def create(self, request, *args, **kwargs):
+        """Create one item, or a list of items with a single bulk INSERT."""
+        many = isinstance(request.data, list)
+        context = self.get_serializer_context()
+        if many:
+            # Resolve every referenced bill and waste item in two queries
+            context['prefetched'] = {
+                Bill: Bill.objects.in_bulk(_ids(request.data, 'bill')),
+                WasteItem: WasteItem.objects.in_bulk(_ids(request.data, 'waste_item')),
+            }
+        serializer = self.serializer_class(data=request.data, many=many, context=context)
+        serializer.is_valid(raise_exception=True)
+        rows = serializer.validated_data if many else [serializer.validated_data]
+        try:
+            items = add_bill_items([(row['bill'], row['waste_item'], row['quantity']) for row in rows])
+        except ValueError as e:
+            raise ValidationError(str(e))
+        data = self.serializer_class(items, many=True, context=context).data
+        return Response(data if many else data[0], status=status.HTTP_201_CREATED)
+
+
+class FeedbackViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    serializer_class = FeedbackSerializer
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        feedback = Feedback.objects.all()
+        if self.wants('customer_name'):
+            feedback = feedback.select_related('customer')
+        sentiment = self.request.query_params.get('sentiment')
+        if sentiment:
+            feedback = feedback.filter(sentiment=sentiment)
+        return feedback
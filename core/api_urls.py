@@ -0,0 +1,11 @@
+from rest_framework.routers import DefaultRouter
+
+from . import api
+
+router = DefaultRouter()
+router.register('customers', api.CustomerViewSet, basename='customer')
+router.register('bills', api.BillViewSet, basename='bill')
+router.register('bill-items', api.BillItemViewSet, basename='bill-item')
+router.register('feedback', api.FeedbackViewSet, basename='feedback')
+
+urlpatterns = router.urls
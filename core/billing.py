@@ -0,0 +1,386 @@
+"""
+Billing services shared by the views, the admin and management commands.
+"""
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from .models import Bill, BillItem, Customer
+from . import reports
+from .reports import deferred_refresh
+from .signals import bills_bulk_changed, bills_marked_paid
+
+# -------------------------
+# Bill Builder
+# -------------------------
+class DuplicateBillError(ValueError):
+    """The customer already has a bill for that month and year."""
+
+    def __init__(self, message="Bill for this customer for this month already exists."):
+        super().__init__(message)
+
+
+@contextmanager
+def bill_period_guard(bills):
+    """
+    Run a bill insert/update in a savepoint and turn a violation of the
+    one-bill-per-customer-per-month constraint into DuplicateBillError.
+
+    The database enforces the rule, so two requests racing to bill the same
+    customer cannot both succeed the way an exists()-then-create check can.
+
+    Args:
+        bills (list): Bills whose periods the block writes. Only read if the
+            block fails, so a list the block fills in works too.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as e:
+        if not _period_taken(bills):
+            raise
+        raise DuplicateBillError() from e
+
+
+def _period_taken(bills):
+    """
+    Whether another bill already holds the period of one of ``bills``.
+
+    Asked of the database once the failed block has rolled back, rather than
+    read from the IntegrityError, whose wording differs between backends.
+    """
+    periods = Q()
+    for bill in bills:
+        periods |= Q(customer_id=bill.customer_id, year=bill.year, month=bill.month) & ~Q(pk=bill.pk)
+    return bool(periods) and Bill.objects.filter(periods).exists()
+
+
+def parse_quantities(data, waste_items):
+    """
+    Read the ``quantity_<waste_item_id>`` fields posted by the bill forms.
+
+    Args:
+        data (QueryDict): request.POST
+        waste_items (iterable): WasteItem objects offered on the form
+
+    Returns:
+        dict: {WasteItem: Decimal quantity} for quantities greater than zero
+
+    Raises:
+        ValueError: If a quantity is not a number or is negative
+    """
+    quantities = {}
+    for item in waste_items:
+        qty_str = data.get(f'quantity_{item.id}')
+        if not qty_str:
+            continue
+        try:
+            qty = Decimal(qty_str)
+        except InvalidOperation:
+            raise ValueError(f"Invalid quantity for {item.name}.")
+        if qty < 0:
+            raise ValueError("Quantity cannot be negative.")
+        if qty > 0:
+            quantities[item] = qty
+    return quantities
+
+
+def _bill_lines(quantities):
+    """Turn {WasteItem: quantity} into (item, quantity, amount) tuples."""
+    lines = []
+    for item, qty in (quantities or {}).items():
+        qty = Decimal(str(qty))
+        if qty < 0:
+            raise ValueError("Quantity cannot be negative.")
+        if qty > 0:
+            lines.append((item, qty, (item.unit_price or 0) * qty))
+    return lines
+
+
+def _bill_items(bill, lines):
+    return [
+        BillItem(bill=bill, waste_item=item, quantity=float(qty), amount=amount)
+        for item, qty, amount in lines
+    ]
+
+
+def _line_amounts(lines):
+    """{waste_item_id: amount} of (item, quantity, amount) lines, for the rollups."""
+    amounts = {}
+    for item, _, amount in lines:
+        amounts[item.pk] = amounts.get(item.pk, 0.0) + float(amount)
+    return amounts
+
+
+def build_bill(customer, quantities, month=None, year=None, paid=False):
+    """
+    Create a bill and all of its items in a constant number of queries.
+
+    The total is summed in memory, so the bill row is written once and the
+    items go in with a single bulk_create.
+
+    Args:
+        customer (Customer): Customer being billed
+        quantities (dict): {WasteItem: quantity}
+        month (int): Billing month (default: current month)
+        year (int): Billing year (default: current year)
+        paid (bool): Whether the bill is already paid
+
+    Returns:
+        Bill: The created bill
+
+    Raises:
+        DuplicateBillError: If the customer already has a bill for the month
+        ValueError: If no quantity is greater than zero or one is negative
+    """
+    lines = _bill_lines(quantities)
+    if not lines:
+        raise ValueError("At least one waste item must have quantity greater than zero.")
+
+    now = timezone.now()
+    bill = Bill(
+        customer=customer,
+        total_amount=float(sum(amount for _, _, amount in lines)),
+        paid=paid,
+        month=month or now.month,
+        year=year or now.year,
+    )
+    # The rollups take the bill and its lines in one pass (core.reports)
+    bill._items_changed = ({}, _line_amounts(lines))
+    with bill_period_guard([bill]):
+        bill.save(force_insert=True)
+        BillItem.objects.bulk_create(_bill_items(bill, lines))
+    return bill
+
+
+def set_bill_items(bill, quantities, update_fields=('total_amount',)):
+    """
+    Replace the items of an existing bill and store the new total.
+
+    Costs one DELETE, one bulk INSERT and one UPDATE however many items the
+    bill has.
+
+    Args:
+        bill (Bill): Bill being edited
+        quantities (dict): {WasteItem: quantity}
+        update_fields (tuple): Bill fields to save; None saves every field,
+            for a bill whose other changes are still unsaved
+
+    Returns:
+        Bill: The updated bill
+
+    Raises:
+        ValueError: If a quantity is negative
+    """
+    lines = _bill_lines(quantities)
+    with transaction.atomic():
+        bill._items_changed = (reports.item_amounts(bill.pk), _line_amounts(lines))
+        BillItem.objects.filter(bill=bill).delete()
+        BillItem.objects.bulk_create(_bill_items(bill, lines))
+        bill.total_amount = float(sum(amount for _, _, amount in lines))
+        bill.save(update_fields=update_fields)
+    return bill
+
+
+def add_bill_items(entries):
+    """
+    Append items to existing bills with one bulk INSERT.
+
+    Each affected bill's total is then re-summed in one grouped query and
+    saved, so the summaries, dashboard counters and revenue rollups follow
+    as for any edit.
+
+    Args:
+        entries (list): (Bill, WasteItem, quantity) tuples
+
+    Returns:
+        list: The created BillItem objects
+
+    Raises:
+        ValueError: If a quantity is negative
+    """
+    bills = {}
+    added = {}
+    items = []
+    for bill, waste_item, qty in entries:
+        bills[bill.pk] = bill
+        lines = _bill_lines({waste_item: qty})
+        amounts = added.setdefault(bill.pk, {})
+        for item_id, amount in _line_amounts(lines).items():
+            amounts[item_id] = amounts.get(item_id, 0.0) + amount
+        items.extend(_bill_items(bill, lines))
+
+    with transaction.atomic():
+        stored = {}
+        for bill_id, item_id, amount in (
+            BillItem.objects.filter(bill_id__in=added)
+            .values('bill_id', 'waste_item').annotate(amount=Sum('amount')).order_by()
+            .values_list('bill_id', 'waste_item', 'amount')
+        ):
+            stored[(bill_id, item_id)] = float(amount or 0)
+        BillItem.objects.bulk_create(items)
+        for pk, amounts in added.items():
+            old = {item_id: stored[(pk, item_id)] for item_id in amounts if (pk, item_id) in stored}
+            new = {item_id: old.get(item_id, 0.0) + amount for item_id, amount in amounts.items()}
+            bills[pk]._items_changed = (old, new)
+        totals = dict(
+            BillItem.objects.filter(bill_id__in=bills)
+            .values('bill_id')
+            .annotate(total=Sum('amount'))
+            .values_list('bill_id', 'total')
+        )
+        for pk, bill in bills.items():
+            bill.total_amount = float(totals.get(pk) or 0)
+            bill.save(update_fields=['total_amount'])
+    return items
+
+
+def mark_bills_paid(bill_ids, batch_size=500):
+    """
+    Mark bills paid with one UPDATE per batch instead of a save() per bill.
+
+    Bills that are already paid are left alone, so the call is safe to
+    repeat and two runs racing on the same bill count it once.
+
+    Args:
+        bill_ids (iterable): Primary keys of the bills to mark paid
+        batch_size (int): Bills per UPDATE
+
+    Returns:
+        list: Primary keys of the bills this call marked paid
+    """
+    bill_ids = list(bill_ids)
+    marked = []
+    for start in range(0, len(bill_ids), batch_size):
+        batch = bill_ids[start:start + batch_size]
+        with transaction.atomic():
+            unpaid = list(
+                Bill.objects.select_for_update()
+                .filter(pk__in=batch, paid=False)
+                .values_list('pk', 'customer_id', 'total_amount', 'year', 'month')
+            )
+            if not unpaid:
+                continue
+            pks = [row[0] for row in unpaid]
+            Bill.objects.filter(pk__in=pks).update(paid=True, status='Paid')
+            bills_marked_paid.send(
+                sender=Bill,
+                bills=[(customer_id, total) for _, customer_id, total, _, _ in unpaid],
+                periods={(year, month) for _, _, _, year, month in unpaid},
+            )
+        marked.extend(pks)
+    return marked
+
+
+# -------------------------
+# Monthly Billing Run
+# -------------------------
+@deferred_refresh()
+def generate_monthly_bills(month, year, quantities=None, chunk_size=1000,
+                           start_after=0, progress=None):
+    """
+    Create the bill for the given month/year for every customer that does
+    not have one yet.
+
+    Customers are walked in primary-key order and each chunk is written in
+    its own transaction, so a run that crashes half way can simply be
+    started again: customers billed by the earlier attempt are skipped.
+
+    Args:
+        month (int): Billing month (1-12)
+        year (int): Billing year
+        quantities (dict): {WasteItem: quantity} billed to every customer.
+            When empty, each bill is a flat charge at the customer's
+            monthly_rate.
+        chunk_size (int): Customers handled per transaction
+        start_after (int): Only bill customers with a primary key above this
+        progress (callable): Called with a stats dict after every chunk
+
+    Returns:
+        dict: {'customers': int, 'created': int, 'skipped': int, 'last_pk': int}
+    """
+    lines = _bill_lines(quantities)
+    items_total = float(sum(amount for _, _, amount in lines))
+
+    stats = {'customers': 0, 'created': 0, 'skipped': 0, 'last_pk': start_after}
+
+    while True:
+        chunk = list(
+            Customer.objects.filter(pk__gt=stats['last_pk'])
+            .order_by('pk')
+            .values_list('pk', 'monthly_rate')[:chunk_size]
+        )
+        if not chunk:
+            break
+
+        try:
+            bills = _bill_chunk(chunk, month, year, lines, items_total)
+        except DuplicateBillError:
+            # A concurrent run billed some of these customers after the
+            # check and the chunk was rolled back; check once more
+            bills = _bill_chunk(chunk, month, year, lines, items_total)
+
+        stats['customers'] += len(chunk)
+        stats['created'] += len(bills)
+        stats['skipped'] += len(chunk) - len(bills)
+        stats['last_pk'] = chunk[-1][0]
+        if progress:
+            progress(dict(stats))
+
+    return stats
+
+
+def _bill_chunk(chunk, month, year, lines, items_total):
+    """Bill the customers of one chunk that have no bill for the month yet."""
+    bills = []
+    with bill_period_guard(bills):
+        billed = set(
+            Bill.objects.filter(
+                month=month,
+                year=year,
+                customer_id__in=[pk for pk, _ in chunk],
+            ).values_list('customer_id', flat=True)
+        )
+        bills.extend(
+            Bill(
+                customer_id=pk,
+                total_amount=items_total if lines else rate,
+                paid=False,
+                month=month,
+                year=year,
+            )
+            for pk, rate in chunk
+            if pk not in billed
+        )
+        Bill.objects.bulk_create(bills, batch_size=len(chunk))
+
+        if lines and bills:
+            _fill_bill_pks(bills, month, year)
+            BillItem.objects.bulk_create(
+                [bill_item for bill in bills for bill_item in _bill_items(bill, lines)],
+                batch_size=len(chunk),
+            )
+
+        if bills:
+            bills_bulk_changed.send(
+                sender=Bill,
+                customer_ids=[bill.customer_id for bill in bills],
+                created=bills,
+            )
+    return bills
+
+
+def _fill_bill_pks(bills, month, year):
+    """Set primary keys on bulk-created bills for backends that don't return them."""
+    if all(bill.pk for bill in bills):
+        return
+    pks = dict(
+        Bill.objects.filter(
+            month=month,
+            year=year,
+            customer_id__in=[bill.customer_id for bill in bills],
+        ).values_list('customer_id', 'pk')
+    )
+    for bill in bills:
+        bill.pk = pks[bill.customer_id]
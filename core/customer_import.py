@@ -0,0 +1,263 @@
+"""
+Bulk customer import from CSV or XLSX.
+
+The file is read as a stream and handled in chunks. Every row goes through
+CustomerImportForm, so the field rules are exactly the ones the Add Customer
+page applies; uniqueness of customer IDs, emails and phone numbers is then
+checked for the whole chunk at once (one query per column, plus sets of the
+values seen earlier in the file) instead of three queries per row. Valid rows
+are written with bulk_create, one transaction per chunk; rejected rows are
+written to a rejects CSV with the reason next to the original values. If a
+customer saved elsewhere between the check and the insert makes the chunk
+fail, the chunk is checked again, the rows that now conflict are rejected and
+the rest are inserted.
+"""
+import csv
+import io
+import os
+
+from django.db import IntegrityError, transaction
+
+from .forms import CustomerImportForm
+from .ids import allocate_customer_ids
+from .models import Customer
+
+IMPORT_FIELDS = ['customer_id', 'name', 'email', 'phone', 'address', 'customer_type', 'monthly_rate']
+UNIQUE_FIELDS = {
+    'customer_id': "This customer ID is already in use.",
+    'email': "This email is already registered.",
+    'phone': "This phone number is already registered.",
+}
+
+
+def get_openpyxl():
+    """Import openpyxl on first use; it is only needed for .xlsx files."""
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("Reading .xlsx files needs openpyxl (pip install openpyxl).")
+    return openpyxl
+
+
+# -------------------------
+# Readers
+# -------------------------
+def _header(name):
+    return str(name or '').strip().lower().replace(' ', '_')
+
+
+def read_csv(source):
+    """Yield (line number, dict) per CSV row; ``source`` is a path or a binary file."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline='', encoding='utf-8-sig') as f:
+            yield from read_csv(f)
+        return
+    if not isinstance(source, io.TextIOBase):
+        source = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    reader = csv.reader(source)
+    header = [_header(name) for name in next(reader, [])]
+    for values in reader:
+        if any(value.strip() for value in values):
+            yield reader.line_num, dict(zip(header, values))
+
+
+def read_xlsx(source):
+    """Yield (row number, dict) per row of the first worksheet, streaming it."""
+    workbook = get_openpyxl().load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [_header(name) for name in next(rows, [])]
+        for line, values in enumerate(rows, start=2):
+            values = ['' if value is None else str(value) for value in values]
+            if any(value.strip() for value in values):
+                yield line, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def detect_format(name):
+    return 'xlsx' if str(name).lower().endswith('.xlsx') else 'csv'
+
+
+def read_rows(source, fmt=None):
+    fmt = fmt or detect_format(getattr(source, 'name', source))
+    if fmt not in ('csv', 'xlsx'):
+        raise ValueError("Format must be 'csv' or 'xlsx'.")
+    return read_xlsx(source) if fmt == 'xlsx' else read_csv(source)
+
+
+# -------------------------
+# Import
+# -------------------------
+class RejectsWriter:
+    """Rejected rows as CSV: line number, reasons, then the original columns."""
+
+    def __init__(self, output):
+        self.output = output
+        self.count = 0
+        self._writer = None
+
+    def write(self, line, row, errors):
+        if self._writer is None:
+            self._writer = csv.writer(self.output)
+            self._writer.writerow(['line', 'errors'] + IMPORT_FIELDS)
+        self._writer.writerow([line, '; '.join(errors)] + [row.get(name, '') for name in IMPORT_FIELDS])
+        self.count += 1
+
+
+def _validate(row):
+    """
+    Apply the CustomerForm rules to one row.
+
+    Returns:
+        tuple: (Customer or None, list of error messages)
+    """
+    data = {name: (row.get(name) or '').strip() for name in IMPORT_FIELDS}
+    # The rate follows the customer type, as Customer.save() does in the UI
+    if not data['monthly_rate']:
+        data['monthly_rate'] = Customer.rate_for_type(data['customer_type'], '')
+    form = CustomerImportForm(data=data)
+    if not form.is_valid():
+        return None, [
+            f"{field}: {message}" if field != '__all__' else message
+            for field, messages in form.errors.items() for message in messages
+        ]
+    customer = form.save(commit=False)
+    customer.monthly_rate = Customer.rate_for_type(customer.customer_type, customer.monthly_rate)
+    return customer, []
+
+
+def _taken(field, values):
+    """Values of ``field`` already stored, in one query."""
+    if not values:
+        return set()
+    return set(Customer.objects.filter(**{f'{field}__in': values}).values_list(field, flat=True))
+
+
+def _assign_customer_ids(customers, seen_ids):
+    """Give rows without a customer ID one block of fresh IDs from the allocator."""
+    pending = [c for c in customers if not c.customer_id]
+    for customer, customer_id in zip(pending, allocate_customer_ids(len(pending), exclude=seen_ids)):
+        customer.customer_id = customer_id
+        seen_ids.add(customer_id)
+
+
+def _import_chunk(chunk, seen, rejects, dry_run):
+    """Validate and insert one chunk of (line, row) pairs; returns rows created."""
+    valid = []
+    for line, row in chunk:
+        customer, errors = _validate(row)
+        if errors:
+            rejects.write(line, row, errors)
+        else:
+            valid.append((line, row, customer))
+
+    accepted = []
+    for line, row, customer, errors in _check_unique(valid, seen):
+        if errors:
+            rejects.write(line, row, errors)
+            continue
+        for field in UNIQUE_FIELDS:
+            if getattr(customer, field):
+                seen[field].add(getattr(customer, field))
+        accepted.append((line, row, customer))
+
+    if accepted and not dry_run:
+        # Only real imports draw on the allocator; a dry run leaves it alone
+        _assign_customer_ids([customer for _, _, customer in accepted], seen['customer_id'])
+        accepted = _insert(accepted, rejects)
+    return len(accepted)
+
+
+def _check_unique(rows, seen):
+    """
+    Check (line, row, customer) tuples against the database and ``seen``.
+
+    Yields:
+        tuple: (line, row, customer, list of error messages)
+    """
+    taken = {
+        field: _taken(field, {getattr(c, field) for _, _, c in rows if getattr(c, field)})
+        for field in UNIQUE_FIELDS
+    }
+    for line, row, customer in rows:
+        errors = []
+        for field, message in UNIQUE_FIELDS.items():
+            value = getattr(customer, field)
+            if not value:
+                continue
+            if value in taken[field]:
+                errors.append(f"{field}: {message}")
+            elif value in seen[field]:
+                errors.append(f"{field}: Duplicate of an earlier row in this file.")
+        yield line, row, customer, errors
+
+
+def _insert(accepted, rejects):
+    """
+    bulk_create the accepted (line, row, customer) tuples in one transaction.
+
+    A concurrent insert can take a customer ID after the chunk was checked,
+    so an IntegrityError re-checks the chunk against the database, rejects
+    the rows that now conflict and tries again with the rest.
+
+    Returns:
+        list: The tuples inserted
+    """
+    from .signals import customers_bulk_created
+
+    while accepted:
+        try:
+            with transaction.atomic():
+                Customer.objects.bulk_create([customer for _, _, customer in accepted])
+                count = len(accepted)
+                transaction.on_commit(lambda: customers_bulk_created.send(sender=Customer, count=count))
+            return accepted
+        except IntegrityError:
+            retry = []
+            for line, row, customer, errors in _check_unique(accepted, {field: set() for field in UNIQUE_FIELDS}):
+                if errors:
+                    rejects.write(line, row, errors)
+                else:
+                    # bulk_create may have set primary keys the rollback undid
+                    customer.pk = None
+                    customer._state.adding = True
+                    retry.append((line, row, customer))
+            if len(retry) == len(accepted):
+                raise
+            accepted = retry
+    return accepted
+
+
+def import_customers(source, fmt=None, rejects=None, chunk_size=1000, dry_run=False, progress=None):
+    """
+    Import customers from a CSV or XLSX file.
+
+    Args:
+        source: Path or binary file object
+        fmt (str): 'csv' or 'xlsx' (default: from the file name)
+        rejects: Text file object the rejects CSV is written to (optional)
+        chunk_size (int): Rows validated and inserted per transaction
+        dry_run (bool): Validate only, insert nothing
+        progress (callable): Called with (rows read, rows created, rows rejected)
+
+    Returns:
+        dict: {'rows': int, 'created': int, 'rejected': int}
+    """
+    writer = RejectsWriter(rejects if rejects is not None else io.StringIO())
+    seen = {field: set() for field in UNIQUE_FIELDS}
+    rows = created = 0
+    chunk = []
+    for line, row in read_rows(source, fmt):
+        chunk.append((line, row))
+        rows += 1
+        if len(chunk) == chunk_size:
+            created += _import_chunk(chunk, seen, writer, dry_run)
+            chunk = []
+            if progress:
+                progress(rows, created, writer.count)
+    if chunk:
+        created += _import_chunk(chunk, seen, writer, dry_run)
+    if progress:
+        progress(rows, created, writer.count)
+    return {'rows': rows, 'created': created, 'rejected': writer.count}
@@ -0,0 +1,133 @@
+"""
+SQLite connection tuning (core.db_tuning).
+
+Every new SQLite connection gets the SQLITE_* pragmas from settings:
+
+- busy_timeout: a writer waits this long for the lock before failing with
+  "database is locked";
+- journal_mode=WAL: readers no longer block the writer (or the other way
+  round), and a commit appends to the log instead of rewriting pages;
+- synchronous=NORMAL: in WAL mode the fsync happens at checkpoints rather
+  than on every commit. A power cut can lose the last commits but never
+  corrupts the file;
+- temp_store=MEMORY: sorts and temporary B-trees stay off disk;
+- mmap_size: pages are read through a memory map instead of read() calls.
+
+Transactions start with BEGIN IMMEDIATE (core.sqlite_backend), so one that
+reads before it writes waits for the write lock like any other writer
+instead of failing when it upgrades.
+
+With CONN_MAX_AGE (DB_CONN_MAX_AGE, off by default) the connection, and its
+pragmas, is reused by later requests instead of being opened for each one. After a request, PRAGMA
+optimize runs at most once per SQLITE_OPTIMIZE_INTERVAL seconds per
+database and process, so the planner statistics keep up with the data
+without a cron job.
+
+Settings:
+    SQLITE_TUNING             Apply any of this at all
+    SQLITE_BEGIN_IMMEDIATE    Start transactions with BEGIN IMMEDIATE
+    SQLITE_BUSY_TIMEOUT_MS    Lock wait in milliseconds
+    SQLITE_JOURNAL_MODE       WAL, or DELETE for the rollback journal
+    SQLITE_SYNCHRONOUS        NORMAL or FULL
+    SQLITE_TEMP_STORE         MEMORY, FILE or DEFAULT
+    SQLITE_MMAP_SIZE          Bytes memory-mapped per connection; 0 = off
+    SQLITE_OPTIMIZE_INTERVAL  Seconds between PRAGMA optimize; 0 = never
+"""
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PRAGMA_VALUE = re.compile(r'^[A-Za-z0-9_]+$')
+
+_lock = threading.Lock()
+_last_optimize = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def sqlite_pragmas():
+    """
+    The pragmas run on a new connection, in order.
+
+    busy_timeout comes first so that switching the journal mode waits for a
+    connection that is mid-commit instead of failing.
+
+    Returns:
+        list: (pragma, value) pairs; settings that are None are left at the
+              SQLite default
+
+    Raises:
+        ImproperlyConfigured: If a value is not a plain word or number
+    """
+    pragmas = [
+        ('busy_timeout', _setting('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        ('journal_mode', _setting('SQLITE_JOURNAL_MODE', 'WAL')),
+        ('synchronous', _setting('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('temp_store', _setting('SQLITE_TEMP_STORE', 'MEMORY')),
+        ('mmap_size', _setting('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    ]
+    pragmas = [(name, value) for name, value in pragmas if value is not None]
+    for name, value in pragmas:
+        # PRAGMA takes no query parameters, so the value is spliced in
+        if not PRAGMA_VALUE.match(str(value)):
+            raise ImproperlyConfigured(f"Invalid SQLite {name} setting: {value!r}")
+    return pragmas
+
+
+def apply_pragmas(connection, pragmas):
+    """
+    Run the pragmas on an open Django SQLite connection.
+
+    They go straight to the driver connection, so they don't show up in
+    query logs or count against a page's query budget.
+
+    Returns:
+        dict: {pragma: value SQLite reports back}
+    """
+    applied = {}
+    for name, value in pragmas:
+        row = connection.connection.execute(f'PRAGMA {name} = {value}').fetchone()
+        applied[name] = row[0] if row else value
+    return applied
+
+
+# -------------------------
+# Signal Receivers
+# -------------------------
+@receiver(connection_created)
+def tune_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or not _setting('SQLITE_TUNING', True):
+        return
+    apply_pragmas(connection, sqlite_pragmas())
+
+
+@receiver(request_finished)
+def optimize_periodically(sender, **kwargs):
+    """
+    Run PRAGMA optimize on open SQLite connections once the interval has
+    passed. The statistics it refreshes live in the database file, so one
+    connection per database and interval is enough.
+    """
+    interval = _setting('SQLITE_OPTIMIZE_INTERVAL', 3600)
+    if not interval or not _setting('SQLITE_TUNING', True):
+        return
+    now = time.monotonic()
+    for connection in connections.all(initialized_only=True):
+        if connection.vendor != 'sqlite' or connection.connection is None or connection.in_atomic_block:
+            continue
+        with _lock:
+            # The first request of a process only starts the clock
+            last = _last_optimize.setdefault(connection.alias, now)
+            if now - last < interval:
+                continue
+            _last_optimize[connection.alias] = now
+        connection.connection.execute('PRAGMA optimize')
@@ -0,0 +1,192 @@
+"""
+Streaming data exports (CSV or NDJSON).
+
+Each export is a ``values_list`` projection read with
+``iterator(chunk_size=...)`` and encoded one row at a time, so neither the
+web view (StreamingHttpResponse) nor ``manage.py export_data`` ever holds
+more than one chunk of rows, whatever the size of the table.
+
+Bills are flattened to one row per BillItem; bills without items still get
+one row (LEFT JOIN) with the item columns empty.
+"""
+import csv
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.utils.dateparse import parse_date
+from django.utils.timezone import make_aware
+
+from .models import Bill, Customer, Feedback
+
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+# -------------------------
+# Filters
+# -------------------------
+def _int_param(params, name, low, high):
+    value = (params.get(name) or '').strip()
+    if not value:
+        return None
+    if not value.isdigit() or not low <= int(value) <= high:
+        raise ExportError(f"{name} must be a number from {low} to {high}.")
+    return int(value)
+
+
+def _date_param(params, name):
+    value = (params.get(name) or '').strip()
+    if not value:
+        return None
+    try:
+        # None if malformed, ValueError if well formed but impossible (2024-02-30)
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ExportError(f"{name} must be a date (YYYY-MM-DD).")
+    return parsed
+
+
+def _paid_param(params):
+    value = (params.get('paid') or '').strip().lower()
+    if value in ('', 'all'):
+        return None
+    if value not in ('paid', 'unpaid'):
+        raise ExportError("paid must be 'paid', 'unpaid' or 'all'.")
+    return value == 'paid'
+
+
+def _day_start(day):
+    return make_aware(datetime.combine(day, time.min))
+
+
+# -------------------------
+# Exports
+# -------------------------
+def customer_rows(params):
+    header = ['customer_id', 'name', 'email', 'phone', 'address', 'customer_type', 'monthly_rate']
+    customers = Customer.objects.all()
+    customer_type = (params.get('type') or '').strip()
+    if customer_type:
+        if customer_type not in dict(Customer.CUSTOMER_TYPES):
+            raise ExportError(f"Unknown customer type '{customer_type}'.")
+        customers = customers.filter(customer_type=customer_type)
+    return header, customers.order_by('id').values_list(*header)
+
+
+def bill_rows(params):
+    header = [
+        'bill_id', 'customer_id', 'customer_name', 'customer_type', 'year', 'month',
+        'total_amount', 'paid', 'status', 'date_created',
+        'item_id', 'waste_item', 'quantity', 'unit_price', 'amount',
+    ]
+    bills = Bill.objects.all()
+    year = _int_param(params, 'year', 1900, 9999)
+    month = _int_param(params, 'month', 1, 12)
+    paid = _paid_param(params)
+    if year is not None:
+        bills = bills.filter(year=year)
+    if month is not None:
+        bills = bills.filter(month=month)
+    if paid is not None:
+        bills = bills.filter(paid=paid)
+    # Reverse FK in values_list is a LEFT OUTER JOIN: one row per item
+    rows = bills.order_by('year', 'month', 'id', 'items__id').values_list(
+        'id', 'customer__customer_id', 'customer__name', 'customer__customer_type', 'year', 'month',
+        'total_amount', 'paid', 'status', 'date_created',
+        'items__id', 'items__waste_item__name', 'items__quantity', 'items__waste_item__unit_price',
+        'items__amount',
+    )
+    return header, rows
+
+
+def feedback_rows(params):
+    header = ['feedback_id', 'customer_id', 'customer_name', 'comment', 'sentiment', 'sentiment_score', 'created_at']
+    feedback = Feedback.objects.all()
+    start = _date_param(params, 'start')
+    end = _date_param(params, 'end')
+    sentiment = (params.get('sentiment') or '').strip()
+    if start:
+        feedback = feedback.filter(created_at__gte=_day_start(start))
+    if end:
+        feedback = feedback.filter(created_at__lt=_day_start(end + timedelta(days=1)))
+    if sentiment:
+        if sentiment not in dict(Feedback.SENTIMENT_CHOICES):
+            raise ExportError(f"Unknown sentiment '{sentiment}'.")
+        feedback = feedback.filter(sentiment=sentiment)
+    rows = feedback.order_by('created_at', 'id').values_list(
+        'id', 'customer__customer_id', 'customer__name', 'comment', 'sentiment', 'sentiment_score', 'created_at',
+    )
+    return header, rows
+
+
+EXPORTS = {
+    'customers': customer_rows,
+    'bills': bill_rows,
+    'feedback': feedback_rows,
+}
+
+
+# -------------------------
+# Encoding
+# -------------------------
+class Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_rows(header, rows, fmt='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the export one encoded line at a time."""
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(header)
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield writer.writerow([_plain(value) for value in row])
+    elif fmt == 'ndjson':
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield json.dumps(dict(zip(header, map(_plain, row)))) + '\n'
+    else:
+        raise ExportError(f"Format must be one of: {', '.join(FORMATS)}.")
+
+
+def export(kind, params, fmt='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Build a streaming export.
+
+    Args:
+        kind (str): 'customers', 'bills' or 'feedback'
+        params (dict): Filters (year, month, paid, type, start, end, sentiment)
+        fmt (str): 'csv' or 'ndjson'
+
+    Returns:
+        generator: Encoded lines (str)
+
+    Raises:
+        ExportError: Unknown export, format or bad filter value
+    """
+    if kind not in EXPORTS:
+        raise ExportError(f"Export must be one of: {', '.join(EXPORTS)}.")
+    if fmt not in FORMATS:
+        raise ExportError(f"Format must be one of: {', '.join(FORMATS)}.")
+    # Filters are validated here, before the first line is streamed
+    header, rows = EXPORTS[kind](params)
+    return encode_rows(header, rows, fmt, chunk_size)
@@ -1,7 +1,7 @@
 from django import forms
 from .models import Feedback
 from .models import Customer
-from .models import Bill, OTP
+from .models import Bill, BillItem, OTP
 import re
 from django.contrib.auth.hashers import make_password
 
@@ -34,6 +34,10 @@ class FeedbackForm(forms.ModelForm):
         return comment
         
 class CustomerForm(forms.ModelForm):
+    # Query the database for duplicate IDs, emails and phones. The bulk
+    # importer turns this off and checks a whole chunk of rows at once.
+    check_unique_in_db = True
+
     class Meta:
         model = Customer
         fields = [
@@ -60,12 +64,13 @@ class CustomerForm(forms.ModelForm):
     def clean_customer_id(self):
         customer_id = self.cleaned_data.get('customer_id')
 
-        if customer_id:
+        if customer_id and self.check_unique_in_db:
             # Check if customer_id is unique (excluding current instance)
             existing_customer = Customer.objects.filter(customer_id=customer_id).first()
             if existing_customer and existing_customer.pk != self.instance.pk:
                 raise forms.ValidationError("This customer ID is already in use.")
 
+        if customer_id:
             # Validate format (should start with CUST followed by 6 digits)
             if not customer_id.startswith('CUST') or not customer_id[4:].isdigit() or len(customer_id) != 10:
                 raise forms.ValidationError("Customer ID must be in format CUSTXXXXXX (CUST followed by 6 digits).")
@@ -95,7 +100,7 @@ class CustomerForm(forms.ModelForm):
             raise forms.ValidationError("Email is required.")
 
         # Optional but STRONGLY recommended
-        if Customer.objects.filter(email=email).exists():
+        if self.check_unique_in_db and Customer.objects.filter(email=email).exists():
             raise forms.ValidationError("This email is already registered.")
 
         return email
@@ -112,9 +117,10 @@ class CustomerForm(forms.ModelForm):
                 raise forms.ValidationError("Phone number must be exactly 10 digits.")
 
             # Check if phone number is unique
-            existing_customer = Customer.objects.filter(phone=phone).first()
-            if existing_customer and existing_customer.pk != self.instance.pk:
-                raise forms.ValidationError("This phone number is already registered.")
+            if self.check_unique_in_db:
+                existing_customer = Customer.objects.filter(phone=phone).first()
+                if existing_customer and existing_customer.pk != self.instance.pk:
+                    raise forms.ValidationError("This phone number is already registered.")
 
         return phone
 
@@ -151,6 +157,28 @@ class CustomerForm(forms.ModelForm):
 
         return rate
 
+class CustomerImportForm(CustomerForm):
+    """
+    CustomerForm rules applied to one row of a bulk import.
+
+    Uniqueness is left to core.customer_import, which checks every row of a
+    chunk against the database and the rest of the file in a few queries.
+    """
+    check_unique_in_db = False
+
+    def validate_unique(self):
+        pass
+
+
+class CustomerImportUploadForm(forms.Form):
+    file = forms.FileField(help_text="CSV or XLSX with a header row: name, email, phone, address, customer_type and optionally customer_id.")
+
+
+class PaymentStatementUploadForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header row: customer_id, month, year, amount and optionally reference.")
+    dry_run = forms.BooleanField(required=False, label="Dry run (report only, mark nothing paid)")
+
+
 class BillForm(forms.ModelForm):
     class Meta:
         model = Bill
@@ -194,6 +222,23 @@ class BillForm(forms.ModelForm):
         return status
 
 
+class BillItemForm(forms.ModelForm):
+    class Meta:
+        model = BillItem
+        fields = ['waste_item', 'quantity']
+
+    def clean_quantity(self):
+        quantity = self.cleaned_data.get('quantity')
+
+        if quantity is None:
+            raise forms.ValidationError("Quantity is required.")
+
+        if quantity < 0:
+            raise forms.ValidationError("Quantity cannot be negative.")
+
+        return quantity
+
+
 # ========================
 # OTP FORMS
 # ========================
@@ -0,0 +1,73 @@
+"""
+Customer ID allocation.
+
+IDs come from a counter row in IdSequence instead of random digits.
+``allocate_block()`` reserves a whole range with one atomic
+``UPDATE ... SET next_value = next_value + n``; the row stays locked until
+the transaction commits, so concurrent web workers and importers never get
+overlapping ranges, and a bulk import of 10,000 customers costs a couple of
+queries instead of 10,000.
+
+Customer IDs keep the CUSTXXXXXX format checked by
+CustomerForm.clean_customer_id. Numbers already taken (by the old random
+IDs or typed in by hand) are skipped.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Customer, IdSequence
+
+CUSTOMER_ID_SEQUENCE = 'customer_id'
+CUSTOMER_ID_PREFIX = 'CUST'
+CUSTOMER_ID_DIGITS = 6
+
+
+class IdSpaceExhausted(Exception):
+    pass
+
+
+def allocate_block(name, count):
+    """
+    Reserve ``count`` consecutive numbers of the named sequence.
+
+    Returns:
+        range: The reserved numbers
+    """
+    with transaction.atomic():
+        if not IdSequence.objects.filter(name=name).update(next_value=F('next_value') + count):
+            try:
+                with transaction.atomic():
+                    IdSequence.objects.create(name=name, next_value=1 + count)
+                return range(1, 1 + count)
+            except IntegrityError:
+                # Another worker created the row first
+                IdSequence.objects.filter(name=name).update(next_value=F('next_value') + count)
+        end = IdSequence.objects.values_list('next_value', flat=True).get(name=name)
+    return range(end - count, end)
+
+
+def format_customer_id(number):
+    return f'{CUSTOMER_ID_PREFIX}{number:0{CUSTOMER_ID_DIGITS}d}'
+
+
+def allocate_customer_ids(count, exclude=()):
+    """
+    Return ``count`` unused customer IDs, in ascending order.
+
+    Args:
+        count (int): IDs wanted
+        exclude (set): Extra IDs to skip, e.g. ones used earlier in an import file
+
+    Raises:
+        IdSpaceExhausted: If the six-digit number space is used up
+    """
+    limit = 10 ** CUSTOMER_ID_DIGITS
+    ids = []
+    while len(ids) < count:
+        block = allocate_block(CUSTOMER_ID_SEQUENCE, count - len(ids))
+        candidates = [format_customer_id(n) for n in block if n < limit]
+        taken = set(Customer.objects.filter(customer_id__in=candidates).values_list('customer_id', flat=True))
+        ids.extend(cid for cid in candidates if cid not in taken and cid not in exclude)
+        if block.stop >= limit and len(ids) < count:
+            raise IdSpaceExhausted("No CUSTXXXXXX customer IDs left to allocate.")
+    return ids
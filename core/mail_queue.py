@@ -0,0 +1,229 @@
+"""
+Outbound email queue.
+
+Request handlers call ``enqueue_email()``, which only inserts an
+OutboundEmail row. Workers claim due messages in batches and deliver each
+batch over a single backend connection (one SMTP handshake and TLS session
+per batch instead of per email), retrying failures with exponential
+backoff.
+
+Workers run as a standalone process, ``python manage.py process_mail_queue``
+(the default, ``MAIL_QUEUE_WORKERS = 0``), or opt in as background threads
+inside the web process (``MAIL_QUEUE_WORKERS`` > 0, woken as soon as a
+message is committed).
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboundEmail, SentEmail
+
+logger = logging.getLogger(__name__)
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# -------------------------
+# Enqueue
+# -------------------------
+def enqueue_email(to_email, subject, body, html_body=None):
+    """
+    Queue an email for delivery.
+
+    Returns:
+        OutboundEmail: The queued message
+    """
+    message = OutboundEmail.objects.create(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        html_body=html_body,
+    )
+    if _setting('MAIL_QUEUE_WORKERS', 0) > 0:
+        transaction.on_commit(wake_workers)
+    return message
+
+
+# -------------------------
+# Drain
+# -------------------------
+_requeue_lock = threading.Lock()
+_last_requeue = None
+
+
+def requeue_stale(now):
+    """
+    Put messages whose worker died mid-send back in the queue.
+
+    A claim only goes stale after MAIL_QUEUE_CLAIM_TIMEOUT, so the UPDATE
+    runs at most once per MAIL_QUEUE_REQUEUE_INTERVAL seconds per process
+    rather than on every poll; the first call of a process always runs it.
+
+    Returns:
+        int: Messages requeued
+    """
+    global _last_requeue
+    with _requeue_lock:
+        clock = time.monotonic()
+        if _last_requeue is not None and clock - _last_requeue < _setting('MAIL_QUEUE_REQUEUE_INTERVAL', 60):
+            return 0
+        _last_requeue = clock
+    stale = now - timedelta(seconds=_setting('MAIL_QUEUE_CLAIM_TIMEOUT', 300))
+    return OutboundEmail.objects.filter(status='sending', claimed_at__lt=stale).update(status='queued')
+
+
+def claim_batch(batch_size):
+    """Mark up to ``batch_size`` due messages as ours and return them."""
+    now = timezone.now()
+    requeue_stale(now)
+
+    ids = list(
+        OutboundEmail.objects.filter(status='queued', next_attempt_at__lte=now)
+        .order_by('next_attempt_at')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    OutboundEmail.objects.filter(pk__in=ids, status='queued').update(
+        status='sending', claim_token=token, claimed_at=now
+    )
+    return list(OutboundEmail.objects.filter(claim_token=token, status='sending'))
+
+
+def _build_message(outbound, connection):
+    message = EmailMultiAlternatives(
+        outbound.subject,
+        outbound.body,
+        settings.DEFAULT_FROM_EMAIL,
+        [outbound.to_email],
+        connection=connection,
+    )
+    if outbound.html_body:
+        message.attach_alternative(outbound.html_body, 'text/html')
+    return message
+
+
+def send_batch(batch):
+    """
+    Deliver claimed messages over one backend connection.
+
+    Returns:
+        tuple: (sent count, failed count)
+    """
+    sent, failed = [], []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        failed = [(outbound, e) for outbound in batch]
+    else:
+        try:
+            for outbound in batch:
+                try:
+                    connection.send_messages([_build_message(outbound, connection)])
+                    sent.append(outbound)
+                except Exception as e:
+                    failed.append((outbound, e))
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    now = timezone.now()
+    if sent:
+        OutboundEmail.objects.filter(pk__in=[o.pk for o in sent]).update(
+            status='sent', sent_at=now, attempts=F('attempts') + 1, claim_token=''
+        )
+        # Development outbox (debug_sent_emails), one insert per batch
+        try:
+            SentEmail.objects.bulk_create([
+                SentEmail(to_email=o.to_email, subject=o.subject, body=o.body, html_body=o.html_body)
+                for o in sent
+            ])
+        except Exception:
+            logger.exception("Could not record %d sent emails in the outbox", len(sent))
+
+    max_attempts = _setting('MAIL_QUEUE_MAX_ATTEMPTS', 5)
+    backoff = _setting('MAIL_QUEUE_RETRY_BACKOFF', 30)
+    for outbound, error in failed:
+        attempts = outbound.attempts + 1
+        OutboundEmail.objects.filter(pk=outbound.pk).update(
+            status='failed' if attempts >= max_attempts else 'queued',
+            attempts=attempts,
+            next_attempt_at=now + timedelta(seconds=backoff * 2 ** (attempts - 1)),
+            last_error=str(error)[:1000],
+            claim_token='',
+        )
+        logger.warning(
+            "Mail send error (attempt %d/%d) to %s: %s", attempts, max_attempts, outbound.to_email, error
+        )
+
+    return len(sent), len(failed)
+
+
+def drain_queue(batch_size=None, max_batches=None):
+    """
+    Deliver due messages until the queue is empty.
+
+    Returns:
+        tuple: (sent count, failed count)
+    """
+    batch_size = batch_size or _setting('MAIL_QUEUE_BATCH_SIZE', 50)
+    total_sent = total_failed = batches = 0
+    while max_batches is None or batches < max_batches:
+        batch = claim_batch(batch_size)
+        if not batch:
+            break
+        sent, failed = send_batch(batch)
+        total_sent += sent
+        total_failed += failed
+        batches += 1
+    return total_sent, total_failed
+
+
+# -------------------------
+# In-process Workers
+# -------------------------
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def _worker_loop():
+    poll_interval = _setting('MAIL_QUEUE_POLL_INTERVAL', 5)
+    while True:
+        _wakeup.wait(poll_interval)
+        _wakeup.clear()
+        try:
+            drain_queue()
+        except Exception:
+            logger.exception("Mail queue worker error")
+        finally:
+            close_old_connections()
+
+
+def start_workers():
+    """Start the MAIL_QUEUE_WORKERS background threads once per process."""
+    with _workers_lock:
+        if _workers:
+            return
+        for i in range(_setting('MAIL_QUEUE_WORKERS', 0)):
+            worker = threading.Thread(target=_worker_loop, name=f'mail-queue-{i}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def wake_workers():
+    start_workers()
+    _wakeup.set()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.sentiment import analyze_pending_feedback
+
+
+class Command(BaseCommand):
+    help = (
+        "Score the sentiment of new or edited feedback across a process pool "
+        "and store the label and polarity on each Feedback row."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--processes', type=int, default=None,
+                            help="Worker processes (default: CPU count)")
+
+    def handle(self, *args, **options):
+        def report(done):
+            self.stdout.write(f"  {done} feedback analysed")
+
+        total = analyze_pending_feedback(
+            chunk_size=options['chunk_size'],
+            processes=options['processes'],
+            progress=report,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} feedback rows analysed."))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import EXPORTS, FORMATS, ExportError, export
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream customers, bills (one row per bill item) or feedback to CSV or "
+        "NDJSON in constant memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', default=None, help="File to write (default: stdout)")
+        parser.add_argument('--year', help="Bills: billing year")
+        parser.add_argument('--month', help="Bills: billing month (1-12)")
+        parser.add_argument('--paid', choices=['paid', 'unpaid', 'all'], help="Bills: paid status")
+        parser.add_argument('--type', help="Customers: customer type")
+        parser.add_argument('--start', help="Feedback: created on or after (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Feedback: created on or before (YYYY-MM-DD)")
+        parser.add_argument('--sentiment', help="Feedback: Positive, Neutral or Negative")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        params = {name: options[name] for name in ('year', 'month', 'paid', 'type', 'start', 'end', 'sentiment')}
+        try:
+            lines = export(options['kind'], params, fmt=options['format'], chunk_size=options['chunk_size'])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        rows = -1 if options['format'] == 'csv' else 0  # don't count the CSV header
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for line in lines:
+                output.write(line)
+                rows += 1
+        self.stdout.write(self.style.SUCCESS(f"Done: {rows} rows -> {options['output']}"))
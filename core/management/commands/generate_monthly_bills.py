@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.billing import generate_monthly_bills
+from core.models import WasteItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly bill for every customer in chunks. Customers that "
+        "already have a bill for the month are skipped, so the command can be "
+        "re-run safely after a crash."
+    )
+
+    def add_arguments(self, parser):
+        now = timezone.now()
+        parser.add_argument('--month', type=int, default=now.month)
+        parser.add_argument('--year', type=int, default=now.year)
+        parser.add_argument(
+            '--item', action='append', default=[], metavar='WASTE_ITEM_ID=QTY',
+            help="Waste item quantity billed to every customer (repeatable). "
+                 "Without items each bill is the customer's monthly rate.",
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--start-after', type=int, default=0, metavar='CUSTOMER_PK',
+            help="Resume from the last customer pk reported by a previous run.",
+        )
+
+    def handle(self, *args, **options):
+        month, year = options['month'], options['year']
+        if not 1 <= month <= 12:
+            raise CommandError("Month must be between 1 and 12.")
+        if options['chunk_size'] < 1:
+            raise CommandError("Chunk size must be positive.")
+
+        quantities = self._parse_items(options['item'])
+
+        def report(stats):
+            self.stdout.write(
+                f"  {stats['customers']} customers processed | "
+                f"{stats['created']} created | {stats['skipped']} skipped | "
+                f"last customer pk {stats['last_pk']}"
+            )
+
+        self.stdout.write(f"Generating bills for {month:02d}/{year}...")
+        stats = generate_monthly_bills(
+            month,
+            year,
+            quantities=quantities,
+            chunk_size=options['chunk_size'],
+            start_after=options['start_after'],
+            progress=report,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {stats['created']} bills created, {stats['skipped']} skipped."
+        ))
+
+    def _parse_items(self, specs):
+        raw = {}
+        for spec in specs:
+            try:
+                item_id, qty = spec.split('=', 1)
+                raw[int(item_id)] = float(qty)
+            except ValueError:
+                raise CommandError(f"Invalid --item '{spec}', expected WASTE_ITEM_ID=QTY.")
+            if raw[int(item_id)] < 0:
+                raise CommandError("Quantity cannot be negative.")
+
+        items = WasteItem.objects.in_bulk(list(raw))
+        missing = set(raw) - set(items)
+        if missing:
+            raise CommandError(f"Unknown waste item id(s): {', '.join(map(str, sorted(missing)))}")
+        return {items[item_id]: qty for item_id, qty in raw.items()}
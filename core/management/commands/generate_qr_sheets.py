@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Customer
+from core.qr_sheets import customers_by_id, generate_qr_sheets, write_job_status
+
+
+class Command(BaseCommand):
+    help = (
+        "Write printable QR sticker sheets (PDF or tiled PNG pages) for a "
+        "filtered set of customers, rendering codes across a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="PDF file path, or output directory with --format png")
+        parser.add_argument('--format', choices=['pdf', 'png'], default='pdf')
+        parser.add_argument('--type', choices=[value for value, _ in Customer.CUSTOMER_TYPES],
+                            help="Only customers of this type")
+        parser.add_argument('--ids', nargs='+', metavar='CUSTOMER_ID',
+                            help="Only these customer IDs (e.g. CUST123456)")
+        parser.add_argument('--ids-file', metavar='PATH',
+                            help="Only the customer IDs listed in this file, one per line")
+        parser.add_argument('--columns', type=int, default=4)
+        parser.add_argument('--rows', type=int, default=5)
+        parser.add_argument('--processes', type=int, default=None,
+                            help="Worker processes (default: CPU count)")
+        parser.add_argument('--status-file', metavar='PATH',
+                            help="Record the job's progress and outcome in this JSON file (admin jobs)")
+
+    def handle(self, *args, **options):
+        status_file = options['status_file']
+        if not status_file:
+            self.generate(options)
+            return
+        write_job_status(status_file, 'running')
+        try:
+            stats = self.generate(options, status_file)
+        except BaseException as e:
+            write_job_status(status_file, 'failed', error=str(e) or e.__class__.__name__)
+            raise
+        write_job_status(status_file, 'ready', **stats)
+
+    def generate(self, options, status_file=None):
+        if options['columns'] < 1 or options['rows'] < 1:
+            raise CommandError("Columns and rows must be positive.")
+
+        customers = Customer.objects.order_by('customer_id')
+        if options['type']:
+            customers = customers.filter(customer_type=options['type'])
+        if options['ids']:
+            customers = customers.filter(customer_id__in=options['ids'])
+        if options['ids_file']:
+            if options['type'] or options['ids']:
+                raise CommandError("--ids-file cannot be combined with --type or --ids.")
+            try:
+                with open(options['ids_file']) as ids_file:
+                    customer_ids = sorted({line.strip() for line in ids_file if line.strip()})
+            except OSError as e:
+                raise CommandError(f"Cannot read {options['ids_file']}: {e}")
+            customers = customers_by_id(customer_ids)
+
+        def report(done, pages):
+            self.stdout.write(f"  {done} customers | {pages} pages written")
+            if status_file:
+                write_job_status(status_file, 'running', customers=done, pages=pages)
+
+        stats = generate_qr_sheets(
+            customers,
+            options['output'],
+            fmt=options['format'],
+            columns=options['columns'],
+            rows=options['rows'],
+            processes=options['processes'],
+            progress=report,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {stats['customers']} QR codes on {stats['pages']} pages -> {options['output']}"
+        ))
+        return stats
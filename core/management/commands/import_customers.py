@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.customer_import import import_customers
+
+
+class Command(BaseCommand):
+    help = (
+        "Import customers from a CSV or XLSX file in chunks, applying the Add "
+        "Customer form rules and writing rejected rows (with reasons) to a CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or XLSX file with a header row")
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default=None,
+                            help="File format (default: from the extension)")
+        parser.add_argument('--rejects', default=None,
+                            help="Where to write rejected rows (default: <path>.rejects.csv)")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Validate the file without creating customers")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("Chunk size must be positive.")
+        rejects_path = options['rejects'] or f"{options['path']}.rejects.csv"
+
+        def report(rows, created, rejected):
+            self.stdout.write(f"  {rows} rows read | {created} created | {rejected} rejected")
+
+        try:
+            with open(rejects_path, 'w', newline='', encoding='utf-8') as rejects:
+                stats = import_customers(
+                    options['path'],
+                    fmt=options['format'],
+                    rejects=rejects,
+                    chunk_size=options['chunk_size'],
+                    dry_run=options['dry_run'],
+                    progress=report,
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        verb = "would be created" if options['dry_run'] else "created"
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {stats['created']} customers {verb}, {stats['rejected']} rejected."
+        ))
+        if stats['rejected']:
+            self.stdout.write(f"Rejected rows written to {rejects_path}")
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.mail_queue import drain_queue
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued outbound emails in batches over one reused backend "
+        "connection. Runs until stopped unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--interval', type=float,
+                            default=getattr(settings, 'MAIL_QUEUE_POLL_INTERVAL', 5),
+                            help="Seconds to sleep when the queue is empty")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_queue(batch_size=options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f"  {sent} sent | {failed} failed")
+            if options['once']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.retention import purge_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired/verified OTPs and old SentEmail and OutboundEmail rows "
+        "in small primary-key chunks, pausing between chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Rows per DELETE (default: RETENTION_CHUNK_SIZE)")
+        parser.add_argument('--pause', type=float, default=None,
+                            help="Seconds between chunks (default: RETENTION_CHUNK_PAUSE)")
+
+    def handle(self, *args, **options):
+        def report(name, deleted, seconds):
+            self.stdout.write(f"  {name}: {deleted} rows deleted in {seconds:.2f}s")
+
+        results = purge_all(chunk_size=options['chunk_size'], pause=options['pause'], report=report)
+        self.stdout.write(self.style.SUCCESS(f"Done: {sum(results.values())} rows purged."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute every customer's billing summary from the Bill table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        def report(done):
+            self.stdout.write(f"  {done} customers rebuilt")
+
+        total = rebuild_summaries(chunk_size=options['chunk_size'], progress=report)
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} billing summaries rebuilt."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.metrics import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard counters from the customer, bill and feedback tables."
+
+    def handle(self, *args, **options):
+        total = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} dashboard counters rebuilt."))
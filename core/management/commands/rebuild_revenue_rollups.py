@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.reports import rebuild_rollups, refresh_periods
+
+
+class Command(BaseCommand):
+    help = "Recompute the revenue rollups from the Bill table (all periods, or one year/month)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, default=None)
+        parser.add_argument('--month', type=int, default=None, help="Needs --year")
+
+    def handle(self, *args, **options):
+        year, month = options['year'], options['month']
+        if month is not None and (year is None or not 1 <= month <= 12):
+            raise CommandError("--month must be 1-12 and needs --year.")
+
+        if year is None:
+            total = rebuild_rollups()
+        else:
+            total = refresh_periods([(year, m) for m in ([month] if month else range(1, 13))])
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} revenue rollup rows written."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the full-text search indexes and their sync triggers if "
+        "missing, then re-index every feedback comment and customer."
+    )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with connection.schema_editor() as schema_editor:
+            backend.install(schema_editor)
+        counts = backend.rebuild()
+        for name, total in counts.items():
+            self.stdout.write(f"  {name}: {total} rows indexed")
+        self.stdout.write(self.style.SUCCESS(f"Done ({type(backend).__name__})."))
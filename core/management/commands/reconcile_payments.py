@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.reconciliation import reconcile_payments
+
+
+class Command(BaseCommand):
+    help = (
+        "Match a bank/UPI settlement CSV (customer_id, month, year, amount) to "
+        "bills, mark fully paid bills paid in batches and write partial, over- "
+        "and unmatched payments to an exceptions CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Statement CSV with a header row")
+        parser.add_argument('--exceptions', default=None,
+                            help="Where to write the exceptions (default: <path>.exceptions.csv)")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Match and report without marking bills paid")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("Chunk size must be positive.")
+        exceptions_path = options['exceptions'] or f"{options['path']}.exceptions.csv"
+
+        def report(lines, settled, exceptions):
+            self.stdout.write(f"  {lines} lines read | {settled} bills settled | {exceptions} exceptions")
+
+        try:
+            with open(exceptions_path, 'w', newline='', encoding='utf-8') as exceptions:
+                stats = reconcile_payments(
+                    options['path'],
+                    report=exceptions,
+                    chunk_size=options['chunk_size'],
+                    dry_run=options['dry_run'],
+                    progress=report,
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        verb = "would be marked" if options['dry_run'] else "marked"
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {stats['bills_paid']} bills {verb} paid ({stats['amount']}) from {stats['lines']} lines."
+        ))
+        if stats['exceptions']:
+            counts = ', '.join(f"{count} {kind}" for kind, count in sorted(stats['exceptions'].items()))
+            self.stdout.write(f"Exceptions ({counts}) written to {exceptions_path}")
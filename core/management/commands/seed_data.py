@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.seeding import seed_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Create synthetic customers, bills with items, feedback and OTP/outbox "
+        "history for load and scale testing. The same --seed and --end on an "
+        "empty database give the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--months', type=int, default=12,
+                            help="Months billed per customer (customers x months bills)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--end', default=None, metavar='YYYY-MM',
+                            help="Last billed month (default: this month)")
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Customers written per transaction")
+        parser.add_argument('--feedback-rate', type=float, default=0.3,
+                            help="Share of customers leaving feedback")
+        parser.add_argument('--otp-rate', type=float, default=0.2,
+                            help="Share of customers with OTP history")
+
+    def handle(self, *args, **options):
+        if options['customers'] < 1 or options['months'] < 1:
+            raise CommandError("Customers and months must be positive.")
+        if options['chunk_size'] < 1:
+            raise CommandError("Chunk size must be positive.")
+        for name in ('feedback_rate', 'otp_rate'):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be between 0 and 1.")
+        end = None
+        if options['end']:
+            try:
+                year, month = (int(part) for part in options['end'].split('-'))
+            except ValueError:
+                raise CommandError("--end must look like 2026-10.")
+            if not 1 <= month <= 12:
+                raise CommandError("--end month must be between 1 and 12.")
+            end = (year, month)
+
+        def report(stats):
+            self.stdout.write(
+                f"  {stats['customers']} customers | {stats['bills']} bills | "
+                f"{stats['bill_items']} items | {stats['feedback']} feedback | {stats['otps']} OTPs"
+            )
+
+        self.stdout.write(
+            f"Seeding {options['customers']} customers x {options['months']} months "
+            f"(seed {options['seed']})..."
+        )
+        stats = seed_data(
+            options['customers'],
+            options['months'],
+            seed=options['seed'],
+            end=end,
+            chunk_size=options['chunk_size'],
+            feedback_rate=options['feedback_rate'],
+            otp_rate=options['otp_rate'],
+            progress=report,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {stats['customers']} customers, {stats['bills']} bills, "
+            f"{stats['bill_items']} bill items, {stats['feedback']} feedback, "
+            f"{stats['otps']} OTPs and {stats['emails']} sent emails."
+        ))
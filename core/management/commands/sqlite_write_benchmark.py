@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import OperationalError, connection
+
+from core.billing import build_bill, mark_bills_paid
+from core.models import Customer, SentEmail, WasteItem
+from core.otp_utils import create_otp
+
+# Phase label, environment for its workers. 'deferred' has the pragmas but
+# Django's plain BEGIN, which is what read-then-write transactions trip over.
+PHASES = [
+    ('default', {'SQLITE_TUNING': 'False', 'DB_CONN_MAX_AGE': '0'}),
+    ('deferred', {'SQLITE_TUNING': 'True', 'SQLITE_BEGIN_IMMEDIATE': 'False', 'DB_CONN_MAX_AGE': '600'}),
+    ('tuned', {'SQLITE_TUNING': 'True', 'SQLITE_BEGIN_IMMEDIATE': 'True', 'DB_CONN_MAX_AGE': '600'}),
+]
+# mark_paid reads before it writes (SELECT, then UPDATE in one transaction);
+# the others write first
+OPERATIONS = ('otp', 'sent_email', 'bill', 'mark_paid')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent write throughput: worker processes create OTPs, "
+        "outbox mails and bills and mark bills paid as fast as they can on a "
+        "scratch database, first with Django's default SQLite connection (no "
+        "pragmas, one connection per request), then with the SQLITE_* pragmas "
+        "but a deferred BEGIN, then fully tuned (BEGIN IMMEDIATE, CONN_MAX_AGE)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0,
+                            help="How long each phase writes")
+        parser.add_argument('--customers', type=int, default=200,
+                            help="Customers seeded into the scratch database")
+        parser.add_argument('--dir', default=None,
+                            help="Where the scratch database goes (default: next to the real one, "
+                                 "so it is timed on the same disk)")
+        # Internal: run as one of the writer processes
+        parser.add_argument('--worker', type=int, default=None, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker'] is not None:
+            return self._work(options['worker'], options['seconds'])
+
+        if options['workers'] < 1 or options['seconds'] <= 0 or options['customers'] < 1:
+            raise CommandError("Workers, seconds and customers must be positive.")
+        directory = options['dir'] or Path(settings.DATABASES['default']['NAME']).parent
+
+        with tempfile.TemporaryDirectory(prefix='write-benchmark-', dir=directory) as scratch:
+            # One migrated and seeded file, copied per phase. It is built
+            # untuned so the default phase starts from a rollback journal.
+            template = os.path.join(scratch, 'template.sqlite3')
+            self.stdout.write(f"Preparing scratch database with {options['customers']} customers...")
+            untuned = PHASES[0][1]
+            self._manage(['migrate', '--noinput'], template, untuned)
+            self._manage(['seed_data', '--customers', str(options['customers']), '--months', '1'],
+                         template, untuned)
+
+            results = {}
+            for label, env in PHASES:
+                path = os.path.join(scratch, f'{label}.sqlite3')
+                shutil.copyfile(template, path)
+                results[label] = self._phase(path, env, options['workers'], options['seconds'])
+                self._report(label, results[label])
+
+        before, after = results[PHASES[0][0]], results[PHASES[-1][0]]
+        if before['per_second']:
+            self.stdout.write(f"Tuned: {after['per_second'] / before['per_second']:.1f}x the writes/sec.")
+        self.stdout.write(self.style.SUCCESS("Write benchmark complete."))
+
+    # -------------------------
+    # Coordinator
+    # -------------------------
+    def _environment(self, path, overrides):
+        env = os.environ.copy()
+        env.update(overrides, DB_PATH=path)
+        return env
+
+    def _manage(self, args, path, overrides):
+        result = subprocess.run(
+            [sys.executable, 'manage.py'] + args, cwd=settings.BASE_DIR,
+            env=self._environment(path, overrides), capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"{' '.join(args)} failed:\n{result.stderr}")
+
+    def _phase(self, path, overrides, workers, seconds):
+        """
+        Start the workers, let them all set up, then release them together.
+
+        Returns:
+            dict: writes, locked, per_second, p50_ms, p95_ms, and writes and
+                  lock errors by operation
+        """
+        env = self._environment(path, overrides)
+        processes = [
+            subprocess.Popen(
+                [sys.executable, 'manage.py', 'sqlite_write_benchmark',
+                 '--worker', str(n), '--seconds', str(seconds)],
+                cwd=settings.BASE_DIR, env=env, text=True,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            )
+            for n in range(workers)
+        ]
+        try:
+            for process in processes:
+                if process.stdout.readline().strip() != 'ready':
+                    raise CommandError(f"Worker failed to start:\n{process.communicate()[1]}")
+            for process in processes:
+                process.stdin.write('go\n')
+                process.stdin.flush()
+            outputs = []
+            for process in processes:
+                out, err = process.communicate()
+                if process.returncode != 0:
+                    raise CommandError(f"Worker failed:\n{err}")
+                outputs.append(json.loads(out))
+        finally:
+            for process in processes:
+                if process.poll() is None:
+                    process.kill()
+
+        latencies = sorted(ms for out in outputs for ms in out['latencies_ms'])
+        writes = len(latencies)
+        return {
+            'writes': writes,
+            'locked': sum(sum(out['locked'].values()) for out in outputs),
+            'per_second': writes / seconds,
+            'p50_ms': statistics.median(latencies) if latencies else 0.0,
+            'p95_ms': latencies[min(writes - 1, int(writes * 0.95))] if latencies else 0.0,
+            'by_operation': {
+                op: sum(out['by_operation'][op] for out in outputs) for op in OPERATIONS
+            },
+            'locked_by_operation': {
+                op: sum(out['locked'][op] for out in outputs) for op in OPERATIONS
+            },
+        }
+
+    def _report(self, label, result):
+        operations = ', '.join(f"{result['by_operation'][op]} {op}" for op in OPERATIONS)
+        self.stdout.write(
+            f"{label:<8} {result['per_second']:8.1f} writes/sec  "
+            f"p50 {result['p50_ms']:6.1f} ms  p95 {result['p95_ms']:7.1f} ms  ({operations})"
+        )
+        if result['locked']:
+            failures = ', '.join(f"{count} {op}" for op, count in result['locked_by_operation'].items() if count)
+            self.stdout.write(f"{'':<8} {result['locked']} 'database is locked' ({failures})")
+
+    # -------------------------
+    # Worker
+    # -------------------------
+    def _work(self, index, seconds):
+        """
+        Write until the time is up, each write as its own request, and
+        print the results as JSON. Bills go to far-future periods that are
+        unique per worker, and mark_paid pays the bill created just before.
+        """
+        customers = list(Customer.objects.order_by('pk'))
+        items = list(WasteItem.objects.order_by('pk')[:2])
+        if not customers or not items:
+            raise CommandError("The scratch database has no customers or waste items.")
+        connection.close()
+
+        self.stdout.write('ready')
+        self.stdout.flush()
+        sys.stdin.readline()
+
+        latencies = []
+        locked = dict.fromkeys(OPERATIONS, 0)
+        bill = None
+        by_operation = dict.fromkeys(OPERATIONS, 0)
+        deadline = time.perf_counter() + seconds
+        n = 0
+        while time.perf_counter() < deadline:
+            op = OPERATIONS[n % len(OPERATIONS)]
+            slot = n // len(OPERATIONS)
+            customer = customers[slot % len(customers)]
+            started = time.perf_counter()
+            request_started.send(sender=self.__class__)
+            try:
+                if op == 'otp':
+                    create_otp(email=customer.email, otp_type='login')
+                elif op == 'sent_email':
+                    SentEmail.objects.create(to_email=customer.email, subject='Benchmark', body='Benchmark')
+                elif op == 'bill':
+                    bill = None
+                    bill = build_bill(
+                        customer, {item: 1 + slot % 5 for item in items},
+                        month=1 + slot // len(customers) % 12,
+                        year=3000 + index * 100 + slot // (len(customers) * 12),
+                    )
+                elif bill is not None:
+                    mark_bills_paid([bill.pk])
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                locked[op] += 1
+            else:
+                latencies.append((time.perf_counter() - started) * 1000)
+                by_operation[op] += 1
+            finally:
+                request_finished.send(sender=self.__class__)
+            n += 1
+
+        self.stdout.write(json.dumps({
+            'latencies_ms': latencies,
+            'locked': locked,
+            'by_operation': by_operation,
+        }))
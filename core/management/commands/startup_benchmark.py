@@ -0,0 +1,71 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+TARGETS = {
+    'wsgi': ['-c', 'import waste_billing.wsgi'],
+    'check': ['manage.py', 'check'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold start time in fresh interpreters: importing "
+        "waste_billing.wsgi (what a new web worker pays) and running "
+        "`manage.py check`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=10,
+                            help="Show the N packages slowest to import (0 to skip)")
+        parser.add_argument('--max-ms', type=float, default=None,
+                            help="Fail if the median wsgi import takes longer than this")
+
+    def _run(self, args, importtime=False):
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + args
+        started = time.perf_counter()
+        result = subprocess.run(
+            command, cwd=settings.BASE_DIR, env=os.environ.copy(),
+            capture_output=True, text=True,
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+        if result.returncode != 0:
+            raise CommandError(f"{' '.join(args)} failed:\n{result.stderr}")
+        return elapsed, result.stderr
+
+    def handle(self, *args, **options):
+        runs = max(options['runs'], 1)
+        medians = {}
+        for name, target in TARGETS.items():
+            timings = [self._run(target)[0] for _ in range(runs)]
+            medians[name] = statistics.median(timings)
+            self.stdout.write(
+                f"{name:<6} median {medians[name]:7.1f} ms  "
+                f"min {min(timings):7.1f} ms  max {max(timings):7.1f} ms  ({runs} runs)"
+            )
+
+        if options['top']:
+            _, report = self._run(TARGETS['wsgi'], importtime=True)
+            packages = {}
+            for line in report.splitlines():
+                # "import time: self [us] | cumulative | imported package"
+                if not line.startswith('import time:') or 'cumulative' in line:
+                    continue
+                self_us, _, module = line[len('import time:'):].split('|')
+                package = module.strip().split('.')[0]
+                packages[package] = packages.get(package, 0) + int(self_us)
+            self.stdout.write("Import time of waste_billing.wsgi by top-level package:")
+            for package, total in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:options['top']]:
+                self.stdout.write(f"  {total / 1000:7.1f} ms  {package}")
+
+        if options['max_ms'] is not None and medians['wsgi'] > options['max_ms']:
+            raise CommandError(
+                f"waste_billing.wsgi import took {medians['wsgi']:.1f} ms (limit {options['max_ms']} ms)."
+            )
+        self.stdout.write(self.style.SUCCESS("Startup benchmark complete."))
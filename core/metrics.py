@@ -0,0 +1,162 @@
+"""
+Dashboard metrics.
+
+The home page figures are read from DashboardCounter rows (kept current by
+the signal handlers in core.signals) and cached for at most
+DASHBOARD_METRICS_MAX_AGE seconds, so rendering the dashboard never counts
+or sums the base tables.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, When
+from django.db.models.functions import ExtractIsoYear, ExtractWeek
+from django.utils import timezone
+from .models import Bill, Customer, DashboardCounter, Feedback
+
+CACHE_KEY = 'core:dashboard_metrics'
+
+
+# -------------------------
+# Counter Names
+# -------------------------
+def bills_period_key(year, month):
+    return f'bills:{year:04d}-{month:02d}'
+
+
+def feedback_week_key(when):
+    iso_year, iso_week, _ = timezone.localtime(when).isocalendar()
+    return f'feedback:{iso_year:04d}-W{iso_week:02d}'
+
+
+# -------------------------
+# Counter Updates
+# -------------------------
+def incr(name, amount=1):
+    """Add ``amount`` to a counter, creating it on first use."""
+    incr_many({name: amount})
+
+
+def incr_many(amounts):
+    """
+    Add {name: amount} to several counters with one UPDATE, creating the
+    ones that do not exist yet.
+    """
+    amounts = {name: amount for name, amount in amounts.items() if amount}
+    if not amounts:
+        return
+    now = timezone.now()
+    if len(amounts) == 1:
+        value = F('value') + next(iter(amounts.values()))
+    else:
+        value = Case(*[When(name=name, then=F('value') + amount) for name, amount in amounts.items()],
+                     output_field=FloatField())
+    updated = DashboardCounter.objects.filter(name__in=amounts).update(value=value, updated_at=now)
+    if updated == len(amounts):
+        return
+    existing = set(DashboardCounter.objects.filter(name__in=amounts).values_list('name', flat=True))
+    for name in amounts.keys() - existing:
+        try:
+            with transaction.atomic():
+                DashboardCounter.objects.create(name=name, value=amounts[name])
+        except IntegrityError:
+            DashboardCounter.objects.filter(name=name).update(value=F('value') + amounts[name], updated_at=now)
+
+
+def record_bill(total, paid, year, month, sign=1):
+    """Count a created (sign=1) or deleted (sign=-1) bill."""
+    incr_many({
+        'bills': sign,
+        bills_period_key(year, month): sign,
+        'unpaid_total': 0 if paid else sign * total,
+    })
+
+
+def record_bill_changed(previous, state):
+    """
+    Adjust the counters after a bill's amount, paid flag or period changed.
+
+    Args:
+        previous (tuple): Bill.billing_state() before the save
+        state (tuple): Bill.billing_state() after it
+    """
+    _, old_total, old_paid, old_year, old_month = previous
+    _, new_total, new_paid, new_year, new_month = state
+    amounts = {'unpaid_total': (0 if new_paid else new_total) - (0 if old_paid else old_total)}
+    if (old_year, old_month) != (new_year, new_month):
+        amounts[bills_period_key(old_year, old_month)] = -1
+        amounts[bills_period_key(new_year, new_month)] = 1
+    incr_many(amounts)
+
+
+# -------------------------
+# Dashboard
+# -------------------------
+def get_dashboard_metrics():
+    """
+    Return the dashboard figures, at most DASHBOARD_METRICS_MAX_AGE seconds old.
+
+    Returns:
+        dict: total_customers, total_bills, total_feedbacks, unpaid_total,
+              bills_this_month, feedback_this_week
+    """
+    metrics = cache.get(CACHE_KEY)
+    if metrics is not None:
+        return metrics
+
+    now = timezone.localtime()
+    names = {
+        'total_customers': 'customers',
+        'total_bills': 'bills',
+        'total_feedbacks': 'feedback',
+        'unpaid_total': 'unpaid_total',
+        'bills_this_month': bills_period_key(now.year, now.month),
+        'feedback_this_week': feedback_week_key(now),
+    }
+    values = dict(
+        DashboardCounter.objects.filter(name__in=names.values()).values_list('name', 'value')
+    )
+    metrics = {label: values.get(name, 0) for label, name in names.items()}
+    for label in ('total_customers', 'total_bills', 'total_feedbacks', 'bills_this_month', 'feedback_this_week'):
+        metrics[label] = int(metrics[label])
+    metrics['unpaid_total'] = round(metrics['unpaid_total'], 2)
+
+    cache.set(CACHE_KEY, metrics, getattr(settings, 'DASHBOARD_METRICS_MAX_AGE', 60))
+    return metrics
+
+
+def rebuild_counters():
+    """
+    Recompute every dashboard counter from the base tables.
+
+    Returns:
+        int: Number of counters written
+    """
+    bills = Bill.objects.aggregate(
+        count=Count('id'),
+        unpaid=Sum('total_amount', filter=Q(paid=False)),
+    )
+    counters = {
+        'customers': Customer.objects.count(),
+        'bills': bills['count'],
+        'unpaid_total': bills['unpaid'] or 0,
+        'feedback': Feedback.objects.count(),
+    }
+    for row in Bill.objects.values('year', 'month').annotate(n=Count('id')).order_by():
+        counters[bills_period_key(row['year'], row['month'])] = row['n']
+    weeks = (
+        Feedback.objects.annotate(iso_year=ExtractIsoYear('created_at'), week=ExtractWeek('created_at'))
+        .values('iso_year', 'week')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for row in weeks:
+        counters[f"feedback:{row['iso_year']:04d}-W{row['week']:02d}"] = row['n']
+
+    with transaction.atomic():
+        DashboardCounter.objects.all().delete()
+        DashboardCounter.objects.bulk_create(
+            [DashboardCounter(name=name, value=value) for name, value in counters.items()]
+        )
+    cache.delete(CACHE_KEY)
+    return len(counters)
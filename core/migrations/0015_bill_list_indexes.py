@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_sentemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['year', 'month', 'id'], name='bill_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['paid', 'year', 'month', 'id'], name='bill_paid_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['customer_type'], name='customer_type_idx'),
+        ),
+    ]
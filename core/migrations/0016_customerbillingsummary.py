@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_bill_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerBillingSummary',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='billing_summary', serialize=False, to='core.customer')),
+                ('bill_count', models.IntegerField(default=0)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('total_billed', models.FloatField(default=0)),
+                ('outstanding', models.FloatField(default=0)),
+                ('last_bill_date', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
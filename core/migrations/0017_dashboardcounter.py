@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:24
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractIsoYear, ExtractWeek
+
+
+def fill_counters(apps, schema_editor):
+    # Same figures as core.metrics.rebuild_counters, from the historical models
+    Bill = apps.get_model('core', 'Bill')
+    Customer = apps.get_model('core', 'Customer')
+    DashboardCounter = apps.get_model('core', 'DashboardCounter')
+    Feedback = apps.get_model('core', 'Feedback')
+
+    bills = Bill.objects.aggregate(count=Count('id'), unpaid=Sum('total_amount', filter=Q(paid=False)))
+    counters = {
+        'customers': Customer.objects.count(),
+        'bills': bills['count'],
+        'unpaid_total': bills['unpaid'] or 0,
+        'feedback': Feedback.objects.count(),
+    }
+    for row in Bill.objects.values('year', 'month').annotate(n=Count('id')).order_by():
+        counters[f"bills:{row['year']:04d}-{row['month']:02d}"] = row['n']
+    weeks = (
+        Feedback.objects.annotate(iso_year=ExtractIsoYear('created_at'), week=ExtractWeek('created_at'))
+        .values('iso_year', 'week')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for row in weeks:
+        counters[f"feedback:{row['iso_year']:04d}-W{row['week']:02d}"] = row['n']
+
+    DashboardCounter.objects.bulk_create(
+        [DashboardCounter(name=name, value=value) for name, value in counters.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_customerbillingsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['email', 'otp_type', '-created_at'], name='otp_email_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['phone', 'otp_type', '-created_at'], name='otp_phone_lookup_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedback',
+            name='sentiment',
+            field=models.CharField(blank=True, choices=[('Positive', 'Positive'), ('Neutral', 'Neutral'), ('Negative', 'Negative')], max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='feedback',
+            name='sentiment_analyzed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='feedback',
+            name='sentiment_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='feedback',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
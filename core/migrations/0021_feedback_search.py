@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:34
+
+from django.db import migrations, models
+
+
+def install_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        from core.search import SQLiteFTSBackend
+        SQLiteFTSBackend().install(schema_editor, ['feedback'])
+
+
+def uninstall_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        from core.search import SQLiteFTSBackend
+        SQLiteFTSBackend().uninstall(schema_editor, ['feedback'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_feedback_sentiment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['created_at', 'id'], name='feedback_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['sentiment', 'created_at', 'id'], name='feedback_sentiment_idx'),
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:36
+
+from django.db import migrations, models
+
+
+def install_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        from core.search import SQLiteFTSBackend
+        SQLiteFTSBackend().install(schema_editor, ['customer'])
+
+
+def uninstall_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        from core.search import SQLiteFTSBackend
+        SQLiteFTSBackend().uninstall(schema_editor, ['customer'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_feedback_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['phone'], name='customer_phone_idx'),
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
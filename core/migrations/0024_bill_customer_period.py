@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_idsequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['customer', 'year', 'month'], name='bill_customer_period_idx'),
+        ),
+    ]
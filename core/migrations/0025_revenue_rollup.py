@@ -0,0 +1,80 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:54
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+
+
+def fill_rollups(apps, schema_editor):
+    # Same rows as core.reports.rollup_rows, from the historical models
+    Bill = apps.get_model('core', 'Bill')
+    BillItem = apps.get_model('core', 'BillItem')
+    RevenueRollup = apps.get_model('core', 'RevenueRollup')
+
+    def rollup(year, month, customer_type, waste_item_id, totals):
+        billed = float(totals['billed'] or 0)
+        collected = float(totals['collected'] or 0)
+        return RevenueRollup(
+            year=year,
+            month=month,
+            customer_type=customer_type or '',
+            waste_item_id=waste_item_id,
+            bill_count=totals['bill_count'],
+            billed=billed,
+            collected=collected,
+            outstanding=billed - collected,
+        )
+
+    totals = (
+        Bill.objects.values('year', 'month', 'customer__customer_type')
+        .annotate(
+            bill_count=Count('id'),
+            billed=Sum('total_amount'),
+            collected=Sum('total_amount', filter=Q(paid=True)),
+        )
+        .order_by()
+    )
+    rows = [rollup(row['year'], row['month'], row['customer__customer_type'], None, row) for row in totals]
+    lines = (
+        BillItem.objects.values('bill__year', 'bill__month', 'bill__customer__customer_type', 'waste_item')
+        .annotate(
+            bill_count=Count('bill', distinct=True),
+            billed=Sum('amount'),
+            collected=Sum('amount', filter=Q(bill__paid=True)),
+        )
+        .order_by()
+    )
+    rows += [
+        rollup(row['bill__year'], row['bill__month'], row['bill__customer__customer_type'], row['waste_item'], row)
+        for row in lines
+    ]
+    RevenueRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_bill_customer_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('customer_type', models.CharField(max_length=20)),
+                ('bill_count', models.IntegerField(default=0)),
+                ('billed', models.FloatField(default=0)),
+                ('collected', models.FloatField(default=0)),
+                ('outstanding', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('waste_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.wasteitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['year', 'month', 'customer_type'], name='rollup_period_idx')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:57
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_bills(apps, schema_editor):
+    """Stop with a list of the offenders instead of a bare IntegrityError."""
+    Bill = apps.get_model('core', 'Bill')
+    duplicates = list(
+        Bill.objects.values('customer_id', 'year', 'month')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+        .order_by('customer_id', 'year', 'month')[:20]
+    )
+    if duplicates:
+        listed = ', '.join(f"customer {d['customer_id']} {d['year']}-{d['month']:02d} ({d['n']} bills)" for d in duplicates)
+        raise RuntimeError(
+            "Cannot add the one-bill-per-customer-per-month constraint: merge or delete "
+            f"the duplicate bills first. Duplicates include: {listed}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_revenue_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_bills, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['email'], name='customer_email_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bill',
+            constraint=models.UniqueConstraint(fields=('customer', 'year', 'month'), name='unique_bill_per_period'),
+        ),
+        migrations.RemoveIndex(
+            model_name='bill',
+            name='bill_customer_period_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='bill',
+            name='bill_paid_period_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(condition=models.Q(('paid', True)), fields=['year', 'month', 'id'], name='bill_paid_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(condition=models.Q(('paid', False)), fields=['year', 'month', 'id'], name='bill_unpaid_period_idx'),
+        ),
+    ]
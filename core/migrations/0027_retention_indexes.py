@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_bill_unique_period'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['created_at'], name='otp_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outboundemail',
+            index=models.Index(fields=['status', 'created_at'], name='outbound_purge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sentemail',
+            index=models.Index(fields=['created_at'], name='sentemail_created_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:33
+
+import core.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_retention_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSearchIndex',
+            fields=[
+                ('customer', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='core.customer')),
+                ('document', core.models.FullTextField(db_column='core_customer_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'core_customer_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='FeedbackSearchIndex',
+            fields=[
+                ('feedback', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='core.feedback')),
+                ('document', core.models.FullTextField(db_column='core_feedback_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'core_feedback_fts',
+                'managed': False,
+            },
+        ),
+    ]
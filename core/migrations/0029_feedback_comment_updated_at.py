@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:40
+
+from django.db import migrations, models
+
+
+def copy_updated_at(apps, schema_editor):
+    # Until now any save counted as an edit; keep what is already pending
+    Feedback = apps.get_model('core', 'Feedback')
+    Feedback.objects.update(comment_updated_at=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_search_index_models'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedback',
+            name='comment_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        # A nullable column without a default is added in place, so SQLite
+        # keeps the core_feedback table and its full-text search triggers
+        migrations.RunPython(copy_updated_at, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
@@ -11,6 +11,12 @@ class Customer(models.Model):
         ('Shop', 'Shop'),
         ('Hotel', 'Hotel'),
     ]
+    # Monthly rate charged for each customer type
+    TYPE_RATES = {
+        'Household': 300,
+        'Shop': 500,
+        'Hotel': 1000,
+    }
     customer_id = models.CharField(max_length=20, unique=True, blank=True)
     name = models.CharField(max_length=100)
     email = models.EmailField()
@@ -19,19 +25,39 @@ class Customer(models.Model):
     customer_type = models.CharField(max_length=20, choices=CUSTOMER_TYPES, default='Household')
     monthly_rate = models.FloatField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer_type'], name='customer_type_idx'),
+            # Exact phone lookups from the customer search box
+            models.Index(fields=['phone'], name='customer_phone_idx'),
+            # Duplicate email checks in CustomerForm and the OTP request form
+            models.Index(fields=['email'], name='customer_email_idx'),
+        ]
+
+    @staticmethod
+    def generate_customer_id():
+        """Next free ID in the CUSTXXXXXX format, from the core.ids allocator."""
+        from .ids import allocate_customer_ids
+        return allocate_customer_ids(1)[0]
+
+    @classmethod
+    def rate_for_type(cls, customer_type, default=None):
+        """Monthly rate for a customer type, or ``default`` for unknown types."""
+        return cls.TYPE_RATES.get(customer_type, default)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded type so a change can refresh the revenue rollups
+        instance._loaded_type = instance.__dict__.get('customer_type')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.customer_id:
             # Generate customer_id if not provided
-            import random
-            import string
-            self.customer_id = 'CUST' + ''.join(random.choices(string.digits, k=6))
-
-        if self.customer_type == 'Household':
-            self.monthly_rate = 300
-        elif self.customer_type == 'Shop':
-            self.monthly_rate = 500
-        elif self.customer_type == 'Hotel':
-            self.monthly_rate = 1000
+            self.customer_id = self.generate_customer_id()
+
+        self.monthly_rate = self.rate_for_type(self.customer_type, self.monthly_rate)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -59,13 +85,59 @@ class Bill(models.Model):
     year = models.IntegerField(default=timezone.now().year)
     date_created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the bill list, newest period first
+            models.Index(fields=['year', 'month', 'id'], name='bill_period_idx'),
+            # Paid/unpaid filters (bill list, admin). Django writes paid=True
+            # as a bare `WHERE paid`, which SQLite can only match against a
+            # partial index with the same condition, not a (paid, ...) index.
+            models.Index(fields=['year', 'month', 'id'], condition=models.Q(paid=True),
+                         name='bill_paid_period_idx'),
+            models.Index(fields=['year', 'month', 'id'], condition=models.Q(paid=False),
+                         name='bill_unpaid_period_idx'),
+        ]
+        constraints = [
+            # One bill per customer per month; its index also serves the
+            # duplicate checks and a customer's bill for a given period
+            models.UniqueConstraint(fields=['customer', 'year', 'month'], name='unique_bill_per_period'),
+        ]
+
     def __str__(self):
         return f"Bill #{self.id} - {self.customer.name} ({self.customer.customer_type})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so save() can update derived totals by delta
+        instance._loaded_state = instance.billing_state() if not instance.get_deferred_fields() else None
+        return instance
+
+    def billing_state(self):
+        return (self.customer_id, float(self.total_amount or 0), self.paid, self.year, self.month)
+
+    def save(self, *args, **kwargs):
+        # Keep the bill row and the post_save summary updates in one transaction
+        with transaction.atomic():
+            if not self._state.adding and self.pk:
+                # Take the deltas from the row as stored under the lock, not
+                # as loaded: two saves from the same loaded state would
+                # otherwise both apply the same change to the totals.
+                # The stored customer's type comes along for the rollups.
+                stored = (
+                    Bill.objects.select_for_update(of=('self',)).filter(pk=self.pk)
+                    .values_list('customer_id', 'total_amount', 'paid', 'year', 'month',
+                                 'customer__customer_type').first()
+                )
+                if stored is not None:
+                    self._loaded_state = (stored[0], float(stored[1] or 0), *stored[2:5])
+                    self._customer_types = {stored[0]: stored[5]}
+            super().save(*args, **kwargs)
+
     def recalc_total(self):
-        total = sum(item.amount for item in self.items.all()) if hasattr(self, 'items') else self.total_amount
-        self.total_amount = total
-        self.save()
+        total = self.items.aggregate(total=models.Sum('amount'))['total'] or 0
+        self.total_amount = float(total)
+        self.save(update_fields=['total_amount'])
 
 # -------------------------
 # Bill Item Model
@@ -78,8 +150,16 @@ class BillItem(models.Model):
 
     def save(self, *args, **kwargs):
         self.amount = (self.waste_item.unit_price or 0) * (self.quantity or 0)
-        super().save(*args, **kwargs)
-        self.bill.recalc_total()
+        # The line, its rollup delta (core.signals) and the bill total together
+        with transaction.atomic():
+            # Where the line is stored now, so moving it re-sums both bills
+            self._stored_bill_id = None if self._state.adding else (
+                BillItem.objects.filter(pk=self.pk).values_list('bill_id', flat=True).first()
+            )
+            super().save(*args, **kwargs)
+            self.bill.recalc_total()
+            if self._stored_bill_id not in (None, self.bill_id):
+                Bill.objects.get(pk=self._stored_bill_id).recalc_total()
 
     def __str__(self):
         return f"{self.waste_item.name} x {self.quantity}"
@@ -88,13 +168,121 @@ class BillItem(models.Model):
 # Feedback Model
 # -------------------------
 class Feedback(models.Model):
+    SENTIMENT_CHOICES = [
+        ('Positive', 'Positive'),
+        ('Neutral', 'Neutral'),
+        ('Negative', 'Negative'),
+    ]
+
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True)
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Filled in by `manage.py analyze_feedback_sentiment` (core.sentiment)
+    sentiment = models.CharField(max_length=10, choices=SENTIMENT_CHOICES, blank=True, null=True)
+    sentiment_score = models.FloatField(blank=True, null=True)
+    sentiment_analyzed_at = models.DateTimeField(blank=True, null=True)
+    # Set by save() when the comment itself changes, so edits to other fields
+    # do not queue the feedback for sentiment analysis again
+    comment_updated_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the feedback list, newest first
+            models.Index(fields=['created_at', 'id'], name='feedback_created_idx'),
+            models.Index(fields=['sentiment', 'created_at', 'id'], name='feedback_sentiment_idx'),
+        ]
 
     def __str__(self):
         return f"Feedback #{self.id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded comment so save() can tell whether it was edited
+        instance._loaded_comment = instance.__dict__.get('comment')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        edited = self._state.adding or (
+            'comment' in self.__dict__ and self.comment != getattr(self, '_loaded_comment', None)
+        )
+        if edited and (update_fields is None or 'comment' in update_fields):
+            self.comment_updated_at = timezone.now()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'comment_updated_at'}
+        super().save(*args, **kwargs)
+        self._loaded_comment = self.__dict__.get('comment')
+
+# -------------------------
+# Customer Billing Summary
+# -------------------------
+class CustomerBillingSummary(models.Model):
+    """Running billing totals per customer, kept in step with every Bill write."""
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='billing_summary')
+    bill_count = models.IntegerField(default=0)
+    paid_count = models.IntegerField(default=0)
+    total_billed = models.FloatField(default=0)
+    outstanding = models.FloatField(default=0)
+    last_bill_date = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Billing summary for {self.customer_id}"
+
+# -------------------------
+# Dashboard Counter
+# -------------------------
+class DashboardCounter(models.Model):
+    """Named running total for the dashboard (e.g. 'bills', 'bills:2026-10')."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+# -------------------------
+# Revenue Rollup
+# -------------------------
+class RevenueRollup(models.Model):
+    """
+    Billed / collected totals per period and customer type (see core.reports).
+
+    Rows without a waste item hold whole-bill totals; rows with one hold the
+    amounts of that item's bill lines.
+    """
+    year = models.IntegerField()
+    month = models.IntegerField()
+    customer_type = models.CharField(max_length=20)
+    waste_item = models.ForeignKey(WasteItem, on_delete=models.CASCADE, blank=True, null=True)
+    bill_count = models.IntegerField(default=0)
+    billed = models.FloatField(default=0)
+    collected = models.FloatField(default=0)
+    outstanding = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['year', 'month', 'customer_type'], name='rollup_period_idx'),
+        ]
+
+    def __str__(self):
+        item = self.waste_item_id or 'all items'
+        return f"{self.year:04d}-{self.month:02d} {self.customer_type} ({item})"
+
+# -------------------------
+# ID Sequence
+# -------------------------
+class IdSequence(models.Model):
+    """Next free number of a named ID series (see core.ids)."""
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name} -> {self.next_value}"
+
 # -------------------------
 # OTP Model
 # -------------------------
@@ -116,6 +304,14 @@ class OTP(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Latest OTP for a contact (verify_otp)
+            models.Index(fields=['email', 'otp_type', '-created_at'], name='otp_email_lookup_idx'),
+            models.Index(fields=['phone', 'otp_type', '-created_at'], name='otp_phone_lookup_idx'),
+            # Retention purge (core.retention.expired_otps)
+            models.Index(fields=['expires_at'], name='otp_expires_idx'),
+            models.Index(fields=['created_at'], name='otp_created_idx'),
+        ]
     
     def __str__(self):
         contact = self.email if self.otp_type == 'email' else self.phone
@@ -131,11 +327,14 @@ class OTP(models.Model):
         if not self.is_valid():
             return False
         if self.otp_code == otp_input:
-            self.is_verified = True
-            self.save()
-            return True
+            # Conditional UPDATE so a code can only be consumed once
+            consumed = OTP.objects.filter(
+                pk=self.pk, is_verified=False, attempts__lt=models.F('max_attempts')
+            ).update(is_verified=True)
+            self.is_verified = self.is_verified or bool(consumed)
+            return bool(consumed)
+        OTP.objects.filter(pk=self.pk).update(attempts=models.F('attempts') + 1)
         self.attempts += 1
-        self.save()
         return False
 
 
@@ -152,6 +351,100 @@ class SentEmail(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Outbox listing and retention purge
+            models.Index(fields=['created_at'], name='sentemail_created_idx'),
+        ]
 
     def __str__(self):
         return f"Email to {self.to_email} at {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+# -------------------------
+# Outbound Email Queue
+# -------------------------
+class OutboundEmail(models.Model):
+    """Email waiting to be delivered by the mail queue workers (core.mail_queue)."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True, default='')
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Workers pick due messages in next_attempt_at order
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_due_idx'),
+            # Retention purge of sent and failed rows
+            models.Index(fields=['status', 'created_at'], name='outbound_purge_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_status_display()} email to {self.to_email}"
+
+
+# -------------------------
+# Full-text Search Indexes
+# -------------------------
+class FullTextField(models.TextField):
+    """
+    The hidden column an FTS5 table shares its name with; supports ``__match``.
+    """
+
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class CustomerSearchIndex(models.Model):
+    """
+    Row of the core_customer_fts FTS5 table (SQLite only, see core.search).
+
+    Lets a customer query join the index, so its bm25 ``rank`` can be
+    selected and ordered like any other column.
+    """
+    customer = models.OneToOneField(
+        Customer, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_index',
+    )
+    document = FullTextField(db_column='core_customer_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'core_customer_fts'
+
+
+class FeedbackSearchIndex(models.Model):
+    """Row of the core_feedback_fts FTS5 table (SQLite only, see core.search)."""
+    feedback = models.OneToOneField(
+        Feedback, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_index',
+    )
+    document = FullTextField(db_column='core_feedback_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'core_feedback_fts'
@@ -0,0 +1,122 @@
+"""
+Pluggable OTP storage.
+
+``settings.OTP_STORE`` selects where OTPs live:
+
+- ``core.otp_store.DatabaseOTPStore`` (default) keeps them in the OTP table,
+  looked up through the (contact, otp_type, created_at) indexes, with failed
+  attempts counted by atomic ``F()`` updates.
+- ``core.otp_store.CacheOTPStore`` keeps them in the Django cache
+  (``settings.OTP_CACHE_ALIAS``) and lets the cache TTL expire them, so login
+  bursts never touch the database. Use a cache shared by all workers (Redis,
+  Memcached, database cache) in production; the default local-memory cache is
+  per process.
+
+Both stores hand back OTP model instances, so callers can keep using
+``otp.otp_code``, ``otp.is_expired()`` and ``otp.attempts`` either way.
+"""
+import threading
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import OTP
+
+
+class DatabaseOTPStore:
+    """OTPs stored as rows of the OTP model."""
+
+    def create(self, email, phone, otp_type, otp_code, expires_at, max_attempts):
+        return OTP.objects.create(
+            email=email,
+            phone=phone,
+            otp_code=otp_code,
+            otp_type=otp_type,
+            expires_at=expires_at,
+            max_attempts=max_attempts,
+        )
+
+    def latest(self, contact, otp_type):
+        lookup = {'email': contact} if otp_type == 'email' else {'phone': contact}
+        return OTP.objects.filter(otp_type=otp_type, **lookup).order_by('-created_at').first()
+
+    def verify(self, otp, otp_input):
+        return otp.verify(otp_input)
+
+
+class CacheOTPStore:
+    """OTPs stored in the Django cache and expired by its TTL."""
+
+    def __init__(self, alias=None):
+        self.cache = caches[alias or getattr(settings, 'OTP_CACHE_ALIAS', 'default')]
+
+    def _key(self, contact, otp_type):
+        return f'otp:{otp_type}:{contact}'
+
+    def create(self, email, phone, otp_type, otp_code, expires_at, max_attempts):
+        contact = email if otp_type == 'email' else phone
+        key = self._key(contact, otp_type)
+        timeout = max(int((expires_at - timezone.now()).total_seconds()), 1)
+        otp = OTP(
+            email=email,
+            phone=phone,
+            otp_code=otp_code,
+            otp_type=otp_type,
+            created_at=timezone.now(),
+            expires_at=expires_at,
+            max_attempts=max_attempts,
+        )
+        # A new OTP replaces the previous one and resets the attempt count
+        self.cache.set_many({
+            key: {
+                'email': email,
+                'phone': phone,
+                'otp_code': otp_code,
+                'created_at': otp.created_at,
+                'expires_at': expires_at,
+                'max_attempts': max_attempts,
+            },
+            f'{key}:attempts': 0,
+        }, timeout)
+        return otp
+
+    def latest(self, contact, otp_type):
+        key = self._key(contact, otp_type)
+        values = self.cache.get_many([key, f'{key}:attempts'])
+        data = values.get(key)
+        if data is None:
+            return None
+        return OTP(otp_type=otp_type, attempts=values.get(f'{key}:attempts', 0), **data)
+
+    def verify(self, otp, otp_input):
+        if not otp.is_valid():
+            return False
+        key = self._key(otp.email if otp.otp_type == 'email' else otp.phone, otp.otp_type)
+        if otp.otp_code == otp_input:
+            # Deleting is the atomic claim: only one verifier can consume the code
+            if self.cache.delete(key):
+                self.cache.delete(f'{key}:attempts')
+                otp.is_verified = True
+                return True
+            return False
+        try:
+            otp.attempts = self.cache.incr(f'{key}:attempts')
+        except ValueError:
+            # Expired between the read and the increment
+            otp.attempts = otp.max_attempts
+        return False
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_otp_store():
+    """Return the configured OTP store (created once per process)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = getattr(settings, 'OTP_STORE', 'core.otp_store.DatabaseOTPStore')
+                _store = import_string(backend)()
+    return _store
@@ -2,9 +2,11 @@ import random
 import string
 from datetime import timedelta
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
-from .models import OTP, SentEmail
+from .models import OTP
+from .mail_queue import enqueue_email
+from .retention import purge_in_chunks
+from .otp_store import get_otp_store
 
 # -------------------------
 # OTP Generation
@@ -27,7 +29,8 @@ def create_otp(email=None, phone=None, otp_type='email', expiry_minutes=5):
         expiry_minutes (int): Minutes until OTP expires (default: 5)
     
     Returns:
-        OTP: Created OTP object or None if invalid
+        OTP: Created OTP object or None if invalid (unsaved when the
+            configured OTP_STORE is the cache store)
     """
     if not email and not phone:
         return None
@@ -35,12 +38,13 @@ def create_otp(email=None, phone=None, otp_type='email', expiry_minutes=5):
     otp_code = generate_otp()
     expires_at = timezone.now() + timedelta(minutes=expiry_minutes)
     
-    otp = OTP.objects.create(
+    otp = get_otp_store().create(
         email=email,
         phone=phone,
         otp_code=otp_code,
         otp_type=otp_type,
-        expires_at=expires_at
+        expires_at=expires_at,
+        max_attempts=getattr(settings, 'OTP_MAX_ATTEMPTS', 5),
     )
     
     return otp
@@ -58,7 +62,7 @@ def send_otp_email(email, otp_code, customer_name=None):
         customer_name (str): Customer name for personalization
     
     Returns:
-        bool: True if email sent successfully, False otherwise
+        bool: True if the email was queued for delivery, False otherwise
     """
     try:
         subject = "Waste Billing System - Your OTP Code"
@@ -98,30 +102,9 @@ Waste Billing Management System
         </html>
         """
         
-        try:
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-        except Exception as mail_error:
-            print(f"Mail send error (non-critical): {str(mail_error)}")
-            # Continue anyway - store in DB even if SMTP fails
-        
-        try:
-            SentEmail.objects.create(
-                to_email=email,
-                subject=subject,
-                body=message,
-                html_body=html_message
-            )
-        except Exception:
-            # Avoid breaking sending if DB outbox save fails
-            pass
-        print(f"✓ OTP email stored for {email} | Code: {otp_code}")
+        # Delivery happens in the mail queue workers, off the request path
+        enqueue_email(email, subject, message, html_body=html_message)
+        print(f"✓ OTP email queued for {email} | Code: {otp_code}")
         return True
     except Exception as e:
         print(f"Error sending OTP email: {str(e)}")
@@ -182,15 +165,15 @@ def verify_otp(contact, otp_input, otp_type='email'):
             'otp_object': OTP object or None
         }
     """
+    store = get_otp_store()
     try:
         # Get the latest OTP for this contact
-        if otp_type == 'email':
-            otp = OTP.objects.filter(email=contact, otp_type='email').latest('created_at')
-        else:
-            otp = OTP.objects.filter(phone=contact, otp_type='phone').latest('created_at')
+        otp = store.latest(contact, otp_type)
+        if otp is None:
+            raise OTP.DoesNotExist
         
         # Verify the OTP
-        if otp.verify(otp_input):
+        if store.verify(otp, otp_input):
             return {
                 'success': True,
                 'message': 'OTP verified successfully!',
@@ -219,8 +202,5 @@ def verify_otp(contact, otp_input, otp_type='email'):
 # Delete Expired OTPs
 # -------------------------
 def cleanup_expired_otps():
-    """Delete OTPs that have expired"""
-    expired_otps = OTP.objects.filter(expires_at__lt=timezone.now())
-    count = expired_otps.count()
-    expired_otps.delete()
-    return count
+    """Delete OTPs that have expired, in small chunks (see core.retention)"""
+    return purge_in_chunks(OTP.objects.filter(expires_at__lt=timezone.now()))
@@ -0,0 +1,135 @@
+"""
+Keyset (seek) pagination for the list views.
+
+Offset pagination makes the database count and skip every earlier row, so
+deep pages get slower as tables grow. A keyset page instead remembers the
+sort key of its last row and asks for the rows that sort after it, which an
+index on the ordering columns answers directly no matter how deep the page.
+"""
+import base64
+import json
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of results plus the cursors pointing at its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by a unique ordering such as ('-year', '-month', '-id').
+
+    The last field of the ordering must be unique (normally the primary key)
+    so every row has exactly one position.
+    """
+
+    def __init__(self, queryset, ordering, per_page=25):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+
+    # -------------------------
+    # Cursors
+    # -------------------------
+    def encode_cursor(self, obj):
+        values = [getattr(obj, name) for name in self.fields]
+        raw = json.dumps(values, cls=DjangoJSONEncoder).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def _to_python(self, name, value):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # An annotation such as a search rank; JSON already restored it
+            return value
+        return field.to_python(value)
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise InvalidCursor("Invalid page cursor.")
+            return [self._to_python(name, value) for name, value in zip(self.fields, values)]
+        except Exception:
+            raise InvalidCursor("Invalid page cursor.")
+
+    # -------------------------
+    # Paging
+    # -------------------------
+    def _seek(self, values, forward):
+        """Build the WHERE clause for rows after (or before) the given key."""
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            descending = self.descending[i] == forward
+            lookup = 'lt' if descending else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(self.fields[:i], values[:i]):
+                clause &= Q(**{prev_name: prev_value})
+            condition |= clause
+        # Redundant range on the leading column lets the index seek directly.
+        lead = 'lte' if self.descending[0] == forward else 'gte'
+        return Q(**{f'{self.fields[0]}__{lead}': values[0]}) & condition
+
+    def page(self, after=None, before=None):
+        """
+        Return the first page, the page after cursor ``after`` or the page
+        before cursor ``before``.
+        """
+        forward = before is None
+        queryset = self.queryset
+        cursor = after if forward else before
+
+        if cursor:
+            queryset = queryset.filter(self._seek(self.decode_cursor(cursor), forward))
+
+        if forward:
+            ordering = self.ordering
+        else:
+            ordering = tuple(name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering)
+
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if not forward:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([])
+
+        if forward:
+            next_cursor = self.encode_cursor(rows[-1]) if has_more else None
+            previous_cursor = self.encode_cursor(rows[0]) if cursor else None
+        else:
+            next_cursor = self.encode_cursor(rows[-1])
+            previous_cursor = self.encode_cursor(rows[0]) if has_more else None
+
+        return KeysetPage(rows, next_cursor, previous_cursor)
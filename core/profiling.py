@@ -0,0 +1,278 @@
+"""
+Per-request profiling (core.profiling.ProfilingMiddleware).
+
+For every sampled request the middleware records the view, status, wall
+time, SQL query count and time, template render time and response size in
+a bounded in-memory ring buffer; ``/debug/profiles/`` shows it and dumps it
+as JSON. The buffer lives in the process, so each worker keeps its own.
+For streamed responses the time and queries spent producing the body are
+added while it is sent.
+
+cProfile is too slow to leave on, so it is armed per view instead. Note
+that the profile is NOT of the slow request: when a request of a view takes
+longer than PROFILING_SLOW_MS, the *next* sampled request of that view runs
+under cProfile, and its record names the slow request that armed it
+(``profile_trigger``). A slowdown that depends on the request's input (a
+big customer, a cold cache) may not show up in that profile; compare the
+two records' SQL and wall times before reading much into it.
+
+Settings:
+    PROFILING_ENABLED      Install the middleware at all (default: DEBUG)
+    PROFILING_SAMPLE_RATE  Share of requests recorded (0-1, default 0.05)
+    PROFILING_BUFFER_SIZE  Records kept (oldest dropped first)
+    PROFILING_SLOW_MS      Threshold that arms cProfile for the view's next
+                           request; None never profiles
+"""
+import cProfile
+import functools
+import io
+import itertools
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils import timezone
+
+PROFILE_LINES = 40
+DASHBOARD_VIEW = 'core:debug_profiles'
+
+_state = threading.local()
+_lock = threading.Lock()
+_records = None
+_ids = itertools.count(1)
+_armed = {}  # view name -> (id, wall ms) of the slow request that armed it
+
+
+DEFAULT_SAMPLE_RATE = 0.05
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# -------------------------
+# Ring Buffer
+# -------------------------
+def _buffer():
+    global _records
+    if _records is None:
+        _records = deque(maxlen=_setting('PROFILING_BUFFER_SIZE', 500))
+    return _records
+
+
+def record(entry):
+    with _lock:
+        _buffer().append(entry)
+
+
+def recent_profiles():
+    """Recorded requests, oldest first."""
+    with _lock:
+        return list(_buffer())
+
+
+def clear_profiles():
+    with _lock:
+        _buffer().clear()
+        _armed.clear()
+
+
+def summarize(records):
+    """
+    Per-view figures for the dashboard, slowest total first.
+
+    Returns:
+        list: dicts with view, count, avg/p95/max wall ms, avg/max queries,
+              avg SQL ms, avg template ms and avg response bytes
+    """
+    by_view = {}
+    for entry in records:
+        by_view.setdefault(entry['view'], []).append(entry)
+
+    rows = []
+    for view, entries in by_view.items():
+        walls = sorted(e['wall_ms'] for e in entries)
+        count = len(entries)
+        sizes = [e['response_bytes'] for e in entries if e['response_bytes'] is not None]
+        rows.append({
+            'view': view,
+            'count': count,
+            'total_ms': sum(walls),
+            'avg_ms': sum(walls) / count,
+            'p95_ms': walls[min(count - 1, int(count * 0.95))],
+            'max_ms': walls[-1],
+            'avg_queries': sum(e['sql_count'] for e in entries) / count,
+            'max_queries': max(e['sql_count'] for e in entries),
+            'avg_sql_ms': sum(e['sql_ms'] for e in entries) / count,
+            'avg_template_ms': sum(e['template_ms'] for e in entries) / count,
+            'avg_bytes': sum(sizes) / len(sizes) if sizes else None,
+        })
+    rows.sort(key=lambda row: row['total_ms'], reverse=True)
+    return rows
+
+
+# -------------------------
+# Timers
+# -------------------------
+def _sql_timer(entry):
+    """connection.execute_wrapper() that adds each query to ``entry``."""
+    def wrapper(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            entry['sql_count'] += 1
+            entry['sql_ms'] += (time.perf_counter() - start) * 1000
+    return wrapper
+
+
+@contextmanager
+def _timed_sql(entry):
+    """Count the queries run inside the block on every database into ``entry``."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(_sql_timer(entry)))
+        yield
+
+
+def _install_template_timer():
+    """
+    Time top-level Django template renders into the current request's entry.
+
+    Includes and nested renders fall inside their parent's time, and so do
+    queries a template triggers (they are counted under SQL as well).
+    """
+    if getattr(DjangoTemplate.render, '_profiled', False):
+        return
+    original = DjangoTemplate.render
+
+    @functools.wraps(original)
+    def render(self, context=None, request=None):
+        entry = getattr(_state, 'entry', None)
+        if entry is None or _state.rendering:
+            return original(self, context, request)
+        _state.rendering = True
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            _state.rendering = False
+            entry['template_ms'] += (time.perf_counter() - start) * 1000
+
+    render._profiled = True
+    DjangoTemplate.render = render
+
+
+def _profile_text(profiler):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+    return out.getvalue()
+
+
+# -------------------------
+# Middleware
+# -------------------------
+class ProfilingMiddleware:
+    """Record wall, SQL and template time and response size of sampled requests."""
+
+    def __init__(self, get_response):
+        if not _setting('PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _install_template_timer()
+
+    def __call__(self, request):
+        if random.random() >= _setting('PROFILING_SAMPLE_RATE', DEFAULT_SAMPLE_RATE):
+            return self.get_response(request)
+
+        entry = {
+            'id': next(_ids),
+            'at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': None,
+            'status': None,
+            'wall_ms': 0.0,
+            'sql_count': 0,
+            'sql_ms': 0.0,
+            'template_ms': 0.0,
+            'response_bytes': None,
+            'profile': None,
+            'profile_trigger': None,
+        }
+        _state.entry, _state.rendering, _state.profiler = entry, False, None
+        start = time.perf_counter()
+        try:
+            with _timed_sql(entry):
+                response = self.get_response(request)
+        finally:
+            entry['wall_ms'] = (time.perf_counter() - start) * 1000
+            profiler = _state.profiler
+            _state.entry = _state.profiler = None
+            if profiler is not None:
+                profiler.disable()
+
+        match = request.resolver_match
+        entry['view'] = match.view_name if match else request.path
+        if entry['view'] == DASHBOARD_VIEW:
+            return response
+        entry['status'] = response.status_code
+        if response.streaming:
+            response.streaming_content = self._counted(response.streaming_content, entry)
+        else:
+            entry['response_bytes'] = len(response.content)
+        if profiler is not None:
+            entry['profile'] = _profile_text(profiler)
+
+        slow_ms = _setting('PROFILING_SLOW_MS', None)
+        if slow_ms is not None and entry['wall_ms'] > slow_ms and profiler is None:
+            with _lock:
+                _armed.setdefault(entry['view'], (entry['id'], entry['wall_ms']))
+        record(entry)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = request.resolver_match.view_name
+        if getattr(_state, 'entry', None) is None or view not in _armed:
+            return None
+        with _lock:
+            trigger = _armed.pop(view, None)
+        if trigger is None:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another request holds the interpreter's profiler; try next time
+            with _lock:
+                _armed.setdefault(view, trigger)
+            return None
+        _state.profiler = profiler
+        _state.entry['profile_trigger'] = trigger[0]
+        return None
+
+    @staticmethod
+    def _counted(chunks, entry):
+        """
+        Pass a streamed body through, adding the time and queries spent
+        producing it (the view only built the generator) and its size.
+        """
+        chunks = iter(chunks)
+        size = 0
+        while True:
+            start = time.perf_counter()
+            with _timed_sql(entry):
+                chunk = next(chunks, None)
+            entry['wall_ms'] += (time.perf_counter() - start) * 1000
+            if chunk is None:
+                break
+            size += len(chunk)
+            yield chunk
+        entry['response_bytes'] = size
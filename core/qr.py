@@ -0,0 +1,200 @@
+"""
+Customer QR codes.
+
+Rendering a QR code means building the matrix and encoding a PNG through
+Pillow, yet the image only changes when the customer's details change. PNGs
+are therefore cached under the SHA-256 of the QR payload (content-addressed),
+in the backend configured by ``settings.QR_CACHE``::
+
+    QR_CACHE = {
+        'BACKEND': 'core.qr.LocMemQRCache',   # or 'core.qr.FileSystemQRCache'
+        'OPTIONS': {'max_entries': 1000},     # FileSystemQRCache also takes 'location'
+    }
+
+Both backends evict the least recently used images once ``max_entries`` is
+exceeded (FileSystemQRCache checks after every tenth of ``max_entries``
+writes, so it can briefly hold that many more).
+"""
+import contextlib
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# -------------------------
+# Payload & Rendering
+# -------------------------
+def get_qrcode():
+    """
+    Import qrcode on first use.
+
+    qrcode pulls in Pillow, so importing it at module level would slow every
+    worker boot and management command, not just the ones drawing QR codes.
+    """
+    import qrcode
+    return qrcode
+
+
+def qr_payload(customer):
+    """Text encoded in a customer's QR code."""
+    return f"""Customer ID: {customer.customer_id}
+Name: {customer.name}
+Email: {customer.email}
+Phone: {customer.phone or 'N/A'}
+Type: {customer.customer_type}
+Monthly Rate: Rs{customer.monthly_rate}"""
+
+
+def payload_digest(payload):
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def make_qr_image(payload, box_size=10, border=4):
+    """Build the QR code as a Pillow image."""
+    qrcode = get_qrcode()
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.make_image(fill_color="black", back_color="white")
+
+
+def render_qr_png(payload):
+    """Encode the payload as PNG bytes."""
+    buffer = BytesIO()
+    make_qr_image(payload).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+# -------------------------
+# Cache Backends
+# -------------------------
+class LocMemQRCache:
+    """Per-process LRU cache of PNG bytes."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            png = self._data.get(key)
+            if png is not None:
+                self._data.move_to_end(key)
+            return png
+
+    def set(self, key, png):
+        with self._lock:
+            self._data[key] = png
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileSystemQRCache:
+    """
+    PNG files shared by every worker on the host, named by digest.
+
+    Reads touch the file's mtime, so eviction removes the files that were
+    used least recently. Counting the files means scanning the directory, so
+    a process only does that once per ``cull_every`` of its own writes.
+    """
+
+    def __init__(self, location=None, max_entries=10000):
+        self.location = str(location or os.path.join(tempfile.gettempdir(), 'waste_billing_qr'))
+        self.max_entries = max_entries
+        self.cull_every = max(max_entries // 10, 1)
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.location, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.location, f'{key}.png')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                png = f.read()
+            os.utime(path)
+            return png
+        except OSError:
+            return None
+
+    def set(self, key, png):
+        # Write to a temp file and rename so readers never see half a PNG
+        fd, tmp_path = tempfile.mkstemp(dir=self.location, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(png)
+            os.replace(tmp_path, self._path(key))
+        finally:
+            # Only still there if the write or rename failed
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_path)
+        with self._lock:
+            self._writes += 1
+            due = self._writes >= self.cull_every
+            if due:
+                self._writes = 0
+        if due:
+            self._cull()
+
+    def _cull(self):
+        entries = [e for e in os.scandir(self.location) if e.name.endswith('.png')]
+        if len(entries) <= self.max_entries:
+            return
+        # Drop an extra tenth so the next check has room to spare
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - int(self.max_entries * 0.9)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for entry in os.scandir(self.location):
+            if entry.name.endswith('.png'):
+                os.remove(entry.path)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_qr_cache():
+    """Return the configured QR cache backend (created once per process)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = getattr(settings, 'QR_CACHE', {})
+                backend = import_string(config.get('BACKEND', 'core.qr.LocMemQRCache'))
+                _cache = backend(**config.get('OPTIONS', {}))
+    return _cache
+
+
+def get_qr_png(payload, digest=None):
+    """Return the PNG for a payload, rendering it only on a cache miss."""
+    digest = digest or payload_digest(payload)
+    cache = get_qr_cache()
+    png = cache.get(digest)
+    if png is None:
+        png = render_qr_png(payload)
+        cache.set(digest, png)
+    return png
@@ -0,0 +1,408 @@
+"""
+Printable QR sticker sheets.
+
+Lays customer QR codes out on A4 pages with the customer ID and name under
+each code. QR images are rendered across a process pool one batch of pages
+at a time, and every finished page is written straight to disk (streamed
+into a PDF, or saved as sheet_0001.png, sheet_0002.png, ...), so memory and
+the time per page stay flat however many customers are printed.
+
+The customer admin does not render inside the request: it starts
+``manage.py generate_qr_sheets`` as a background process writing into
+QR_SHEETS_DIR, at most QR_SHEET_JOBS_MAX at a time, and lists the jobs with
+the state each process records (see start_sheet_job).
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import zlib
+from multiprocessing import Pool
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Customer
+from .qr import make_qr_image, qr_payload
+
+PAGE_SIZE = (1240, 1754)  # A4 at 150 dpi
+PAGE_MARGIN = 40
+CAPTION_HEIGHT = 56
+PAGES_PER_BATCH = 4
+CUSTOMER_FIELDS = ('customer_id', 'name', 'email', 'phone', 'customer_type', 'monthly_rate')
+ID_CHUNK_SIZE = 500  # Customer IDs per query, well below SQLite's variable limit
+
+
+def get_pil():
+    """Import Pillow on first use: (Image, ImageDraw, ImageFont)."""
+    from PIL import Image, ImageDraw, ImageFont
+    return Image, ImageDraw, ImageFont
+
+
+def _font(size):
+    ImageFont = get_pil()[2]
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def render_tile(job):
+    """
+    Render one sticker: the QR code with ID and name underneath.
+
+    Runs in the worker processes, so it takes and returns plain picklable
+    values: (customer_id, name, payload, tile_size) -> (size, raw L bytes).
+    """
+    customer_id, name, payload, (width, height) = job
+    Image, ImageDraw, _ = get_pil()
+    tile = Image.new('L', (width, height), 255)
+
+    qr = make_qr_image(payload).get_image().convert('L')
+    side = min(width - 16, height - CAPTION_HEIGHT - 8)
+    qr = qr.resize((side, side), Image.NEAREST)
+    tile.paste(qr, ((width - side) // 2, 4))
+
+    draw = ImageDraw.Draw(tile)
+    font = _font(18)
+    for line_no, text in enumerate((customer_id, name[:32])):
+        text_width = draw.textlength(text, font=font)
+        draw.text(((width - text_width) / 2, side + 8 + line_no * 22), text, fill=0, font=font)
+    return tile.size, tile.tobytes()
+
+
+class PdfPageStream:
+    """
+    Minimal PDF writer that appends one full-page 1-bit image per page.
+
+    Pillow's PDF plugin rewrites the whole file on every ``append=True`` and
+    keeps every page in memory for ``save_all``, so pages are written here as
+    they come: image, content stream and page object go straight to the file,
+    and the page tree, catalog and cross-reference table follow on close().
+    """
+
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self, path, resolution=150):
+        self.file = open(path, 'wb')
+        self.resolution = resolution
+        self.offsets = {}
+        self.page_ids = []
+        self._next_id = self.PAGES + 1
+        self.file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _reserve(self):
+        number = self._next_id
+        self._next_id += 1
+        return number
+
+    def _write(self, number, body, stream=None):
+        self.offsets[number] = self.file.tell()
+        self.file.write(b'%d 0 obj\n' % number)
+        if stream is None:
+            self.file.write(body + b'\nendobj\n')
+        else:
+            self.file.write(body[:-2] + b' /Length %d >>\nstream\n' % len(stream))
+            self.file.write(stream + b'\nendstream\nendobj\n')
+
+    def add_page(self, page):
+        """Append a mode '1' image as a page of its own."""
+        width, height = page.size
+        image, contents, page_id = self._reserve(), self._reserve(), self._reserve()
+        self._write(image, (
+            b'<< /Type /XObject /Subtype /Image /Width %d /Height %d'
+            b' /ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /FlateDecode >>'
+        ) % (width, height), zlib.compress(page.tobytes()))
+
+        points = (width * 72.0 / self.resolution, height * 72.0 / self.resolution)
+        self._write(contents, b'<< >>', b'q %.2f 0 0 %.2f 0 0 cm /image Do Q' % points)
+        self._write(page_id, (
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f]'
+            b' /Resources << /XObject << /image %d 0 R >> >> /Contents %d 0 R >>'
+        ) % ((self.PAGES,) + points + (image, contents)))
+        self.page_ids.append(page_id)
+
+    def close(self):
+        kids = b' '.join(b'%d 0 R' % number for number in self.page_ids)
+        self._write(self.PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.page_ids)))
+        self._write(self.CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES)
+
+        xref = self.file.tell()
+        self.file.write(b'xref\n0 %d\n0000000000 65535 f \n' % self._next_id)
+        for number in range(1, self._next_id):
+            self.file.write(b'%010d 00000 n \n' % self.offsets[number])
+        self.file.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                        % (self._next_id, self.CATALOG, xref))
+        self.file.close()
+
+
+class SheetWriter:
+    """
+    Collects tiles into pages and writes each page as soon as it is full.
+
+    A PDF is written to ``<output>.part`` and renamed by close(), so a file
+    at ``output`` is always complete.
+    """
+
+    def __init__(self, output, fmt='pdf', columns=4, rows=5):
+        if fmt not in ('pdf', 'png'):
+            raise ValueError("Format must be 'pdf' or 'png'.")
+        self.output = str(output)
+        self.fmt = fmt
+        self.columns = columns
+        self.rows = rows
+        self.per_page = columns * rows
+        self.tile_size = (
+            (PAGE_SIZE[0] - 2 * PAGE_MARGIN) // columns,
+            (PAGE_SIZE[1] - 2 * PAGE_MARGIN) // rows,
+        )
+        self.pages = 0
+        self._page = None
+        self._slot = 0
+        self._pdf = None
+
+        if fmt == 'png':
+            os.makedirs(self.output, exist_ok=True)
+        else:
+            self._pdf = PdfPageStream(self.output + '.part', resolution=150)
+
+    def add(self, tile):
+        size, data = tile
+        Image = get_pil()[0]
+        if self._page is None:
+            self._page = Image.new('L', PAGE_SIZE, 255)
+        col, row = self._slot % self.columns, self._slot // self.columns
+        self._page.paste(
+            Image.frombytes('L', size, data),
+            (PAGE_MARGIN + col * self.tile_size[0], PAGE_MARGIN + row * self.tile_size[1]),
+        )
+        self._slot += 1
+        if self._slot == self.per_page:
+            self.flush()
+
+    def flush(self):
+        if self._page is None:
+            return
+        self.pages += 1
+        Image = get_pil()[0]
+        # 1-bit pages keep the PDF (Flate) and PNG output small
+        page = self._page.convert('1', dither=Image.Dither.NONE)
+        if self._pdf is not None:
+            self._pdf.add_page(page)
+        else:
+            page.save(os.path.join(self.output, f'sheet_{self.pages:04d}.png'), optimize=True)
+        self._page = None
+        self._slot = 0
+
+    def close(self):
+        """Write the last page and finish the PDF."""
+        self.flush()
+        if self._pdf is not None:
+            self._pdf.close()
+            os.replace(self.output + '.part', self.output)
+            self._pdf = None
+
+    def abort(self):
+        """Drop a half-written PDF."""
+        if self._pdf is not None:
+            self._pdf.file.close()
+            os.remove(self.output + '.part')
+            self._pdf = None
+
+
+def generate_qr_sheets(customers, output, fmt='pdf', columns=4, rows=5,
+                       processes=None, progress=None):
+    """
+    Write printable QR sheets for a queryset of customers.
+
+    Args:
+        customers (QuerySet|iterable): Customers to print, in the order to
+            print them (e.g. customers_by_id())
+        output (str): PDF file path, or directory for PNG sheets
+        fmt (str): 'pdf' or 'png'
+        columns (int): Stickers per row
+        rows (int): Rows per page
+        processes (int): Worker processes (default: CPU count, 1 = no pool)
+        progress (callable): Called with (customers done, pages written)
+
+    Returns:
+        dict: {'customers': int, 'pages': int}
+    """
+    writer = SheetWriter(output, fmt=fmt, columns=columns, rows=rows)
+    batch_size = writer.per_page * PAGES_PER_BATCH
+    if hasattr(customers, 'iterator'):
+        customers = customers.only(*CUSTOMER_FIELDS).iterator(chunk_size=batch_size)
+
+    pool = Pool(processes) if processes != 1 else None
+    done = 0
+    try:
+        batch = []
+        for customer in customers:
+            batch.append((customer.customer_id, customer.name, qr_payload(customer), writer.tile_size))
+            if len(batch) == batch_size:
+                done += _render_batch(batch, writer, pool)
+                batch = []
+                if progress:
+                    progress(done, writer.pages)
+        if batch:
+            done += _render_batch(batch, writer, pool)
+        writer.close()
+        if progress:
+            progress(done, writer.pages)
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return {'customers': done, 'pages': writer.pages}
+
+
+def _render_batch(batch, writer, pool):
+    tiles = pool.imap(render_tile, batch, chunksize=8) if pool else map(render_tile, batch)
+    for tile in tiles:
+        writer.add(tile)
+    return len(batch)
+
+
+def customers_by_id(customer_ids):
+    """
+    Customers for a sorted list of customer IDs, a chunk of IDs per query
+    so that any number of them fits SQLite's limit on query parameters.
+    """
+    for start in range(0, len(customer_ids), ID_CHUNK_SIZE):
+        yield from Customer.objects.only(*CUSTOMER_FIELDS).filter(
+            customer_id__in=customer_ids[start:start + ID_CHUNK_SIZE]
+        ).order_by('customer_id')
+
+
+# -------------------------
+# Background Jobs
+# -------------------------
+class SheetJobLimit(Exception):
+    """QR_SHEET_JOBS_MAX jobs are already running."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def sheets_dir():
+    return Path(_setting('QR_SHEETS_DIR', Path(settings.BASE_DIR) / 'qr_sheets'))
+
+
+def write_job_status(path, status, **details):
+    """
+    Record a job's state in its ``<name>.json`` file (atomically replaced).
+
+    generate_qr_sheets --status-file writes 'running' on every progress
+    report, then 'ready' or 'failed' with the error when it exits.
+    """
+    data = {'status': status, 'pid': os.getpid(), 'updated_at': time.time(), **details}
+    part = f'{path}.part'
+    with open(part, 'w') as status_file:
+        json.dump(data, status_file)
+    os.replace(part, path)
+
+
+def _job_status(path):
+    try:
+        with open(path) as status_file:
+            data = json.load(status_file)
+    except (OSError, ValueError):
+        return None
+    if data.get('status') in ('queued', 'running'):
+        # A killed or hung worker stops reporting progress
+        if time.time() - data.get('updated_at', 0) > _setting('QR_SHEET_JOB_TIMEOUT', 300):
+            data = {**data, 'status': 'failed', 'error': 'Stopped reporting progress'}
+    return data
+
+
+def start_sheet_job(customers):
+    """
+    Generate the sheets for ``customers`` in a separate
+    ``manage.py generate_qr_sheets`` process.
+
+    The customer IDs go to ``<name>.ids``, the command's output to
+    ``<name>.log`` and its state to ``<name>.json`` in QR_SHEETS_DIR; the
+    PDF appears there once complete. Each job renders with
+    QR_SHEET_JOB_PROCESSES workers.
+
+    Args:
+        customers (QuerySet): Customers to print
+
+    Returns:
+        str: File name of the PDF being generated
+
+    Raises:
+        SheetJobLimit: If QR_SHEET_JOBS_MAX jobs are already running
+    """
+    running = [job for job in sheet_jobs() if job['status'] in ('queued', 'running')]
+    if len(running) >= _setting('QR_SHEET_JOBS_MAX', 2):
+        raise SheetJobLimit(f"{len(running)} QR sheet jobs are already running; try again when one is done.")
+
+    directory = sheets_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = timezone.now().strftime('qr_sheets_%Y%m%d_%H%M%S_%f.pdf')
+    ids_path = directory / f'{name}.ids'
+    status_path = directory / f'{name}.json'
+    with open(ids_path, 'w') as ids_file:
+        for customer_id in customers.order_by('customer_id').values_list('customer_id', flat=True).iterator():
+            ids_file.write(f'{customer_id}\n')
+    write_job_status(status_path, 'queued')
+
+    command = _setting('QR_SHEET_JOB_COMMAND', None) or [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py')]
+    processes = _setting('QR_SHEET_JOB_PROCESSES', 2)
+    with open(directory / f'{name}.log', 'w') as log:
+        subprocess.Popen(
+            [*command, 'generate_qr_sheets', str(directory / name), '--ids-file', str(ids_path),
+             '--status-file', str(status_path), '--processes', str(processes)],
+            cwd=settings.BASE_DIR, stdout=log, stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL, start_new_session=True,
+        )
+    return name
+
+
+def sheet_jobs():
+    """
+    Jobs in QR_SHEETS_DIR, newest first.
+
+    Finished jobs lose their ``.ids`` file, and every file of a job older
+    than QR_SHEETS_KEEP_DAYS is deleted.
+
+    Returns:
+        list: dicts with name, status ('queued', 'running', 'ready' or
+              'failed'), size in bytes (ready only) and the last line of
+              the log or the error
+    """
+    directory = sheets_dir()
+    if not directory.is_dir():
+        return []
+    cutoff = time.time() - _setting('QR_SHEETS_KEEP_DAYS', 7) * 86400
+    jobs = []
+    for status_path in sorted(directory.glob('qr_sheets_*.pdf.json'), reverse=True):
+        name = status_path.name[:-len('.json')]
+        data = _job_status(status_path)
+        if data is None:
+            continue
+        status = data['status']
+        paths = [directory / name, directory / f'{name}.ids', directory / f'{name}.log', status_path]
+        if status in ('ready', 'failed') and status_path.stat().st_mtime < cutoff:
+            for path in paths:
+                path.unlink(missing_ok=True)
+            continue
+        if status in ('ready', 'failed'):
+            paths[1].unlink(missing_ok=True)
+
+        pdf = directory / name
+        size = pdf.stat().st_size if status == 'ready' and pdf.exists() else None
+        log = data.get('error', '')
+        if not log and paths[2].exists():
+            lines = paths[2].read_text(errors='replace').strip().splitlines()
+            log = lines[-1] if lines else ''
+        jobs.append({'name': name, 'status': status, 'size': size, 'log': log})
+    return jobs
@@ -0,0 +1,276 @@
+"""
+Payment reconciliation from bank / UPI settlement files.
+
+A statement is a CSV with a header row and one payment per line:
+customer_id, month, year and amount, plus an optional reference. It is read
+as a stream and handled in chunks; for each chunk the customers and their
+bills for the periods mentioned are loaded with one query each, payments are
+matched in memory and the fully paid bills are marked with set-based UPDATEs
+(billing.mark_bills_paid). Lines that cannot be applied cleanly go to an
+exceptions CSV:
+
+- ``invalid``: the line could not be parsed
+- ``unmatched``: unknown customer ID, or no bill for that period
+- ``duplicate``: the bill was already paid
+- ``partial``: the payments for a bill add up to less than its total
+  (the bill stays unpaid)
+- ``overpaid``: the payments add up to more than the total (the bill is
+  marked paid; the excess needs a refund or credit)
+
+Several lines paying one bill are added up, also across chunks: a bill that
+is short at the end of one chunk waits for the rest of the file before it is
+reported as partial.
+"""
+import csv
+import io
+import os
+from decimal import Decimal, InvalidOperation
+
+from .billing import mark_bills_paid
+from .models import Bill, Customer
+from .reports import deferred_refresh
+
+STATEMENT_FIELDS = ['reference', 'customer_id', 'month', 'year', 'amount']
+CENT = Decimal('0.01')
+
+
+def _header(name):
+    return str(name or '').strip().lower().replace(' ', '_')
+
+
+def read_statement(source):
+    """Yield (line number, dict) per statement line; ``source`` is a path or a binary file."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline='', encoding='utf-8-sig') as f:
+            yield from read_statement(f)
+        return
+    if not isinstance(source, io.TextIOBase):
+        source = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    reader = csv.reader(source)
+    header = [_header(name) for name in next(reader, [])]
+    missing = set(STATEMENT_FIELDS) - {'reference'} - set(header)
+    if missing:
+        raise ValueError(f"Statement is missing column(s): {', '.join(sorted(missing))}.")
+    for values in reader:
+        if any(value.strip() for value in values):
+            yield reader.line_num, dict(zip(header, values))
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+class Payment:
+    """One parsed statement line."""
+
+    def __init__(self, line, row, customer_id, month, year, amount):
+        self.line = line
+        self.row = row
+        self.customer_id = customer_id
+        self.month = month
+        self.year = year
+        self.amount = amount
+
+
+def parse_payment(line, row):
+    """
+    Returns:
+        tuple: (Payment or None, error message or None)
+    """
+    customer_id = (row.get('customer_id') or '').strip().upper()
+    if not customer_id:
+        return None, "Missing customer ID."
+    try:
+        month = int((row.get('month') or '').strip())
+        year = int((row.get('year') or '').strip())
+    except ValueError:
+        return None, "Month and year must be numbers."
+    if not 1 <= month <= 12:
+        return None, "Month must be between 1 and 12."
+    try:
+        amount = _money((row.get('amount') or '').strip().replace(',', ''))
+    except InvalidOperation:
+        return None, "Amount is not a number."
+    if amount <= 0:
+        return None, "Amount must be positive."
+    return Payment(line, row, customer_id, month, year, amount), None
+
+
+# -------------------------
+# Exceptions Report
+# -------------------------
+class ExceptionsWriter:
+    """Exceptions as CSV: line, kind, detail, matched bill, then the original columns."""
+
+    def __init__(self, output):
+        self.output = output
+        self.counts = {}
+        self._writer = None
+
+    def write(self, line, row, kind, detail, bill_id=None, bill_total=None, received=None):
+        if self._writer is None:
+            self._writer = csv.writer(self.output)
+            self._writer.writerow(
+                ['line', 'kind', 'detail', 'bill_id', 'bill_total', 'received'] + STATEMENT_FIELDS
+            )
+        self._writer.writerow(
+            [line, kind, detail, bill_id or '', '' if bill_total is None else bill_total,
+             '' if received is None else received]
+            + [row.get(name, '') for name in STATEMENT_FIELDS]
+        )
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+
+# -------------------------
+# Matching
+# -------------------------
+class _OpenBill:
+    """A bill with the payments received for it so far."""
+
+    def __init__(self, pk, total):
+        self.pk = pk
+        self.total = total
+        self.payments = []
+
+    @property
+    def received(self):
+        return sum((payment.amount for payment in self.payments), Decimal('0.00'))
+
+
+def _load_bills(payments):
+    """
+    Customers and bills referenced by a chunk, in two queries.
+
+    Returns:
+        tuple: ({customer_id: pk}, {(customer pk, year, month): (bill pk, total, paid)})
+    """
+    customers = dict(
+        Customer.objects.filter(customer_id__in={p.customer_id for p in payments})
+        .values_list('customer_id', 'pk')
+    )
+    bills = {}
+    if customers:
+        rows = (
+            Bill.objects.filter(
+                customer_id__in=customers.values(),
+                year__in={p.year for p in payments},
+                month__in={p.month for p in payments},
+            )
+            .order_by('paid', 'id')
+            .values_list('customer_id', 'year', 'month', 'pk', 'total_amount', 'paid')
+        )
+        for customer_pk, year, month, pk, total, paid in rows:
+            # Unpaid bills sort first, so a duplicate period's open bill wins
+            bills.setdefault((customer_pk, year, month), (pk, _money(total), paid))
+    return customers, bills
+
+
+def _reconcile_chunk(chunk, state, report, dry_run):
+    """Match one chunk of (line, row) pairs and mark the bills it settles paid."""
+    payments = []
+    for line, row in chunk:
+        payment, error = parse_payment(line, row)
+        if error:
+            report.write(line, row, 'invalid', error)
+        else:
+            payments.append(payment)
+    if not payments:
+        return
+
+    customers, bills = _load_bills(payments)
+    touched = {}
+    for payment in payments:
+        customer_pk = customers.get(payment.customer_id)
+        if customer_pk is None:
+            report.write(payment.line, payment.row, 'unmatched', "Unknown customer ID.")
+            continue
+        bill = bills.get((customer_pk, payment.year, payment.month))
+        if bill is None:
+            report.write(payment.line, payment.row, 'unmatched',
+                         f"No bill for {payment.month:02d}/{payment.year}.")
+            continue
+        pk, total, paid = bill
+        if paid or pk in state['settled']:
+            report.write(payment.line, payment.row, 'duplicate', "Bill is already paid.",
+                         pk, total, payment.amount)
+            continue
+        if pk not in touched:
+            touched[pk] = state['pending'].pop(pk, None) or _OpenBill(pk, total)
+        touched[pk].payments.append(payment)
+
+    settled = []
+    for pk, open_bill in touched.items():
+        if open_bill.received < open_bill.total:
+            state['pending'][pk] = open_bill  # the rest may come later in the file
+        else:
+            settled.append(open_bill)
+    if not settled:
+        return
+
+    marked = {b.pk for b in settled} if dry_run else set(mark_bills_paid([b.pk for b in settled]))
+    for open_bill in settled:
+        received = open_bill.received
+        if open_bill.pk not in marked:
+            # Paid by someone else between the lookup and the UPDATE
+            for payment in open_bill.payments:
+                report.write(payment.line, payment.row, 'duplicate', "Bill is already paid.",
+                             open_bill.pk, open_bill.total, payment.amount)
+            continue
+        state['settled'].add(open_bill.pk)
+        state['matched'] += len(open_bill.payments)
+        state['applied'] += open_bill.total
+        if received > open_bill.total:
+            for payment in open_bill.payments:
+                report.write(payment.line, payment.row, 'overpaid',
+                             f"Received {received} for a bill of {open_bill.total}.",
+                             open_bill.pk, open_bill.total, received)
+
+
+@deferred_refresh()
+def reconcile_payments(source, report=None, chunk_size=1000, dry_run=False, progress=None):
+    """
+    Apply a payment statement to the bills.
+
+    Args:
+        source: Path or binary file object of the statement CSV
+        report: Text file object the exceptions CSV is written to (optional)
+        chunk_size (int): Lines matched per round of queries
+        dry_run (bool): Match and report only, mark nothing paid
+        progress (callable): Called with (lines read, bills settled, exceptions)
+
+    Returns:
+        dict: {'lines': int, 'matched': int, 'bills_paid': int, 'amount': Decimal,
+               'exceptions': {kind: int}}
+    """
+    writer = ExceptionsWriter(report if report is not None else io.StringIO())
+    state = {'pending': {}, 'settled': set(), 'matched': 0, 'applied': Decimal('0.00')}
+    lines = 0
+    chunk = []
+    for line, row in read_statement(source):
+        chunk.append((line, row))
+        lines += 1
+        if len(chunk) == chunk_size:
+            _reconcile_chunk(chunk, state, writer, dry_run)
+            chunk = []
+            if progress:
+                progress(lines, len(state['settled']), sum(writer.counts.values()))
+    if chunk:
+        _reconcile_chunk(chunk, state, writer, dry_run)
+
+    # Whatever is still short after the whole file is a partial payment
+    for open_bill in state['pending'].values():
+        received = open_bill.received
+        for payment in open_bill.payments:
+            writer.write(payment.line, payment.row, 'partial',
+                         f"Received {received} of {open_bill.total}.",
+                         open_bill.pk, open_bill.total, received)
+    if progress:
+        progress(lines, len(state['settled']), sum(writer.counts.values()))
+
+    return {
+        'lines': lines,
+        'matched': state['matched'],
+        'bills_paid': len(state['settled']),
+        'amount': state['applied'],
+        'exceptions': dict(writer.counts),
+    }
@@ -0,0 +1,392 @@
+"""
+Revenue and collection reporting.
+
+RevenueRollup holds, per (year, month, customer type), the bill count and
+the billed, collected and outstanding amounts, once for whole bills
+(``waste_item`` empty) and once per waste item. Report pages read only this
+table, so a multi-year trend is a scan of a few hundred rows however many
+bills there are.
+
+Single bill and bill item writes (save, delete, replacing a bill's items)
+adjust the affected rows by delta in the same transaction, like the
+customer billing summaries, so editing one bill costs a few indexed UPDATEs
+however big its month is. Bulk writes schedule their (year, month) periods instead, and the
+scheduled periods are recomputed from the Bill table with grouped
+aggregates once the transaction commits. Bulk jobs wrap their work in
+``deferred_refresh()`` so each period is recomputed once per run instead of
+once per chunk. ``manage.py rebuild_revenue_rollups`` recomputes
+everything, e.g. after raw SQL or QuerySet.update() writes to bills or
+customer types.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Bill, BillItem, Customer, RevenueRollup
+
+_state = threading.local()
+
+
+# -------------------------
+# Computing Rows
+# -------------------------
+def rollup_rows(bills, items):
+    """
+    Build rollup rows from a Bill queryset and the matching BillItem queryset.
+
+    Args:
+        bills (QuerySet): Bills to aggregate
+        items (QuerySet): Their bill items
+
+    Returns:
+        list: Unsaved rollup objects
+    """
+    rows = []
+    totals = (
+        bills.values('year', 'month', 'customer__customer_type')
+        .annotate(
+            bill_count=Count('id'),
+            billed=Sum('total_amount'),
+            collected=Sum('total_amount', filter=Q(paid=True)),
+        )
+        .order_by()
+    )
+    for row in totals:
+        rows.append(_row(row['year'], row['month'], row['customer__customer_type'], None, row))
+
+    lines = (
+        items.values('bill__year', 'bill__month', 'bill__customer__customer_type', 'waste_item')
+        .annotate(
+            bill_count=Count('bill', distinct=True),
+            billed=Sum('amount'),
+            collected=Sum('amount', filter=Q(bill__paid=True)),
+        )
+        .order_by()
+    )
+    for row in lines:
+        rows.append(_row(row['bill__year'], row['bill__month'], row['bill__customer__customer_type'],
+                         row['waste_item'], row))
+    return rows
+
+
+def _row(year, month, customer_type, waste_item_id, totals):
+    billed = float(totals['billed'] or 0)
+    collected = float(totals['collected'] or 0)
+    return RevenueRollup(
+        year=year,
+        month=month,
+        customer_type=customer_type or '',
+        waste_item_id=waste_item_id,
+        bill_count=totals['bill_count'],
+        billed=billed,
+        collected=collected,
+        outstanding=billed - collected,
+    )
+
+
+def refresh_periods(periods):
+    """
+    Recompute the rollup rows of the given (year, month) periods.
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    written = 0
+    for year, month in sorted(set(periods)):
+        rows = rollup_rows(
+            Bill.objects.filter(year=year, month=month),
+            BillItem.objects.filter(bill__year=year, bill__month=month),
+        )
+        with transaction.atomic():
+            RevenueRollup.objects.filter(year=year, month=month).delete()
+            RevenueRollup.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+def rebuild_rollups():
+    """
+    Recompute the whole rollup table from the Bill table.
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    rows = rollup_rows(Bill.objects.all(), BillItem.objects.all())
+    with transaction.atomic():
+        RevenueRollup.objects.all().delete()
+        RevenueRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+# -------------------------
+# Single Bill Deltas
+# -------------------------
+def item_amounts(bill_id):
+    """{waste_item_id: amount} of a bill's stored lines."""
+    return {
+        item_id: float(amount or 0)
+        for item_id, amount in BillItem.objects.filter(bill_id=bill_id)
+        .values('waste_item').annotate(amount=Sum('amount')).order_by()
+        .values_list('waste_item', 'amount')
+    }
+
+
+def _contribution(period, total, paid, items, sign=1, whole=True):
+    """
+    What one bill adds to (or, with sign=-1, removes from) the rollups.
+
+    Args:
+        period (tuple): (year, month, customer_type)
+        total (float): Bill total (whole-bill row)
+        paid (bool): Whether the amounts count as collected
+        items (dict): {waste_item_id: amount} (item rows)
+        whole (bool): Include the whole-bill row
+
+    Returns:
+        dict: {(year, month, customer_type, waste_item_id): [bills, billed, collected]}
+    """
+    rows = {}
+    if whole:
+        rows[period + (None,)] = [sign, sign * total, sign * total if paid else 0]
+    for item_id, amount in items.items():
+        rows[period + (item_id,)] = [sign, sign * amount, sign * amount if paid else 0]
+    return rows
+
+
+def _apply(*contributions):
+    """
+    Add the summed contributions to their rollup rows, creating missing rows.
+
+    The rows are looked up in one query and written with one bulk UPDATE
+    (and one INSERT for new rows), so a bill with many items costs the same
+    number of queries as a bill with one.
+    """
+    delta = {}
+    for contribution in contributions:
+        for key, values in contribution.items():
+            totals = delta.setdefault(key, [0, 0.0, 0.0])
+            for i, value in enumerate(values):
+                totals[i] += value
+    delta = {
+        key: totals for key, totals in delta.items()
+        if totals[0] or abs(totals[1]) >= 0.005 or abs(totals[2]) >= 0.005
+    }
+    if not delta:
+        return
+
+    item_ids = {key[3] for key in delta if key[3] is not None}
+    rows = RevenueRollup.objects.filter(
+        year__in={key[0] for key in delta},
+        month__in={key[1] for key in delta},
+        customer_type__in={key[2] for key in delta},
+    ).filter(Q(waste_item__isnull=True) | Q(waste_item_id__in=item_ids))
+    existing = {}
+    for pk, *key in rows.values_list('pk', 'year', 'month', 'customer_type', 'waste_item_id'):
+        existing.setdefault(tuple(key), pk)
+
+    now = timezone.now()
+    updates = []
+    missing = []
+    for key, (bills, billed, collected) in delta.items():
+        if key in existing:
+            updates.append(RevenueRollup(
+                pk=existing[key],
+                bill_count=F('bill_count') + bills,
+                billed=F('billed') + billed,
+                collected=F('collected') + collected,
+                outstanding=F('outstanding') + (billed - collected),
+                updated_at=now,
+            ))
+        else:
+            # First bill of the period/type/item. Reports sum the rows, so a
+            # concurrent writer adding the same row twice still adds up.
+            year, month, customer_type, item_id = key
+            missing.append(RevenueRollup(
+                year=year, month=month, customer_type=customer_type, waste_item_id=item_id,
+                bill_count=bills, billed=billed, collected=collected, outstanding=billed - collected,
+            ))
+    RevenueRollup.objects.bulk_update(
+        updates, ['bill_count', 'billed', 'collected', 'outstanding', 'updated_at']
+    )
+    RevenueRollup.objects.bulk_create(missing)
+
+
+def _customer_types(bill, *customer_ids):
+    """
+    {customer_id: customer_type}, taken from what the bill already loaded
+    (its cached customer, or the stored type Bill.save read under the lock)
+    before asking the database.
+    """
+    types = dict(getattr(bill, '_customer_types', None) or {})
+    if bill is not None and Bill.customer.is_cached(bill) and bill.customer.pk == bill.customer_id:
+        types[bill.customer_id] = bill.customer.customer_type
+    missing = set(customer_ids) - set(types)
+    if missing:
+        types.update(Customer.objects.filter(pk__in=missing).values_list('pk', 'customer_type'))
+    return types
+
+
+def record_bill_saved(bill, created, previous=None):
+    """
+    Apply a saved bill, and any lines written with it, to the rollups by delta.
+
+    Writers that replace a bill's lines and then save its total set
+    ``bill._items_changed = (old_items, new_items)`` first, so the whole-bill
+    and item rows move in one pass. Otherwise an edited bill moves its stored
+    items along when its period, customer type or paid flag changes.
+
+    Args:
+        bill (Bill): The bill that was just saved
+        created (bool): True if the bill was inserted
+        previous (tuple): Bill.billing_state() as loaded; without it the
+            bill's periods are recomputed instead
+    """
+    old_items, new_items = bill.__dict__.pop('_items_changed', (None, None))
+    state = bill.billing_state()
+    if created:
+        types = _customer_types(bill, state[0])
+        _apply(_contribution((state[3], state[4], types.get(state[0], '')), state[1], state[2], new_items or {}))
+        return
+    if previous is None:
+        schedule_refresh({(bill.year, bill.month)})
+        return
+    if previous == state and old_items == new_items:
+        return
+
+    types = _customer_types(bill, previous[0], state[0])
+    old_period = (previous[3], previous[4], types.get(previous[0], ''))
+    new_period = (state[3], state[4], types.get(state[0], ''))
+    if old_items is None:
+        moved = (old_period, previous[2]) != (new_period, state[2])
+        old_items = new_items = item_amounts(bill.pk) if moved else {}
+    _apply(
+        _contribution(old_period, previous[1], previous[2], old_items, sign=-1),
+        _contribution(new_period, state[1], state[2], new_items),
+    )
+
+
+def record_bill_deleted(state, items, bill=None):
+    """
+    Remove a deleted bill from the rollups.
+
+    Args:
+        state (tuple): The bill's Bill.billing_state()
+        items (dict): Its item_amounts(), read before the delete cascaded
+        bill (Bill): The deleted instance, for its loaded customer type
+    """
+    types = _customer_types(bill, state[0])
+    _apply(_contribution((state[3], state[4], types.get(state[0], '')), state[1], state[2], items, sign=-1))
+
+
+def record_items_changed(bill, old_items, new_items):
+    """
+    Apply a change to a bill's lines to the per-item rollup rows.
+
+    The whole-bill row follows when the bill's new total is saved.
+
+    Args:
+        bill (Bill): The bill, as stored (its period and paid flag)
+        old_items (dict): {waste_item_id: amount} before the change
+        new_items (dict): {waste_item_id: amount} after the change
+    """
+    state = getattr(bill, '_loaded_state', None) or bill.billing_state()
+    period = (state[3], state[4], _customer_types(bill, state[0]).get(state[0], ''))
+    _apply(
+        _contribution(period, 0, state[2], old_items, sign=-1, whole=False),
+        _contribution(period, 0, state[2], new_items, whole=False),
+    )
+
+
+# -------------------------
+# Scheduling Refreshes
+# -------------------------
+def _pending():
+    if not hasattr(_state, 'periods'):
+        _state.periods = set()
+        _state.deferred = False
+    return _state.periods
+
+
+def _flush():
+    periods = set(_pending())
+    _state.periods.clear()
+    if periods:
+        refresh_periods(periods)
+
+
+def schedule_refresh(periods):
+    """
+    Refresh the rollups of ``periods`` after the current transaction commits
+    (immediately when not in a transaction).
+
+    Periods scheduled by several writes in one transaction are recomputed
+    once, by whichever commit callback runs first.
+    """
+    pending = _pending()
+    pending.update(periods)
+    if pending and not _state.deferred:
+        transaction.on_commit(_flush)
+
+
+@contextmanager
+def deferred_refresh():
+    """Hold back scheduled refreshes until the block ends, then run them once."""
+    _pending()
+    outer = _state.deferred
+    _state.deferred = True
+    try:
+        yield
+    finally:
+        _state.deferred = outer
+        if not outer:
+            # Chunks committed before an error are in the Bill table too
+            transaction.on_commit(_flush)
+
+
+# -------------------------
+# Reports
+# -------------------------
+def _with_rate(row):
+    row['outstanding'] = row['billed'] - row['collected']
+    row['collection_rate'] = round(100 * row['collected'] / row['billed'], 1) if row['billed'] else None
+    return row
+
+
+def _rollups(start_year, end_year, customer_type=None, items=False):
+    rollups = RevenueRollup.objects.filter(year__gte=start_year, year__lte=end_year,
+                                           waste_item__isnull=not items)
+    if customer_type:
+        rollups = rollups.filter(customer_type=customer_type)
+    return rollups
+
+
+def _summed(rollups, *group_by):
+    return [
+        _with_rate(row) for row in
+        rollups.values(*group_by)
+        .annotate(bill_count=Sum('bill_count'), billed=Sum('billed'), collected=Sum('collected'))
+        .order_by(*group_by)
+    ]
+
+
+def revenue_trend(start_year, end_year, customer_type=None):
+    """
+    Monthly and yearly revenue between two years (inclusive).
+
+    Returns:
+        tuple: (list of month dicts, list of year dicts); each dict holds
+               bill_count, billed, collected, outstanding and collection_rate
+    """
+    rollups = _rollups(start_year, end_year, customer_type)
+    return _summed(rollups, 'year', 'month'), _summed(rollups, 'year')
+
+
+def revenue_by_customer_type(start_year, end_year):
+    return _summed(_rollups(start_year, end_year), 'customer_type')
+
+
+def revenue_by_waste_item(start_year, end_year, customer_type=None):
+    return _summed(_rollups(start_year, end_year, customer_type, items=True), 'waste_item__name')
@@ -0,0 +1,102 @@
+"""
+Retention purges for tables that only ever grow: OTP, SentEmail and
+OutboundEmail.
+
+Rows are deleted in bounded primary-key chunks with a short pause between
+chunks, so no single DELETE holds SQLite's write lock for long and OTP
+inserts from logins keep flowing while a purge runs. The purge first finds
+the newest matching primary key through the cutoff index, then walks the
+key range up to it once, each chunk starting after the last key of the one
+before; rows inserted while it runs are never visited. Windows are set in
+settings (OTP_RETENTION_HOURS, SENT_EMAIL_RETENTION_DAYS,
+OUTBOUND_EMAIL_RETENTION_DAYS).
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import OTP, OutboundEmail, SentEmail
+
+
+def purge_in_chunks(queryset, chunk_size=None, pause=None):
+    """
+    Delete every row of ``queryset`` a chunk of primary keys at a time.
+
+    Args:
+        queryset (QuerySet): Rows to delete
+        chunk_size (int): Rows per DELETE (default: RETENTION_CHUNK_SIZE)
+        pause (float): Seconds to sleep between chunks (default: RETENTION_CHUNK_PAUSE)
+
+    Returns:
+        int: Number of rows deleted
+    """
+    chunk_size = chunk_size or getattr(settings, 'RETENTION_CHUNK_SIZE', 500)
+    pause = getattr(settings, 'RETENTION_CHUNK_PAUSE', 0.1) if pause is None else pause
+    model = queryset.model
+    upper = queryset.order_by().aggregate(last=Max('pk'))['last']
+    if upper is None:
+        return 0
+    queryset = queryset.filter(pk__lte=upper).order_by('pk')
+    deleted = 0
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return deleted
+        deleted += model.objects.filter(pk__in=pks).delete()[0]
+        last_pk = pks[-1]
+        if len(pks) < chunk_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+# -------------------------
+# Purge Targets
+# -------------------------
+def expired_otps(now=None):
+    """OTPs expired or verified longer than OTP_RETENTION_HOURS ago."""
+    cutoff = (now or timezone.now()) - timedelta(hours=getattr(settings, 'OTP_RETENTION_HOURS', 24))
+    return OTP.objects.filter(Q(expires_at__lt=cutoff) | Q(is_verified=True, created_at__lt=cutoff))
+
+
+def old_sent_emails(now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=getattr(settings, 'SENT_EMAIL_RETENTION_DAYS', 30))
+    return SentEmail.objects.filter(created_at__lt=cutoff)
+
+
+def old_outbound_emails(now=None):
+    """Delivered or abandoned queue rows; queued ones are never purged."""
+    cutoff = (now or timezone.now()) - timedelta(days=getattr(settings, 'OUTBOUND_EMAIL_RETENTION_DAYS', 7))
+    return OutboundEmail.objects.filter(status__in=['sent', 'failed'], created_at__lt=cutoff)
+
+
+PURGE_TARGETS = [
+    ('OTP', expired_otps),
+    ('SentEmail', old_sent_emails),
+    ('OutboundEmail', old_outbound_emails),
+]
+
+
+def purge_all(chunk_size=None, pause=None, report=None):
+    """
+    Run every retention purge.
+
+    Args:
+        report (callable): Called with (table name, rows deleted, seconds)
+
+    Returns:
+        dict: {table name: rows deleted}
+    """
+    now = timezone.now()
+    results = {}
+    for name, target in PURGE_TARGETS:
+        started = time.monotonic()
+        results[name] = purge_in_chunks(target(now), chunk_size=chunk_size, pause=pause)
+        if report:
+            report(name, results[name], time.monotonic() - started)
+    return results
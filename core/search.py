@@ -0,0 +1,358 @@
+"""
+Full-text search.
+
+Feedback comments (with the customer's name) and customers (name, email,
+customer ID, phone) are indexed by the database's own full-text engine
+instead of being scanned with ``LIKE '%...%'``. The engine sits behind a
+small backend interface, picked per database vendor (or forced with
+``settings.SEARCH_BACKEND``):
+
+- ``core.search.SQLiteFTSBackend`` keeps FTS5 tables, ``core_feedback_fts`` and
+  ``core_customer_fts``, in sync through SQLite triggers, so inserts, edits
+  and deletes made through the ORM, bulk operations or raw SQL are all
+  indexed. The customer index stores 2-4 character prefixes so type-ahead
+  queries are answered from the index.
+- ``core.search.BasicSearchBackend`` is the fallback for other databases:
+  case-insensitive ``LIKE`` matching with no ranking. A Postgres backend would
+  implement the same methods with ``tsvector`` columns and GIN indexes.
+
+SQLite migrations that rebuild ``core_feedback`` or ``core_customer`` (most
+AlterField operations do) drop the triggers with the old table; run
+``manage.py rebuild_search_index`` after them, or call the backend's
+``install()`` from the migration. The ``core.W001`` database check (run by
+``migrate`` and ``check --database default``) reports triggers that are gone.
+
+Ranked results are annotated with ``search_rank``, where lower is a better
+match, so they can be ordered and keyset-paginated by ('search_rank', '-id').
+"""
+import re
+import threading
+
+from django.conf import settings
+from django.core import checks
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Customer
+
+CUSTOMER_ID_RE = re.compile(r'^CUST\d+$', re.IGNORECASE)
+
+
+def parse_terms(query):
+    """Split a user's search box input into words."""
+    return [term for term in (query or '').split() if term]
+
+
+def find_exact_customer(query):
+    """
+    Return the customer whose customer_id or phone is exactly ``query``.
+
+    Both columns are indexed, so this is a single index probe; callers try it
+    before falling back to a full-text search.
+    """
+    query = (query or '').strip()
+    if not query:
+        return None
+    if CUSTOMER_ID_RE.match(query):
+        return Customer.objects.filter(customer_id=query.upper()).first()
+    if any(ch.isdigit() for ch in query):
+        return Customer.objects.filter(phone=query).order_by('id').first()
+    return None
+
+
+# -------------------------
+# Backends
+# -------------------------
+class BasicSearchBackend:
+    """Unindexed LIKE matching; every word must appear in one of the fields."""
+
+    def install(self, schema_editor, indexes=None):
+        pass
+
+    def uninstall(self, schema_editor, indexes=None):
+        pass
+
+    def rebuild(self, indexes=None, using=None):
+        return {}
+
+    def _filter_terms(self, queryset, query, fields):
+        for term in parse_terms(query):
+            condition = Q()
+            for field in fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def _unranked(self, queryset):
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def filter_feedback(self, queryset, query):
+        return self._filter_terms(queryset, query, ('comment', 'customer__name'))
+
+    def rank_feedback(self, queryset, query):
+        return self._unranked(self.filter_feedback(queryset, query))
+
+    def filter_customers(self, queryset, query):
+        return self._filter_terms(queryset, query, ('name', 'email', 'customer_id', 'phone'))
+
+    def rank_customers(self, queryset, query):
+        return self._unranked(self.filter_customers(queryset, query))
+
+
+class FTSIndex:
+    """One FTS5 table: how to create it, keep it in sync and refill it."""
+
+    def __init__(self, table, create, triggers, fill, config=()):
+        self.table = table
+        self.create = create
+        self.triggers = triggers
+        self.fill = fill
+        self.config = config
+
+
+FEEDBACK_INDEX = FTSIndex(
+    table='core_feedback_fts',
+    create=[
+        """CREATE VIRTUAL TABLE IF NOT EXISTS core_feedback_fts USING fts5(
+            comment, customer_name, tokenize = 'unicode61 remove_diacritics 2'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS core_feedback_fts_insert
+        AFTER INSERT ON core_feedback BEGIN
+            INSERT INTO core_feedback_fts (rowid, comment, customer_name)
+            VALUES (new.id, new.comment,
+                    COALESCE((SELECT name FROM core_customer WHERE id = new.customer_id), ''));
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS core_feedback_fts_update
+        AFTER UPDATE OF comment, customer_id ON core_feedback BEGIN
+            DELETE FROM core_feedback_fts WHERE rowid = old.id;
+            INSERT INTO core_feedback_fts (rowid, comment, customer_name)
+            VALUES (new.id, new.comment,
+                    COALESCE((SELECT name FROM core_customer WHERE id = new.customer_id), ''));
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS core_feedback_fts_delete
+        AFTER DELETE ON core_feedback BEGIN
+            DELETE FROM core_feedback_fts WHERE rowid = old.id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS core_feedback_fts_customer_name
+        AFTER UPDATE OF name ON core_customer BEGIN
+            UPDATE core_feedback_fts SET customer_name = new.name
+            WHERE rowid IN (SELECT id FROM core_feedback WHERE customer_id = new.id);
+        END""",
+    ],
+    triggers=[
+        'core_feedback_fts_insert',
+        'core_feedback_fts_update',
+        'core_feedback_fts_delete',
+        'core_feedback_fts_customer_name',
+    ],
+    fill="""
+        INSERT INTO core_feedback_fts (rowid, comment, customer_name)
+        SELECT f.id, f.comment, COALESCE(c.name, '')
+        FROM core_feedback f LEFT JOIN core_customer c ON c.id = f.customer_id
+    """,
+)
+
+CUSTOMER_INDEX = FTSIndex(
+    table='core_customer_fts',
+    create=[
+        """CREATE VIRTUAL TABLE IF NOT EXISTS core_customer_fts USING fts5(
+            name, email, customer_id, phone,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS core_customer_fts_insert
+        AFTER INSERT ON core_customer BEGIN
+            INSERT INTO core_customer_fts (rowid, name, email, customer_id, phone)
+            VALUES (new.id, new.name, new.email, new.customer_id, new.phone);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS core_customer_fts_update
+        AFTER UPDATE OF name, email, customer_id, phone ON core_customer BEGIN
+            DELETE FROM core_customer_fts WHERE rowid = old.id;
+            INSERT INTO core_customer_fts (rowid, name, email, customer_id, phone)
+            VALUES (new.id, new.name, new.email, new.customer_id, new.phone);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS core_customer_fts_delete
+        AFTER DELETE ON core_customer BEGIN
+            DELETE FROM core_customer_fts WHERE rowid = old.id;
+        END""",
+    ],
+    triggers=[
+        'core_customer_fts_insert',
+        'core_customer_fts_update',
+        'core_customer_fts_delete',
+    ],
+    fill="""
+        INSERT INTO core_customer_fts (rowid, name, email, customer_id, phone)
+        SELECT id, name, email, customer_id, phone FROM core_customer
+    """,
+    # Default ranking weighs a hit in the name or ID above one in the email
+    config=["INSERT INTO core_customer_fts (core_customer_fts, rank) VALUES ('rank', 'bm25(10.0, 2.0, 5.0, 5.0)')"],
+)
+
+
+class SQLiteFTSBackend(BasicSearchBackend):
+    """SQLite FTS5 indexes kept in sync by triggers."""
+
+    INDEXES = {
+        'feedback': FEEDBACK_INDEX,
+        'customer': CUSTOMER_INDEX,
+    }
+
+    @staticmethod
+    def match_expression(query, prefix=False):
+        """
+        Turn search box input into an FTS5 MATCH expression.
+
+        Every word is quoted, so FTS5 operators and punctuation typed by the
+        user are searched for literally instead of raising syntax errors.
+        """
+        star = '*' if prefix else ''
+        return ' '.join('"{}"{}'.format(term.replace('"', '""'), star) for term in parse_terms(query))
+
+    def _indexes(self, names):
+        return [self.INDEXES[name] for name in (names or self.INDEXES)]
+
+    def install(self, schema_editor, indexes=None):
+        """Create the given indexes (default: all) if missing and fill them."""
+        for index in self._indexes(indexes):
+            for sql in index.create:
+                schema_editor.execute(sql)
+            for sql in index.config:
+                schema_editor.execute(sql)
+        self.rebuild(indexes, using=schema_editor.connection)
+
+    def uninstall(self, schema_editor, indexes=None):
+        for index in self._indexes(indexes):
+            for trigger in index.triggers:
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {index.table}")
+
+    def rebuild(self, indexes=None, using=None):
+        """
+        Re-index every row from scratch.
+
+        Returns:
+            dict: {index name: rows indexed}
+        """
+        names = list(indexes or self.INDEXES)
+        counts = {}
+        with (using or connection).cursor() as cursor:
+            for name, index in zip(names, self._indexes(names)):
+                cursor.execute(f"DELETE FROM {index.table}")
+                cursor.execute(index.fill)
+                cursor.execute(f"SELECT COUNT(*) FROM {index.table}")
+                counts[name] = cursor.fetchone()[0]
+        return counts
+
+    def missing_triggers(self, using=None):
+        """Sync triggers of existing FTS tables that are no longer there."""
+        with (using or connection).cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+            present = {row[0] for row in cursor.fetchall()}
+        return [
+            trigger
+            for index in self.INDEXES.values() if index.table in present
+            for trigger in index.triggers if trigger not in present
+        ]
+
+    def _filter(self, queryset, index, match):
+        # The subquery is answered by the FTS index once, not per row
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s", (match,)
+        ))
+
+    def _rank(self, queryset, match):
+        # Join the FTS table (CustomerSearchIndex / FeedbackSearchIndex) so its
+        # bm25 rank can be selected, ordered and compared in keyset cursors
+        # like any other column.
+        return queryset.filter(search_index__document__match=match).annotate(
+            search_rank=F('search_index__rank')
+        )
+
+    def filter_feedback(self, queryset, query):
+        match = self.match_expression(query)
+        return self._filter(queryset, FEEDBACK_INDEX, match) if match else queryset
+
+    def rank_feedback(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return super().rank_feedback(queryset, query)
+        return self._rank(queryset, match)
+
+    def filter_customers(self, queryset, query):
+        match = self.match_expression(query, prefix=True)
+        return self._filter(queryset, CUSTOMER_INDEX, match) if match else queryset
+
+    def rank_customers(self, queryset, query):
+        match = self.match_expression(query, prefix=True)
+        if not match:
+            return super().rank_customers(queryset, query)
+        return self._rank(queryset, match)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """Return the search backend for the default database (created once per process)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                default = 'core.search.SQLiteFTSBackend' if connection.vendor == 'sqlite' \
+                    else 'core.search.BasicSearchBackend'
+                _backend = import_string(getattr(settings, 'SEARCH_BACKEND', None) or default)()
+    return _backend
+
+
+@checks.register(checks.Tags.database)
+def check_search_triggers(app_configs=None, databases=None, **kwargs):
+    """Warn when a table rebuild has dropped the FTS sync triggers."""
+    if 'default' not in (databases or ()):
+        return []
+    backend = get_search_backend()
+    if not isinstance(backend, SQLiteFTSBackend):
+        return []
+    missing = backend.missing_triggers()
+    if not missing:
+        return []
+    return [checks.Warning(
+        f"Full-text search triggers are missing: {', '.join(missing)}. Edits to those "
+        "tables are no longer indexed.",
+        hint="Run `manage.py rebuild_search_index`, and call SQLiteFTSBackend.install() "
+             "from migrations that rebuild core_customer or core_feedback.",
+        id='core.W001',
+    )]
+
+
+# -------------------------
+# Customer Search
+# -------------------------
+def search_customers(query, queryset=None):
+    """
+    Customers matching ``query``, best first, annotated with ``search_rank``.
+
+    An exact customer ID or phone number short-circuits to that customer
+    through its B-tree index; anything else is a prefix search of the
+    full-text index, so partial words and type-ahead input match.
+    """
+    queryset = Customer.objects.all() if queryset is None else queryset
+    exact = find_exact_customer(query)
+    if exact is not None:
+        return queryset.filter(pk=exact.pk).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return get_search_backend().rank_customers(queryset, query)
+
+
+def suggest_customers(query, limit=10):
+    """
+    Type-ahead suggestions for a partly typed name, ID, email or phone.
+
+    Returns:
+        list: dicts with id, customer_id, name and phone
+    """
+    if len((query or '').strip()) < 2:
+        return []
+    results = search_customers(query).order_by('search_rank', 'id')
+    return list(results.values('id', 'customer_id', 'name', 'phone')[:limit])
@@ -0,0 +1,291 @@
+"""
+Synthetic data for load and scale testing (``manage.py seed_data``).
+
+Creates customers spread over the customer types, a waste item catalog,
+a bill with items for every customer and month of the seeded range, and
+some feedback and OTP / outbox history. Every value is drawn from one
+``random.Random(seed)`` in customer order and every date is relative to the
+last seeded month, so the same seed and options on an empty database give
+the same rows, whatever the chunk size.
+
+Rows are written with bulk_create a chunk of customers at a time, each
+chunk in its own transaction. Bulk writes skip the save() signals, so the
+billing summaries, dashboard counters and revenue rollups are rebuilt once
+at the end.
+"""
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .ids import allocate_customer_ids
+from .metrics import rebuild_counters
+from .models import OTP, Bill, BillItem, Customer, Feedback, SentEmail, WasteItem
+from .reports import rebuild_rollups
+from .summaries import rebuild_summaries
+
+# name, unit price (Rs per kg)
+WASTE_CATALOG = [
+    ('Plastic', Decimal('12.00')),
+    ('Paper', Decimal('6.00')),
+    ('Cardboard', Decimal('4.50')),
+    ('Glass', Decimal('8.00')),
+    ('Metal', Decimal('20.00')),
+    ('Organic', Decimal('3.00')),
+    ('E-waste', Decimal('45.00')),
+]
+
+# Share of customers per type, and how many kg a month they produce
+TYPE_MIX = [('Household', 0.80), ('Shop', 0.15), ('Hotel', 0.05)]
+TYPE_KG = {'Household': 6, 'Shop': 25, 'Hotel': 80}
+
+FIRST_NAMES = [
+    'Aarav', 'Anita', 'Bikash', 'Deepa', 'Ganesh', 'Gita', 'Hari', 'Kamala', 'Krishna', 'Laxmi',
+    'Manish', 'Maya', 'Nabin', 'Nisha', 'Prakash', 'Puja', 'Rajesh', 'Rita', 'Sagar', 'Sita',
+    'Suman', 'Sunita', 'Umesh', 'Yamuna',
+]
+LAST_NAMES = [
+    'Adhikari', 'Basnet', 'Bhandari', 'Gurung', 'Karki', 'KC', 'Magar', 'Maharjan', 'Poudel',
+    'Rai', 'Shah', 'Sharma', 'Shrestha', 'Tamang', 'Thapa',
+]
+STREETS = ['Main Road', 'Temple Lane', 'Market Street', 'River Side', 'School Road', 'Ward Chowk']
+
+FEEDBACK = [
+    ("Pickup was on time and the crew was polite.", 'Positive'),
+    ("Very happy with the new collection schedule.", 'Positive'),
+    ("Collection was fine this month.", 'Neutral'),
+    ("The truck came a day late but picked everything up.", 'Neutral'),
+    ("Nobody came to collect the waste this week.", 'Negative'),
+    ("My bill looks higher than the waste we gave.", 'Negative'),
+]
+
+# Paid share of a bill by how many months old it is (older is more likely paid)
+PAID_SHARE = [0.35, 0.70, 0.90]
+PAID_SHARE_OLD = 0.98
+
+
+def _periods(end_year, end_month, months):
+    """The ``months`` (year, month) periods ending at end_year/end_month, oldest first."""
+    last = end_year * 12 + end_month - 1
+    return [(n // 12, n % 12 + 1) for n in range(last - months + 1, last + 1)]
+
+
+def _period_start(year, month):
+    return timezone.make_aware(datetime(year, month, 1, 9))
+
+
+def _waste_items():
+    """The catalog items, created on first use."""
+    existing = {item.name: item for item in WasteItem.objects.filter(name__in=[n for n, _ in WASTE_CATALOG])}
+    missing = [WasteItem(name=name, unit_price=price) for name, price in WASTE_CATALOG if name not in existing]
+    for item in WasteItem.objects.bulk_create(missing):
+        existing[item.name] = item
+    return [existing[name] for name, _ in WASTE_CATALOG]
+
+
+# -------------------------
+# One Chunk
+# -------------------------
+class _Chunk:
+    """Rows drawn for one chunk of customers, written by ``save()``."""
+
+    def __init__(self):
+        self.customers = []
+        self.bills = []       # Bill objects, in customer then period order
+        self.lines = []       # per bill: [(WasteItem, quantity, amount)]
+        self.feedback = []    # (customer index, comment, sentiment, created_at)
+        self.otps = []        # (customer index, otp type, code, created_at, verified)
+
+    def save(self):
+        """
+        Returns:
+            tuple: (feedback, OTPs, sent emails) written
+        """
+        Customer.objects.bulk_create(self.customers)
+        self._fill_customer_pks()
+        for bill in self.bills:
+            bill.customer_id = bill.customer.pk
+        Bill.objects.bulk_create(self.bills, batch_size=2000)
+        self._fill_bill_pks()
+        BillItem.objects.bulk_create(
+            [BillItem(bill=bill, waste_item=item, quantity=qty, amount=amount)
+             for bill, lines in zip(self.bills, self.lines) for item, qty, amount in lines],
+            batch_size=2000,
+        )
+
+        # date_created is auto_now_add; set it to the billing month, one
+        # UPDATE per period
+        by_period = {}
+        for bill in self.bills:
+            by_period.setdefault((bill.year, bill.month), []).append(bill.pk)
+        for (year, month), pks in by_period.items():
+            Bill.objects.filter(pk__in=pks).update(date_created=_period_start(year, month))
+
+        feedback = [
+            (Feedback(customer=self.customers[i], comment=comment, sentiment=sentiment), created_at)
+            for i, comment, sentiment, created_at in self.feedback
+        ]
+        otps, emails = [], []
+        for i, otp_type, code, created_at, verified in self.otps:
+            customer = self.customers[i]
+            otps.append((OTP(
+                email=customer.email if otp_type == 'email' else None,
+                phone=customer.phone if otp_type == 'phone' else None,
+                otp_code=code,
+                otp_type=otp_type,
+                is_verified=verified,
+                expires_at=created_at + timedelta(minutes=5),
+                attempts=0 if verified else 1,
+            ), created_at))
+            if otp_type == 'email':
+                emails.append((SentEmail(
+                    to_email=customer.email,
+                    subject='Your OTP Code',
+                    body=f'Your OTP code is {code}. It expires in 5 minutes.',
+                ), created_at))
+        _bulk_create_dated(Feedback, feedback, ['created_at', 'updated_at'])
+        _bulk_create_dated(OTP, otps, ['created_at'])
+        _bulk_create_dated(SentEmail, emails, ['created_at'])
+        return len(feedback), len(otps), len(emails)
+
+    def _fill_customer_pks(self):
+        if all(customer.pk for customer in self.customers):
+            return
+        pks = dict(
+            Customer.objects.filter(customer_id__in=[c.customer_id for c in self.customers])
+            .values_list('customer_id', 'pk')
+        )
+        for customer in self.customers:
+            customer.pk = pks[customer.customer_id]
+
+    def _fill_bill_pks(self):
+        """Set primary keys on backends whose bulk_create doesn't return them."""
+        if all(bill.pk for bill in self.bills):
+            return
+        pks = {
+            (customer_id, year, month): pk
+            for customer_id, year, month, pk in Bill.objects.filter(
+                customer_id__in=[c.pk for c in self.customers]
+            ).values_list('customer_id', 'year', 'month', 'pk')
+        }
+        for bill in self.bills:
+            bill.pk = pks[(bill.customer_id, bill.year, bill.month)]
+
+
+def _bulk_create_dated(model, rows, date_fields):
+    """
+    bulk_create (object, datetime) pairs, then backdate them.
+
+    The date fields are auto_now(_add), which bulk_create overwrites with the
+    current time, so the drawn dates go in with a bulk_update afterwards.
+    """
+    objects = model.objects.bulk_create([obj for obj, _ in rows], batch_size=2000)
+    for obj, (_, when) in zip(objects, rows):
+        for name in date_fields:
+            setattr(obj, name, when)
+    model.objects.bulk_update(objects, date_fields, batch_size=500)
+
+
+def _draw_customer(rng, chunk, index, customer_id, number, periods, items, options):
+    customer_type = rng.choices([t for t, _ in TYPE_MIX], weights=[w for _, w in TYPE_MIX])[0]
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    customer = Customer(
+        customer_id=customer_id,
+        name=f'{first} {last}',
+        email=f'{first}.{last}.{number}@example.com'.lower(),
+        phone=f'98{number:08d}',
+        address=f'{rng.randint(1, 400)} {rng.choice(STREETS)}, Ward {rng.randint(1, 32)}',
+        customer_type=customer_type,
+        monthly_rate=Customer.rate_for_type(customer_type, 0),
+    )
+    chunk.customers.append(customer)
+
+    # Each customer sorts the same 1-3 kinds of waste every month
+    kinds = rng.sample(items, rng.randint(1, 3))
+    base_kg = TYPE_KG[customer_type]
+    for age, (year, month) in enumerate(reversed(periods)):
+        lines = []
+        for item in kinds:
+            qty = round(base_kg * rng.uniform(0.5, 1.5) / len(kinds), 1) or 0.1
+            lines.append((item, qty, (item.unit_price * Decimal(str(qty))).quantize(Decimal('0.01'))))
+        paid_share = PAID_SHARE[age] if age < len(PAID_SHARE) else PAID_SHARE_OLD
+        paid = rng.random() < paid_share
+        chunk.bills.append(Bill(
+            customer=customer,
+            year=year,
+            month=month,
+            total_amount=float(sum(amount for _, _, amount in lines)),
+            paid=paid,
+            status='Paid' if paid else 'Unpaid',
+        ))
+        chunk.lines.append(lines)
+
+    first_day = _period_start(*periods[0])
+    span = (_period_start(*periods[-1]) + timedelta(days=28) - first_day).total_seconds()
+    if rng.random() < options['feedback_rate']:
+        for _ in range(rng.randint(1, 3)):
+            comment, sentiment = rng.choice(FEEDBACK)
+            when = first_day + timedelta(seconds=rng.uniform(0, span))
+            chunk.feedback.append((index, comment, sentiment, when))
+    if rng.random() < options['otp_rate']:
+        for _ in range(rng.randint(1, 4)):
+            when = first_day + timedelta(seconds=rng.uniform(0, span))
+            code = f'{rng.randrange(1000000):06d}'
+            chunk.otps.append((index, rng.choice(['email', 'phone']), code, when, rng.random() < 0.85))
+
+
+# -------------------------
+# Seeding
+# -------------------------
+def seed_data(customers, months, seed=0, end=None, chunk_size=500,
+              feedback_rate=0.3, otp_rate=0.2, progress=None):
+    """
+    Add ``customers`` synthetic customers, each billed for ``months`` months.
+
+    Args:
+        customers (int): Customers to create
+        months (int): Months billed per customer (customers * months bills)
+        seed (int): Random seed
+        end (tuple): (year, month) of the last billed month (default: this month)
+        chunk_size (int): Customers written per transaction
+        feedback_rate (float): Share of customers leaving 1-3 feedback comments
+        otp_rate (float): Share of customers with 1-4 OTP requests (and the
+            outbox mails of the email ones)
+        progress (callable): Called with a stats dict after every chunk
+
+    Returns:
+        dict: {'customers', 'bills', 'bill_items', 'feedback', 'otps', 'emails'}
+    """
+    if end is None:
+        now = timezone.localdate()
+        end = (now.year, now.month)
+    periods = _periods(end[0], end[1], months)
+    items = _waste_items()
+    rng = random.Random(seed)
+    options = {'feedback_rate': feedback_rate, 'otp_rate': otp_rate}
+
+    stats = {'customers': 0, 'bills': 0, 'bill_items': 0, 'feedback': 0, 'otps': 0, 'emails': 0}
+    while stats['customers'] < customers:
+        count = min(chunk_size, customers - stats['customers'])
+        chunk = _Chunk()
+        with transaction.atomic():
+            for index, customer_id in enumerate(allocate_customer_ids(count)):
+                number = int(customer_id[-6:])
+                _draw_customer(rng, chunk, index, customer_id, number, periods, items, options)
+            feedback, otps, emails = chunk.save()
+
+        stats['customers'] += count
+        stats['bills'] += len(chunk.bills)
+        stats['bill_items'] += sum(len(lines) for lines in chunk.lines)
+        stats['feedback'] += feedback
+        stats['otps'] += otps
+        stats['emails'] += emails
+        if progress:
+            progress(dict(stats))
+
+    rebuild_summaries()
+    rebuild_counters()
+    rebuild_rollups()
+    return stats
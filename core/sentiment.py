@@ -0,0 +1,97 @@
+"""
+Batch sentiment scoring for feedback.
+
+Walks the feedback that has never been analysed, or whose comment was
+edited since its last analysis, in primary-key chunks. Large chunks are
+scored across a process pool, small ones inline, and each is written back
+with a single bulk_update, so later runs only touch new or changed comments.
+"""
+import os
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Feedback
+
+
+def pending_feedback():
+    """Feedback never analysed or whose comment changed after its last analysis."""
+    return Feedback.objects.filter(
+        Q(sentiment_analyzed_at__isnull=True) | Q(comment_updated_at__gt=F('sentiment_analyzed_at'))
+    )
+
+
+def score_rows(rows):
+    """
+    Score (pk, comment) pairs. Runs in the worker processes.
+
+    Returns:
+        list: (pk, label, polarity) tuples
+    """
+    from .utils import score_feedback
+
+    return [(pk, *score_feedback(comment)) for pk, comment in rows]
+
+
+def analyze_pending_feedback(chunk_size=1000, processes=None, progress=None):
+    """
+    Score all pending feedback and store the results.
+
+    Args:
+        chunk_size (int): Rows read, scored and written per round
+        processes (int): Worker processes (default: CPU count, 1 = no pool).
+            Chunks under SENTIMENT_POOL_MIN_ROWS are scored inline either way.
+        progress (callable): Called with the number of rows analysed so far
+
+    Returns:
+        int: Number of feedback rows analysed
+    """
+    workers = processes or os.cpu_count() or 1
+    min_rows = getattr(settings, 'SENTIMENT_POOL_MIN_ROWS', 500)
+    # Started on the first chunk big enough to pay for the worker start-up
+    pool = None
+    done = 0
+    last_pk = 0
+    try:
+        while True:
+            # Stamped before the read: a comment edited while its chunk is
+            # being scored keeps comment_updated_at > sentiment_analyzed_at
+            # and is picked up again by the next run.
+            now = timezone.now()
+            # Page by primary key rather than holding one cursor open: the
+            # rows are rewritten as we go, which an open SQLite cursor
+            # over the same table does not tolerate.
+            rows = list(
+                pending_feedback().filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', 'comment')[:chunk_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+
+            if pool is None and workers > 1 and len(rows) >= min_rows:
+                pool = Pool(workers)
+            if pool is not None:
+                step = max(len(rows) // (workers * 4), 1)
+                parts = [rows[i:i + step] for i in range(0, len(rows), step)]
+                scored = [row for part in pool.imap(score_rows, parts) for row in part]
+            else:
+                scored = score_rows(rows)
+
+            Feedback.objects.bulk_update(
+                [
+                    Feedback(pk=pk, sentiment=label, sentiment_score=polarity, sentiment_analyzed_at=now)
+                    for pk, label, polarity in scored
+                ],
+                ['sentiment', 'sentiment_score', 'sentiment_analyzed_at'],
+            )
+            done += len(scored)
+            if progress:
+                progress(done)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return done
@@ -1,21 +1,149 @@
 from rest_framework import serializers
-from .models import Customer, Bill, Feedback
+from .models import Customer, Bill, BillItem, Feedback, WasteItem
+from .billing import DuplicateBillError, bill_period_guard, build_bill, set_bill_items
 
-class CustomerSerializer(serializers.ModelSerializer):
+
+class SparseFieldsetMixin:
+    """
+    Serializer that can be cut down to a subset of its fields.
+
+    ``fields=['id', 'name']`` (the API passes ``?fields=id,name``) drops every
+    other field before anything is serialized.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}"})
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that first looks in ``context['prefetched'][Model]``.
+
+    Bulk endpoints load every referenced row with one ``in_bulk()`` query and
+    put it in the context, instead of one ``get()`` per submitted row.
+    """
+
+    def to_internal_value(self, data):
+        cache = self.context.get('prefetched', {}).get(self.get_queryset().model)
+        if cache is None:
+            return super().to_internal_value(data)
+        try:
+            obj = cache.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
+class CustomerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = '__all__'
+        # Set from the customer type by Customer.save()
+        read_only_fields = ['monthly_rate']
+
+
+class BillLineSerializer(serializers.ModelSerializer):
+    """A bill item nested inside its bill."""
+    waste_item = PrefetchedPrimaryKeyRelatedField(queryset=WasteItem.objects.all())
+    waste_item_name = serializers.CharField(source='waste_item.name', read_only=True)
+    quantity = serializers.DecimalField(max_digits=12, decimal_places=3, min_value=0)
 
-class BillSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BillItem
+        fields = ['id', 'waste_item', 'waste_item_name', 'quantity', 'amount']
+        read_only_fields = ['amount']
+
+
+class BillItemSerializer(BillLineSerializer):
+    """A bill item on its own, for the bulk item endpoint."""
+    bill = PrefetchedPrimaryKeyRelatedField(queryset=Bill.objects.all())
+
+    class Meta(BillLineSerializer.Meta):
+        fields = ['id', 'bill'] + BillLineSerializer.Meta.fields
+
+
+class BillSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
+    items = BillLineSerializer(many=True, required=False)
 
     class Meta:
         model = Bill
         fields = '__all__'
+        # The total follows the items; `paid` is the payment flag the
+        # summaries and dashboard count, so status is not set through the API.
+        read_only_fields = ['total_amount', 'status']
+        # One bill per customer per month is checked in validate() and
+        # enforced by the unique constraint; skip DRF's generated validator
+        # so month/year keep their model defaults.
+        validators = []
+
+    def validate(self, attrs):
+        customer = attrs.get('customer', getattr(self.instance, 'customer', None))
+        month = attrs.get('month', getattr(self.instance, 'month', None))
+        year = attrs.get('year', getattr(self.instance, 'year', None))
+        duplicates = Bill.objects.filter(customer=customer, month=month, year=year)
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if month and year and duplicates.exists():
+            raise serializers.ValidationError("Bill for this customer for this month already exists.")
+        return attrs
+
+    @staticmethod
+    def _quantities(items):
+        quantities = {}
+        for item in items:
+            quantities[item['waste_item']] = quantities.get(item['waste_item'], 0) + item['quantity']
+        return quantities
+
+    def create(self, validated_data):
+        items = validated_data.pop('items', None)
+        if not items:
+            # Flat charge at the customer's monthly rate, like the monthly run
+            validated_data['total_amount'] = validated_data['customer'].monthly_rate
+            bill = Bill(**validated_data)
+            try:
+                with bill_period_guard([bill]):
+                    bill.save(force_insert=True)
+                    return bill
+            except DuplicateBillError as e:
+                raise serializers.ValidationError(str(e))
+        try:
+            return build_bill(
+                validated_data['customer'],
+                self._quantities(items),
+                month=validated_data.get('month'),
+                year=validated_data.get('year'),
+                paid=validated_data.get('paid', False),
+            )
+        except DuplicateBillError as e:
+            raise serializers.ValidationError(str(e))
+        except ValueError as e:
+            raise serializers.ValidationError({'items': str(e)})
+
+    def update(self, instance, validated_data):
+        items = validated_data.pop('items', None)
+        try:
+            with bill_period_guard([instance]):
+                instance = super().update(instance, validated_data)
+                if items is not None:
+                    set_bill_items(instance, self._quantities(items))
+        except DuplicateBillError as e:
+            raise serializers.ValidationError(str(e))
+        return instance
+
 
-class FeedbackSerializer(serializers.ModelSerializer):
+class FeedbackSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
 
     class Meta:
         model = Feedback
         fields = '__all__'
+        read_only_fields = ['sentiment', 'sentiment_score', 'sentiment_analyzed_at']
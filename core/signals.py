@@ -0,0 +1,135 @@
+"""
+Signal handlers that keep derived data (customer billing summaries,
+dashboard counters and revenue rollups) in step with writes to the base
+tables.
+
+QuerySet.update() and bulk_create() skip the model signals, so bulk code
+paths send ``bills_bulk_changed`` instead.
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from .models import Bill, BillItem, Customer, Feedback
+from . import metrics, reports, summaries
+
+# Sent by bulk writers after bills were bulk created or updated, with
+# customer_ids=[...] for every customer touched and created=[Bill, ...]
+# for the newly inserted bills.
+bills_bulk_changed = Signal()
+
+# Sent by billing.mark_bills_paid after unpaid bills were marked paid with
+# an UPDATE, with bills=[(customer_id, total_amount), ...] and the bills'
+# periods=[(year, month), ...].
+bills_marked_paid = Signal()
+
+# Sent by bulk writers after customers were bulk created, with count=N.
+customers_bulk_created = Signal()
+
+
+# -------------------------
+# Bills
+# -------------------------
+@receiver(post_save, sender=Bill)
+def bill_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_loaded_state', None)
+    state = instance.billing_state()
+    instance._loaded_state = state
+
+    summaries.record_bill_saved(instance, created, previous)
+    reports.record_bill_saved(instance, created, previous)
+    if created:
+        metrics.record_bill(state[1], state[2], instance.year, instance.month)
+    elif previous and previous != state:
+        metrics.record_bill_changed(previous, state)
+
+
+@receiver(pre_delete, sender=Bill)
+def bill_deleting(sender, instance, **kwargs):
+    # The items are gone by post_delete (the cascade runs first)
+    instance._deleted_items = reports.item_amounts(instance.pk)
+
+
+@receiver(post_delete, sender=Bill)
+def bill_deleted(sender, instance, **kwargs):
+    state = getattr(instance, '_loaded_state', None) or instance.billing_state()
+    summaries.record_bill_deleted(state)
+    reports.record_bill_deleted(state, getattr(instance, '_deleted_items', {}), instance)
+    metrics.record_bill(state[1], state[2], state[3], state[4], sign=-1)
+
+
+@receiver(pre_save, sender=BillItem)
+def bill_item_saving(sender, instance, raw=False, **kwargs):
+    # Lines of the bill (and of the bill the item is moving from) before the
+    # save, so post_save can apply the difference to the item rollups
+    if raw:
+        return
+    bill_ids = {instance.bill_id, getattr(instance, '_stored_bill_id', None)} - {None}
+    instance._items_before = {bill_id: reports.item_amounts(bill_id) for bill_id in bill_ids}
+
+
+@receiver(post_save, sender=BillItem)
+def bill_item_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for bill_id, before in getattr(instance, '_items_before', {}).items():
+        bill = instance.bill if bill_id == instance.bill_id else Bill.objects.get(pk=bill_id)
+        reports.record_items_changed(bill, before, reports.item_amounts(bill_id))
+
+
+@receiver(bills_bulk_changed)
+def bills_changed_in_bulk(sender, customer_ids, created=(), **kwargs):
+    summaries.rebuild_summaries(customer_ids)
+
+    counts = {'bills': len(created), 'unpaid_total': 0}
+    for bill in created:
+        key = metrics.bills_period_key(bill.year, bill.month)
+        counts[key] = counts.get(key, 0) + 1
+        if not bill.paid:
+            counts['unpaid_total'] += float(bill.total_amount or 0)
+    metrics.incr_many(counts)
+    reports.schedule_refresh({(bill.year, bill.month) for bill in created})
+
+
+@receiver(bills_marked_paid)
+def bills_paid_in_bulk(sender, bills, periods=(), **kwargs):
+    summaries.record_bills_paid(bills)
+    metrics.incr('unpaid_total', -sum(float(total or 0) for _, total in bills))
+    reports.schedule_refresh(periods)
+
+
+# -------------------------
+# Customers & Feedback
+# -------------------------
+@receiver(post_save, sender=Customer)
+def customer_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        metrics.incr('customers')
+    previous_type = getattr(instance, '_loaded_type', None)
+    if previous_type is not None and previous_type != instance.customer_type:
+        # The customer's bills now count under another type
+        reports.schedule_refresh(
+            Bill.objects.filter(customer=instance).values_list('year', 'month').distinct().order_by()
+        )
+    instance._loaded_type = instance.customer_type
+
+
+@receiver(customers_bulk_created)
+def customers_created_in_bulk(sender, count, **kwargs):
+    metrics.incr('customers', count)
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    metrics.incr('customers', -1)
+
+
+@receiver(post_save, sender=Feedback)
+def feedback_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        metrics.incr_many({'feedback': 1, metrics.feedback_week_key(instance.created_at): 1})
+
+
+@receiver(post_delete, sender=Feedback)
+def feedback_deleted(sender, instance, **kwargs):
+    metrics.incr_many({'feedback': -1, metrics.feedback_week_key(instance.created_at): -1})
@@ -0,0 +1,51 @@
+"""
+Django's SQLite backend, with write transactions started by BEGIN IMMEDIATE.
+
+Django 4.2 opens transactions with a plain (deferred) BEGIN, so a
+transaction that reads before it writes only asks for the write lock at its
+first write. In WAL mode that upgrade fails at once with "database is
+locked" when another connection committed in the meantime; busy_timeout
+does not apply to it. BEGIN IMMEDIATE takes the write lock up front, where
+a busy writer is waited for.
+
+Only atomic() blocks pay for this: reads in autocommit mode (every page
+that does not write) never take the lock. Blocks that only read, such as
+the admin's change and delete forms on GET, run inside
+``deferred_transactions()`` and keep a deferred BEGIN, so they are not
+queued behind writers. SQLITE_BEGIN_IMMEDIATE = False (or SQLITE_TUNING =
+False) goes back to a deferred BEGIN everywhere.
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.sqlite3 import base
+
+
+@contextmanager
+def deferred_transactions(using=None):
+    """
+    Open transactions inside the block with a plain deferred BEGIN.
+
+    For atomic blocks that only read. A block that writes after all still
+    works, but its first write can fail with "database is locked" if another
+    connection committed since it started reading.
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    previous = getattr(connection, 'deferred_begin', False)
+    connection.deferred_begin = True
+    try:
+        yield
+    finally:
+        connection.deferred_begin = previous
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    deferred_begin = False
+
+    def _start_transaction_under_autocommit(self):
+        if (not self.deferred_begin and getattr(settings, 'SQLITE_TUNING', True)
+                and getattr(settings, 'SQLITE_BEGIN_IMMEDIATE', True)):
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
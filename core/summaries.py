@@ -0,0 +1,221 @@
+"""
+Per-customer billing summaries.
+
+CustomerBillingSummary holds each customer's bill count, paid count, total
+billed, outstanding amount and last bill date so pages can read them in one
+primary-key lookup instead of scanning the customer's bill history. Single
+bill writes adjust the row by delta (see core.signals); bulk writes and the
+rebuild command recompute rows from the Bill table with grouped aggregates.
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateTimeField, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from .models import Bill, Customer, CustomerBillingSummary
+
+logger = logging.getLogger(__name__)
+
+
+def _contribution(total, paid, sign=1):
+    """What one bill adds to (or, with sign=-1, removes from) its summary."""
+    return {
+        'bill_count': sign,
+        'paid_count': sign if paid else 0,
+        'total_billed': sign * total,
+        'outstanding': 0 if paid else sign * total,
+    }
+
+
+def _apply_delta(customer_id, delta, last_bill_date=None, recompute_last=False, create=True):
+    updates = {field: F(field) + value for field, value in delta.items() if value}
+    if last_bill_date is not None:
+        value = Value(last_bill_date, output_field=DateTimeField())
+        updates['last_bill_date'] = Greatest(Coalesce('last_bill_date', value), value)
+    if recompute_last:
+        updates['last_bill_date'] = Subquery(
+            Bill.objects.filter(customer_id=OuterRef('customer_id'))
+            .order_by('-date_created')
+            .values('date_created')[:1]
+        )
+    if not updates:
+        return
+    updates['updated_at'] = timezone.now()
+
+    updated = CustomerBillingSummary.objects.filter(customer_id=customer_id).update(**updates)
+    if not updated and create:
+        # First bill of the customer (or a summary never built): the Bill
+        # table already holds the change, so compute the row from scratch.
+        rebuild_summaries([customer_id])
+
+
+# -------------------------
+# Single Bill Writes
+# -------------------------
+def record_bill_saved(bill, created, previous=None):
+    """
+    Apply a saved bill to its customer's summary.
+
+    Args:
+        bill (Bill): The bill that was just saved
+        created (bool): True if the bill was inserted
+        previous (tuple): Bill.billing_state() as loaded, if known
+    """
+    state = bill.billing_state()
+
+    if created:
+        _apply_delta(bill.customer_id, _contribution(state[1], state[2]), last_bill_date=bill.date_created)
+    elif previous is None or previous[0] != state[0]:
+        # Unknown starting point or the bill moved to another customer
+        rebuild_summaries({previous[0], state[0]} if previous else [state[0]])
+    elif previous != state:
+        delta = _contribution(state[1], state[2])
+        for field, value in _contribution(previous[1], previous[2], sign=-1).items():
+            delta[field] += value
+        _apply_delta(bill.customer_id, delta)
+
+
+def record_bill_deleted(state):
+    """
+    Remove a deleted bill (given as Bill.billing_state()) from its
+    customer's summary.
+
+    Never creates a summary row: during a customer cascade the summary may
+    already be gone along with the customer.
+    """
+    _apply_delta(
+        state[0],
+        _contribution(state[1], state[2], sign=-1),
+        recompute_last=True,
+        create=False,
+    )
+
+
+def record_bills_paid(bills):
+    """
+    Move bills that were just marked paid from outstanding to paid.
+
+    Customers whose summaries change by the same amount (typically one bill
+    at the same rate) are updated together, so a batch costs one UPDATE per
+    distinct change rather than one per customer. Customers without a
+    summary row yet are built from the Bill table.
+
+    Args:
+        bills (iterable): (customer_id, total_amount) of each bill
+    """
+    deltas = {}
+    for customer_id, total in bills:
+        count, amount = deltas.get(customer_id, (0, 0.0))
+        deltas[customer_id] = (count + 1, amount + float(total or 0))
+    groups = {}
+    for customer_id, delta in deltas.items():
+        groups.setdefault(delta, []).append(customer_id)
+
+    now = timezone.now()
+    updated = 0
+    for (count, amount), customer_ids in groups.items():
+        updated += CustomerBillingSummary.objects.filter(customer_id__in=customer_ids).update(
+            paid_count=F('paid_count') + count,
+            outstanding=F('outstanding') - amount,
+            updated_at=now,
+        )
+    if updated < len(deltas):
+        existing = CustomerBillingSummary.objects.filter(customer_id__in=deltas).values_list('customer_id', flat=True)
+        rebuild_summaries(set(deltas) - set(existing))
+
+
+# -------------------------
+# Bulk Rebuild
+# -------------------------
+def rebuild_summaries(customer_ids=None, chunk_size=1000, progress=None):
+    """
+    Recompute summaries from the Bill table.
+
+    Args:
+        customer_ids (iterable): Customers to rebuild (default: all customers)
+        chunk_size (int): Customers handled per transaction
+        progress (callable): Called with the number of customers done
+
+    Returns:
+        int: Number of summaries written
+    """
+    if customer_ids is None:
+        chunks = _all_customer_chunks(chunk_size)
+    else:
+        all_ids = sorted(set(customer_ids))
+        chunks = (all_ids[i:i + chunk_size] for i in range(0, len(all_ids), chunk_size))
+
+    done = 0
+    for ids in chunks:
+        totals = {
+            row['customer_id']: row
+            for row in Bill.objects.filter(customer_id__in=ids)
+            .values('customer_id')
+            .annotate(
+                bill_count=Count('id'),
+                paid_count=Count('id', filter=Q(paid=True)),
+                total_billed=Sum('total_amount'),
+                outstanding=Sum('total_amount', filter=Q(paid=False)),
+                last_bill_date=Max('date_created'),
+            )
+        }
+        summaries = []
+        for customer_id in ids:
+            row = totals.get(customer_id, {})
+            summaries.append(CustomerBillingSummary(
+                customer_id=customer_id,
+                bill_count=row.get('bill_count', 0),
+                paid_count=row.get('paid_count', 0),
+                total_billed=row.get('total_billed') or 0,
+                outstanding=row.get('outstanding') or 0,
+                last_bill_date=row.get('last_bill_date'),
+            ))
+
+        try:
+            _write_summaries(summaries)
+        except IntegrityError:
+            # A customer of the chunk was deleted since it was read; write
+            # the summaries of the customers that are still there.
+            existing = set(Customer.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            logger.warning("Rebuilding billing summaries: customers %s were deleted meanwhile",
+                           sorted(set(ids) - existing))
+            _write_summaries([summary for summary in summaries if summary.customer_id in existing])
+
+        done += len(ids)
+        if progress:
+            progress(done)
+    return done
+
+
+def _write_summaries(summaries):
+    # Upsert rather than delete and insert, so a row a concurrent writer
+    # created in the meantime is overwritten instead of failing the chunk
+    with transaction.atomic():
+        CustomerBillingSummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=['bill_count', 'paid_count', 'total_billed', 'outstanding', 'last_bill_date', 'updated_at'],
+        )
+
+
+def _all_customer_chunks(chunk_size):
+    last_pk = 0
+    while True:
+        ids = list(
+            Customer.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+def get_summary(customer):
+    """Return the customer's summary, building it on first access."""
+    try:
+        return CustomerBillingSummary.objects.get(customer=customer)
+    except CustomerBillingSummary.DoesNotExist:
+        rebuild_summaries([customer.pk])
+        return CustomerBillingSummary.objects.get(customer=customer)
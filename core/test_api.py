@@ -0,0 +1,118 @@
+"""
+JSON API tests: cursor pages, sparse fieldsets, per-page query counts and
+the bill and bulk item writes.
+"""
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .billing import build_bill
+from .models import Bill, BillItem, Customer, WasteItem
+
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('api', password='x'))
+        self.plastic = WasteItem.objects.create(name='Plastic', unit_price=10)
+        self.paper = WasteItem.objects.create(name='Paper', unit_price=5)
+        self.customers = [
+            Customer.objects.create(name=f'Customer {n}', email=f'customer{n}@example.com') for n in range(5)
+        ]
+
+    def bills(self, count, month=3):
+        return [build_bill(c, {self.plastic: 1, self.paper: 2}, month=month, year=2031)
+                for c in self.customers[:count]]
+
+    def walk(self, url):
+        """Follow the cursor links; returns the pages' results."""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            pages.append(response.data['results'])
+            url = response.data['next']
+        return pages
+
+    def test_login_required(self):
+        self.assertEqual(APIClient().get('/api/customers/').status_code, 403)
+
+    def test_cursor_pages_cover_every_row_once(self):
+        pages = self.walk('/api/customers/?page_size=2')
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        ids = [row['id'] for page in pages for row in page]
+        self.assertEqual(ids, sorted((c.pk for c in self.customers), reverse=True))
+
+    def test_sparse_fieldsets(self):
+        self.bills(1)
+        response = self.client.get('/api/bills/?fields=id,total_amount')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'total_amount'})
+        self.assertEqual(self.client.get('/api/bills/?fields=id,colour').status_code, 400)
+
+    def test_bill_pages_do_not_grow_with_rows(self):
+        counts = []
+        for month, count in ((3, 1), (4, 5)):
+            self.bills(count, month=month)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f'/api/bills/?month={month}')
+            self.assertEqual(len(response.data['results']), count)
+            self.assertEqual(len(response.data['results'][0]['items']), 2)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_filters(self):
+        self.bills(2)
+        customer = self.customers[0].pk
+        self.assertEqual(len(self.client.get(f'/api/bills/?customer={customer}').data['results']), 1)
+        self.assertEqual(len(self.client.get('/api/bills/?paid=true').data['results']), 0)
+        self.assertEqual(self.client.get('/api/bills/?year=soon').status_code, 400)
+
+    # -------------------------
+    # Writes
+    # -------------------------
+    def test_create_bill_with_items(self):
+        data = {
+            'customer': self.customers[0].pk, 'month': 3, 'year': 2031,
+            'items': [{'waste_item': self.plastic.pk, 'quantity': '2'}, {'waste_item': self.paper.pk, 'quantity': '1'}],
+        }
+        response = self.client.post('/api/bills/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['total_amount'], 25.0)
+        duplicate = self.client.post('/api/bills/', data, format='json')
+        self.assertEqual(duplicate.status_code, 400)
+        self.assertEqual(Bill.objects.count(), 1)
+
+    def test_update_bill_items(self):
+        bill = self.bills(1)[0]
+        response = self.client.patch(
+            f'/api/bills/{bill.pk}/', {'items': [{'waste_item': self.paper.pk, 'quantity': '4'}]}, format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        bill.refresh_from_db()
+        self.assertEqual(bill.total_amount, 20.0)
+        self.assertEqual(bill.items.count(), 1)
+
+    def test_bulk_item_create(self):
+        first, second = self.bills(2)
+        rows = [
+            {'bill': first.pk, 'waste_item': self.plastic.pk, 'quantity': '1'},
+            {'bill': first.pk, 'waste_item': self.paper.pk, 'quantity': '2'},
+            {'bill': second.pk, 'waste_item': self.paper.pk, 'quantity': '1'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/bill-items/', rows, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(response.data), 3)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "core_billitem"')]
+        self.assertEqual(len(inserts), 1)
+        first.refresh_from_db()
+        self.assertEqual(first.total_amount, 40.0)
+        self.assertEqual(BillItem.objects.filter(bill=second).count(), 3)
+
+    def test_bulk_item_create_rejects_unknown_bill(self):
+        rows = [{'bill': 999999, 'waste_item': self.plastic.pk, 'quantity': '1'}]
+        self.assertEqual(self.client.post('/api/bill-items/', rows, format='json').status_code, 400)
+        self.assertFalse(BillItem.objects.exists())
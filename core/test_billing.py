@@ -0,0 +1,224 @@
+"""
+Bill builder and monthly billing run tests.
+
+build_bill, set_bill_items and add_bill_items write items in bulk and store
+the total once; these tests pin the totals, the items left behind, the
+constant query count and the derived tables they keep up to date.
+generate_monthly_bills is checked for resuming, skipping customers already
+billed and retrying a chunk a concurrent run got to first.
+"""
+import builtins
+from unittest import mock
+
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .billing import DuplicateBillError, add_bill_items, build_bill, generate_monthly_bills, set_bill_items
+from .models import Bill, BillItem, Customer, WasteItem
+from .testing import DerivedStateMixin
+
+
+class BillBuilderTests(DerivedStateMixin, TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone='9800000001')
+        self.plastic = WasteItem.objects.create(name='Plastic', unit_price=12)
+        self.paper = WasteItem.objects.create(name='Paper', unit_price=5)
+
+    def items(self, bill):
+        return sorted(
+            BillItem.objects.filter(bill=bill).values_list('waste_item__name', 'quantity', 'amount')
+        )
+
+    # -------------------------
+    # build_bill
+    # -------------------------
+    def test_build_bill_stores_items_and_total(self):
+        bill = build_bill(self.customer, {self.plastic: 2, self.paper: '3'}, month=3, year=2031)
+        bill.refresh_from_db()
+        self.assertEqual(bill.total_amount, 39.0)
+        self.assertEqual(self.items(bill), [('Paper', 3.0, 15.0), ('Plastic', 2.0, 24.0)])
+        self.assertEqual((bill.month, bill.year, bill.paid), (3, 2031, False))
+
+    def test_zero_quantities_are_skipped(self):
+        bill = build_bill(self.customer, {self.plastic: 1, self.paper: 0}, month=3, year=2031)
+        self.assertEqual(self.items(bill), [('Plastic', 1.0, 12.0)])
+
+    def test_build_bill_needs_a_quantity(self):
+        with self.assertRaises(ValueError):
+            build_bill(self.customer, {self.plastic: 0}, month=3, year=2031)
+        with self.assertRaises(ValueError):
+            build_bill(self.customer, {self.plastic: -1}, month=3, year=2031)
+        self.assertFalse(Bill.objects.exists())
+
+    def test_duplicate_period_is_caught_by_the_constraint(self):
+        build_bill(self.customer, {self.plastic: 2}, month=3, year=2031)
+        save = Bill.save
+
+        def reworded(bill, *args, **kwargs):
+            # Detection must not depend on the backend's error message
+            try:
+                save(bill, *args, **kwargs)
+            except IntegrityError as e:
+                raise IntegrityError('constraint failed') from e
+
+        with mock.patch.object(Bill, 'save', reworded), self.assertRaises(DuplicateBillError):
+            build_bill(self.customer, {self.paper: 1}, month=3, year=2031)
+        self.assertEqual(self.items(Bill.objects.get(customer=self.customer)), [('Plastic', 2.0, 24.0)])
+        self.assertDerivedConsistent()
+
+    def test_build_bill_queries_do_not_grow_with_items(self):
+        items = WasteItem.objects.bulk_create([WasteItem(name=f'Item {n}', unit_price=n) for n in range(1, 11)])
+        # The customer's first bill also creates its summary row
+        build_bill(self.customer, {self.plastic: 1}, month=1, year=2031)
+        counts = []
+        for month, quantities in ((2, {items[0]: 1}), (3, {item: 1 for item in items})):
+            with CaptureQueriesContext(connection) as queries:
+                build_bill(self.customer, quantities, month=month, year=2031)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    # -------------------------
+    # Editing
+    # -------------------------
+    def test_set_bill_items_replaces_items(self):
+        bill = build_bill(self.customer, {self.plastic: 2, self.paper: 1}, month=3, year=2031)
+        set_bill_items(bill, {self.paper: 4})
+        bill.refresh_from_db()
+        self.assertEqual(bill.total_amount, 20.0)
+        self.assertEqual(self.items(bill), [('Paper', 4.0, 20.0)])
+        self.assertDerivedConsistent()
+
+    def test_unsaved_edits_go_out_with_the_new_items(self):
+        bill = build_bill(self.customer, {self.plastic: 2}, month=3, year=2031)
+        bill = Bill.objects.get(pk=bill.pk)
+        bill.paid = True
+        bill.customer = Customer.objects.create(name='Shop', email='shop@example.com', customer_type='Shop')
+        with CaptureQueriesContext(connection) as queries:
+            set_bill_items(bill, {self.plastic: 1, self.paper: 2}, update_fields=None)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "core_bill"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Bill.objects.get(pk=bill.pk).billing_state()[:3], (bill.customer_id, 22.0, True))
+        self.assertDerivedConsistent()
+
+    def test_add_bill_items_resums_each_bill(self):
+        first = build_bill(self.customer, {self.plastic: 1}, month=3, year=2031)
+        other = Customer.objects.create(name='Ravi', email='ravi@example.com', phone='9800000002')
+        second = build_bill(other, {self.paper: 1}, month=3, year=2031)
+        add_bill_items([(first, self.plastic, 1), (first, self.paper, 2), (second, self.paper, 1)])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.total_amount, 34.0)
+        self.assertEqual(second.total_amount, 10.0)
+        self.assertEqual(BillItem.objects.filter(bill=first).count(), 3)
+        self.assertDerivedConsistent()
+
+    def test_add_bill_items_rejects_negative_quantities(self):
+        bill = build_bill(self.customer, {self.plastic: 1}, month=3, year=2031)
+        with self.assertRaises(ValueError):
+            add_bill_items([(bill, self.paper, -1)])
+        self.assertEqual(BillItem.objects.filter(bill=bill).count(), 1)
+
+    def test_single_item_saves_apply_deltas(self):
+        bill = build_bill(self.customer, {self.plastic: 2}, month=3, year=2031)
+        other = build_bill(self.customer, {self.paper: 1}, month=4, year=2031)
+        with mock.patch('core.reports.refresh_periods') as refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            BillItem(bill=bill, waste_item=self.paper, quantity=2).save()
+            line = BillItem.objects.get(bill=bill, waste_item=self.plastic)
+            line.quantity = 3
+            line.save()
+            line.bill = other
+            line.save()
+        refresh.assert_not_called()
+        bill.refresh_from_db()
+        self.assertEqual(bill.total_amount, 10.0)
+        other.refresh_from_db()
+        self.assertEqual(other.total_amount, 41.0)
+        self.assertDerivedConsistent()
+
+    def test_paid_and_deleted_bills_keep_derived_tables_consistent(self):
+        bill = build_bill(self.customer, {self.plastic: 2}, month=3, year=2031)
+        bill.paid = True
+        bill.save()
+        build_bill(self.customer, {self.paper: 2}, month=4, year=2031).delete()
+        self.assertDerivedConsistent()
+
+
+class MonthlyBillingRunTests(DerivedStateMixin, TestCase):
+
+    def setUp(self):
+        types = ['Household', 'Shop', 'Hotel', 'Household', 'Shop']
+        self.customers = [
+            Customer.objects.create(name=f'Customer {n}', email=f'c{n}@example.com', customer_type=kind)
+            for n, kind in enumerate(types)
+        ]
+        self.plastic = WasteItem.objects.create(name='Plastic', unit_price=12)
+
+    def billed(self, month=3, year=2031):
+        return sorted(Bill.objects.filter(month=month, year=year).values_list('customer_id', 'total_amount'))
+
+    def run_bills(self, *args, **kwargs):
+        # The report rollups are refreshed once the run commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return generate_monthly_bills(*args, **kwargs)
+
+    def test_flat_charge_at_each_monthly_rate(self):
+        progress = []
+        stats = self.run_bills(3, 2031, chunk_size=2, progress=progress.append)
+        self.assertEqual(self.billed(), sorted(Customer.objects.values_list('pk', 'monthly_rate')))
+        self.assertEqual(len({amount for _, amount in self.billed()}), 3)
+        self.assertEqual(stats, {'customers': 5, 'created': 5, 'skipped': 0, 'last_pk': self.customers[-1].pk})
+        self.assertEqual([p['customers'] for p in progress], [2, 4, 5])
+        self.assertDerivedConsistent()
+
+    def test_items_are_billed_to_every_customer(self):
+        self.run_bills(3, 2031, quantities={self.plastic: 2}, chunk_size=2)
+        self.assertEqual(self.billed(), [(c.pk, 24.0) for c in self.customers])
+        self.assertEqual(BillItem.objects.filter(bill__month=3, quantity=2, amount=24).count(), 5)
+        self.assertDerivedConsistent()
+
+    def test_resume_after_a_customer(self):
+        stats = self.run_bills(3, 2031, chunk_size=2, start_after=self.customers[1].pk)
+        self.assertEqual([pk for pk, _ in self.billed()], [c.pk for c in self.customers[2:]])
+        self.assertEqual((stats['customers'], stats['created']), (3, 3))
+        # Nothing past the last customer: the stats keep the starting point
+        stats = self.run_bills(3, 2031, start_after=self.customers[-1].pk)
+        self.assertEqual(stats, {'customers': 0, 'created': 0, 'skipped': 0, 'last_pk': self.customers[-1].pk})
+
+    def test_rerun_skips_customers_already_billed(self):
+        build_bill(self.customers[1], {self.plastic: 1}, month=3, year=2031)
+        self.run_bills(3, 2031, chunk_size=2, start_after=self.customers[2].pk)
+        stats = self.run_bills(3, 2031, chunk_size=2)
+        self.assertEqual((stats['customers'], stats['created'], stats['skipped']), (5, 2, 3))
+        self.assertEqual(dict(self.billed())[self.customers[1].pk], 12.0)
+        self.assertEqual(len(self.billed()), 5)
+        # Other months are untouched
+        self.assertEqual(self.billed(month=4), [])
+        self.assertDerivedConsistent()
+
+    def test_chunk_raced_by_another_run_is_retried(self):
+        racer = self.customers[3]
+        build_bill(racer, {self.plastic: 1}, month=3, year=2031)
+        checks = []
+
+        def blind_first_check(*args):
+            # The first billed-customers check of the run misses the racer's
+            # bill, as if the other run committed it just after the check
+            checks.append(args)
+            return builtins.set() if len(checks) == 1 else builtins.set(*args)
+
+        with mock.patch('core.billing.set', side_effect=blind_first_check, create=True):
+            stats = self.run_bills(3, 2031, chunk_size=5)
+        self.assertEqual(len(checks), 2)
+        self.assertEqual((stats['created'], stats['skipped']), (4, 1))
+        self.assertEqual(dict(self.billed())[racer.pk], 12.0)
+        self.assertEqual(Bill.objects.filter(customer=racer).count(), 1)
+        self.assertDerivedConsistent()
+
+    def test_other_integrity_errors_are_not_retried(self):
+        with mock.patch('core.billing.Bill.objects.bulk_create', side_effect=IntegrityError('FOREIGN KEY')), \
+                self.assertRaises(IntegrityError):
+            generate_monthly_bills(3, 2031)
+        self.assertFalse(Bill.objects.exists())
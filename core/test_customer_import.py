@@ -0,0 +1,148 @@
+"""
+Bulk customer import tests.
+
+Files are built in memory and run through import_customers with small
+chunks, so the uniqueness checks against the database and against earlier
+rows of the file are both exercised across chunk boundaries.
+"""
+import csv
+import importlib.util
+import io
+import unittest
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase
+
+from . import customer_import
+from .customer_import import IMPORT_FIELDS, import_customers
+from .models import Customer, DashboardCounter, IdSequence
+
+
+def customer_file(*rows):
+    """A CSV (as a binary file) from dicts of IMPORT_FIELDS values."""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=IMPORT_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+    return io.BytesIO(out.getvalue().encode('utf-8'))
+
+
+def row(n, **values):
+    return {
+        'name': f'Customer {n}',
+        'email': f'customer{n}@example.com',
+        'phone': f'98{n:08d}',
+        'address': f'{n} Market Road',
+        'customer_type': 'Household',
+        **values,
+    }
+
+
+class CustomerImportTests(TestCase):
+
+    def setUp(self):
+        self.existing = Customer.objects.create(
+            name='Asha', email='asha@example.com', phone='9800000001', address='1 Lake View',
+        )
+
+    def run_import(self, *rows, **kwargs):
+        rejects = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = import_customers(customer_file(*rows), fmt='csv', rejects=rejects, **kwargs)
+        rejects.seek(0)
+        return stats, list(csv.DictReader(rejects))
+
+    def test_valid_rows_are_created_with_fresh_ids(self):
+        stats, rejects = self.run_import(row(10), row(11), row(12, customer_id='CUST900001'), chunk_size=2)
+        self.assertEqual(stats, {'rows': 3, 'created': 3, 'rejected': 0})
+        self.assertEqual(rejects, [])
+        created = Customer.objects.exclude(pk=self.existing.pk)
+        ids = sorted(created.values_list('customer_id', flat=True))
+        self.assertEqual(len(set(ids)), 3)
+        self.assertIn('CUST900001', ids)
+        self.assertTrue(all(cid.startswith('CUST') and len(cid) == 10 for cid in ids))
+        self.assertEqual(set(created.values_list('monthly_rate', flat=True)),
+                         {Customer.rate_for_type('Household', None)})
+        self.assertEqual(DashboardCounter.objects.get(name='customers').value, 4)
+
+    def test_duplicates_of_stored_customers_are_rejected(self):
+        stats, rejects = self.run_import(
+            row(10, email='asha@example.com'),
+            row(11, phone='9800000001'),
+            row(12, customer_id=self.existing.customer_id),
+        )
+        self.assertEqual(stats['created'], 0)
+        self.assertEqual([r['line'] for r in rejects], ['2', '3', '4'])
+        self.assertIn('email', rejects[0]['errors'])
+        self.assertIn('phone', rejects[1]['errors'])
+        self.assertIn('customer_id', rejects[2]['errors'])
+
+    def test_duplicates_within_the_file(self):
+        rows = [row(10), row(11, email='customer10@example.com'), row(12, phone=row(10)['phone'])]
+        # In one chunk against the rows seen so far, across chunks against
+        # the rows the earlier chunks stored
+        for chunk_size, reason in ((10, 'earlier row'), (1, 'already registered')):
+            with self.subTest(chunk_size=chunk_size):
+                Customer.objects.exclude(pk=self.existing.pk).delete()
+                stats, rejects = self.run_import(*rows, chunk_size=chunk_size)
+                self.assertEqual(stats, {'rows': 3, 'created': 1, 'rejected': 2})
+                self.assertTrue(all(reason in r['errors'] for r in rejects), rejects)
+
+    def test_rows_taken_while_importing_are_rejected(self):
+        allocate = customer_import.allocate_customer_ids
+
+        def allocate_then_race(count, exclude=()):
+            # Another request saves two of the file's customers after the
+            # chunk was checked but before it is inserted
+            Customer.objects.create(name='Racer', email='racer@example.com', customer_id='CUST900001')
+            Customer.objects.create(name='Other', email=row(11)['email'], phone='9700000000')
+            return allocate(count, exclude)
+
+        with mock.patch('core.customer_import.allocate_customer_ids', side_effect=allocate_then_race):
+            stats, rejects = self.run_import(row(10, customer_id='CUST900001'), row(11), row(12), chunk_size=10)
+        self.assertEqual(stats, {'rows': 3, 'created': 1, 'rejected': 2})
+        self.assertEqual([(r['line'], r['errors']) for r in rejects], [
+            ('2', 'customer_id: This customer ID is already in use.'),
+            ('3', 'email: This email is already registered.'),
+        ])
+        self.assertTrue(Customer.objects.filter(email=row(12)['email']).exists())
+        self.assertEqual(Customer.objects.get(customer_id='CUST900001').name, 'Racer')
+        self.assertEqual(DashboardCounter.objects.get(name='customers').value, 4)
+
+    def test_other_integrity_errors_are_raised(self):
+        with mock.patch('core.customer_import.Customer.objects.bulk_create', side_effect=IntegrityError('disk')), \
+                self.assertRaises(IntegrityError):
+            self.run_import(row(10))
+
+    def test_form_rules_apply(self):
+        stats, rejects = self.run_import(row(10, name='AB'), row(11, phone='12345'), row(12, customer_type=''))
+        self.assertEqual(stats['created'], 0)
+        self.assertEqual(len(rejects), 3)
+        self.assertEqual(rejects[0]['name'], 'AB')
+
+    def test_dry_run_writes_nothing(self):
+        before = list(IdSequence.objects.values_list('name', 'next_value'))
+        stats, rejects = self.run_import(row(10), row(11, email='asha@example.com'), dry_run=True)
+        self.assertEqual(stats, {'rows': 2, 'created': 1, 'rejected': 1})
+        self.assertEqual(Customer.objects.count(), 1)
+        self.assertEqual(list(IdSequence.objects.values_list('name', 'next_value')), before)
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            import_customers(customer_file(row(10)), fmt='json')
+
+    @unittest.skipUnless(importlib.util.find_spec('openpyxl'), "openpyxl is not installed")
+    def test_xlsx(self):
+        import openpyxl
+
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append([name.replace('_', ' ').title() for name in IMPORT_FIELDS])
+        sheet.append([row(10).get(name, '') for name in IMPORT_FIELDS])
+        data = io.BytesIO()
+        workbook.save(data)
+        data.seek(0)
+        stats = import_customers(data, fmt='xlsx')
+        self.assertEqual(stats, {'rows': 1, 'created': 1, 'rejected': 0})
@@ -0,0 +1,101 @@
+"""
+Streaming export tests: the rows and filters of each export, both formats,
+and the errors the view and the export_data command report for bad input.
+"""
+import csv
+import io
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .billing import build_bill
+from .exports import ExportError, export
+from .models import Customer, Feedback, WasteItem
+
+
+def read_csv(lines):
+    return list(csv.DictReader(io.StringIO(''.join(lines))))
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.asha = Customer.objects.create(name='Asha', email='asha@example.com', customer_type='Household')
+        self.shop = Customer.objects.create(name='Corner Shop', email='shop@example.com', customer_type='Shop')
+        self.plastic = WasteItem.objects.create(name='Plastic', unit_price=10)
+        self.paper = WasteItem.objects.create(name='Paper', unit_price=5)
+        self.bill = build_bill(self.asha, {self.plastic: 1, self.paper: 2}, month=3, year=2031)
+        build_bill(self.shop, {self.paper: 1}, month=4, year=2031, paid=True)
+
+    def test_customers_filtered_by_type(self):
+        rows = read_csv(export('customers', {'type': 'Shop'}))
+        self.assertEqual([row['name'] for row in rows], ['Corner Shop'])
+        with self.assertRaises(ExportError):
+            export('customers', {'type': 'Castle'})
+
+    def test_bills_have_one_row_per_item(self):
+        rows = read_csv(export('bills', {'year': '2031', 'month': '3'}))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['bill_id'] for row in rows}, {str(self.bill.pk)})
+        self.assertEqual(sorted(row['waste_item'] for row in rows), ['Paper', 'Plastic'])
+        self.assertEqual([row['customer_name'] for row in read_csv(export('bills', {'paid': 'paid'}))],
+                         ['Corner Shop'])
+
+    def test_bill_without_items_gets_one_row(self):
+        self.bill.items.all().delete()
+        rows = read_csv(export('bills', {'month': '3'}))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['item_id'], '')
+
+    def test_ndjson(self):
+        lines = list(export('customers', {}, fmt='ndjson'))
+        self.assertEqual([json.loads(line)['email'] for line in lines], ['asha@example.com', 'shop@example.com'])
+
+    def test_feedback_date_range(self):
+        old = Feedback.objects.create(customer=self.asha, comment='Late pickup')
+        Feedback.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=10))
+        Feedback.objects.create(customer=self.shop, comment='Great service')
+        today = timezone.localdate().isoformat()
+        rows = read_csv(export('feedback', {'start': today, 'end': today}))
+        self.assertEqual([row['comment'] for row in rows], ['Great service'])
+
+    def test_bad_filters(self):
+        for kind, params in (
+            ('bills', {'month': '13'}),
+            ('bills', {'year': 'soon'}),
+            ('bills', {'paid': 'maybe'}),
+            ('feedback', {'start': '2024-02-30'}),
+            ('feedback', {'end': 'yesterday'}),
+            ('feedback', {'sentiment': 'Angry'}),
+            ('invoices', {}),
+        ):
+            with self.subTest(kind=kind, params=params), self.assertRaises(ExportError):
+                export(kind, params)
+        with self.assertRaises(ExportError):
+            export('customers', {}, fmt='xml')
+
+    # -------------------------
+    # View & Command
+    # -------------------------
+    def test_view_streams_for_staff(self):
+        url = reverse('core:export_data', args=['bills'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(read_csv(chunk.decode() for chunk in response.streaming_content)), 3)
+        self.assertEqual(self.client.get(url, {'month': '13'}).status_code, 400)
+        feedback_url = reverse('core:export_data', args=['feedback'])
+        self.assertEqual(self.client.get(feedback_url, {'start': '2024-02-30'}).status_code, 400)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_data', 'customers', '--type', 'Household', stdout=out)
+        self.assertEqual([row['name'] for row in read_csv([out.getvalue()])], ['Asha'])
+        with self.assertRaises(CommandError):
+            call_command('export_data', 'feedback', '--start', '2024-02-30', stdout=io.StringIO())
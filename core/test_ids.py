@@ -0,0 +1,47 @@
+"""
+Customer ID allocator tests.
+"""
+from django.test import TestCase
+
+from .ids import (
+    CUSTOMER_ID_SEQUENCE, IdSpaceExhausted, allocate_block, allocate_customer_ids, format_customer_id,
+)
+from .models import Customer, IdSequence
+
+
+class IdAllocatorTests(TestCase):
+
+    def set_next(self, value):
+        IdSequence.objects.update_or_create(name=CUSTOMER_ID_SEQUENCE, defaults={'next_value': value})
+
+    def test_blocks_do_not_overlap(self):
+        first = allocate_block('test', 3)
+        second = allocate_block('test', 2)
+        self.assertEqual(list(first), [1, 2, 3])
+        self.assertEqual(list(second), [4, 5])
+        self.assertEqual(list(allocate_block('other', 1)), [1])
+
+    def test_taken_and_excluded_ids_are_skipped(self):
+        self.set_next(1)
+        Customer.objects.create(customer_id=format_customer_id(2), name='Asha', email='asha@example.com')
+        ids = allocate_customer_ids(3, exclude={format_customer_id(4)})
+        self.assertEqual(ids, [format_customer_id(n) for n in (1, 3, 5)])
+
+    def test_new_customers_get_the_next_id(self):
+        self.set_next(41)
+        first = Customer.objects.create(name='Asha', email='asha@example.com')
+        second = Customer.objects.create(name='Ravi', email='ravi@example.com')
+        self.assertEqual((first.customer_id, second.customer_id), ('CUST000041', 'CUST000042'))
+
+    def test_block_costs_a_constant_number_of_queries(self):
+        self.set_next(1)
+        # UPDATE and read back in a savepoint, then one lookup of taken IDs
+        with self.assertNumQueries(5):
+            ids = allocate_customer_ids(1000)
+        self.assertEqual(len(set(ids)), 1000)
+
+    def test_exhausted_id_space(self):
+        self.set_next(999_999)
+        self.assertEqual(allocate_customer_ids(1), ['CUST999999'])
+        with self.assertRaises(IdSpaceExhausted):
+            allocate_customer_ids(1)
@@ -0,0 +1,130 @@
+"""
+Mail queue tests: claiming, delivery, retry backoff and stale claims.
+"""
+import io
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import mail_queue
+from .mail_queue import claim_batch, drain_queue, enqueue_email, requeue_stale, send_batch
+from .models import OutboundEmail, SentEmail
+
+
+class FailingConnection:
+    """Email backend connection whose sends all raise."""
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise OSError('Connection refused')
+
+
+@override_settings(
+    MAIL_QUEUE_WORKERS=0, MAIL_QUEUE_MAX_ATTEMPTS=3, MAIL_QUEUE_RETRY_BACKOFF=30,
+    MAIL_QUEUE_CLAIM_TIMEOUT=300, MAIL_QUEUE_REQUEUE_INTERVAL=60,
+)
+class MailQueueTests(TestCase):
+
+    def setUp(self):
+        mail_queue._last_requeue = None
+        self.addCleanup(setattr, mail_queue, '_last_requeue', None)
+
+    def queue(self, n, **fields):
+        messages = [enqueue_email(f'user{i}@example.com', 'Your OTP', 'Code: 123456') for i in range(n)]
+        if fields:
+            OutboundEmail.objects.filter(pk__in=[m.pk for m in messages]).update(**fields)
+        return messages
+
+    def fail(self, batch):
+        with mock.patch('core.mail_queue.get_connection', return_value=FailingConnection()), \
+                self.assertLogs('core.mail_queue', 'WARNING') as logs:
+            self.assertEqual(send_batch(batch), (0, len(batch)))
+        return logs
+
+    # -------------------------
+    # Claiming
+    # -------------------------
+    def test_enqueue_does_not_start_workers_by_default(self):
+        with mock.patch('core.mail_queue.start_workers') as start, self.captureOnCommitCallbacks(execute=True):
+            self.queue(1)
+        start.assert_not_called()
+        self.assertEqual(OutboundEmail.objects.get().status, 'queued')
+
+    def test_claim_takes_due_messages_once(self):
+        due = self.queue(3)
+        self.queue(1, next_attempt_at=timezone.now() + timedelta(minutes=5))
+        self.queue(1, status='sent')
+        first = claim_batch(2)
+        second = claim_batch(10)
+        self.assertEqual([m.pk for m in first], [m.pk for m in due[:2]])
+        self.assertEqual([m.pk for m in second], [due[2].pk])
+        self.assertEqual(claim_batch(10), [])
+        self.assertNotEqual(first[0].claim_token, second[0].claim_token)
+        self.assertEqual({m.status for m in first + second}, {'sending'})
+
+    # -------------------------
+    # Delivery and retries
+    # -------------------------
+    def test_drain_delivers_and_records_the_outbox(self):
+        self.queue(3)
+        self.assertEqual(drain_queue(batch_size=2), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        states = set(OutboundEmail.objects.values_list('status', 'attempts', 'claim_token'))
+        self.assertEqual(states, {('sent', 1, '')})
+        self.assertEqual(SentEmail.objects.count(), 3)
+
+    def test_failures_back_off_exponentially(self):
+        self.queue(1)
+        for attempt in (1, 2):
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            before = timezone.now()
+            logs = self.fail(claim_batch(10))
+            message = OutboundEmail.objects.get()
+            self.assertEqual((message.status, message.attempts), ('queued', attempt))
+            backoff = (message.next_attempt_at - before).total_seconds()
+            self.assertAlmostEqual(backoff, 30 * 2 ** (attempt - 1), delta=5)
+        self.assertEqual(message.last_error, 'Connection refused')
+        self.assertIn('attempt 2/3', logs.output[0])
+        # Not due yet
+        self.assertEqual(claim_batch(10), [])
+
+    def test_gives_up_after_max_attempts(self):
+        self.queue(1, attempts=2)
+        self.fail(claim_batch(10))
+        message = OutboundEmail.objects.get()
+        self.assertEqual((message.status, message.attempts), ('failed', 3))
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(claim_batch(10), [])
+
+    # -------------------------
+    # Stale claims
+    # -------------------------
+    def test_stale_claims_are_requeued(self):
+        stale = self.queue(1, status='sending', claimed_at=timezone.now() - timedelta(minutes=10))
+        fresh = self.queue(1, status='sending', claimed_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual([m.pk for m in claim_batch(10)], [stale[0].pk])
+        self.assertEqual(OutboundEmail.objects.get(pk=fresh[0].pk).status, 'sending')
+
+    def test_requeue_runs_once_per_interval(self):
+        self.queue(1, status='sending', claimed_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(requeue_stale(timezone.now()), 1)
+        self.queue(1, status='sending', claimed_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(requeue_stale(timezone.now()), 0)
+        with mock.patch('core.mail_queue.time.monotonic', return_value=mail_queue._last_requeue + 61):
+            self.assertEqual(requeue_stale(timezone.now()), 1)
+
+    def test_command_drains_once(self):
+        self.queue(2)
+        out = io.StringIO()
+        call_command('process_mail_queue', '--once', stdout=out)
+        self.assertIn('2 sent | 0 failed', out.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
@@ -0,0 +1,87 @@
+"""
+Dashboard counter tests: the deltas the signal handlers apply must leave the
+counters exactly where rebuild_counters() would put them.
+"""
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from .billing import build_bill, generate_monthly_bills, mark_bills_paid, set_bill_items
+from .metrics import rebuild_counters
+from .models import Bill, Customer, DashboardCounter, Feedback, WasteItem
+
+
+class CounterDeltaTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        self.asha = Customer.objects.create(name='Asha', email='asha@example.com', phone='9800000001')
+        self.ravi = Customer.objects.create(
+            name='Ravi', email='ravi@example.com', phone='9800000002', customer_type='Shop'
+        )
+        self.plastic = WasteItem.objects.create(name='Plastic', unit_price=12)
+        self.paper = WasteItem.objects.create(name='Paper', unit_price=5)
+
+    def counters(self):
+        # Counters deltas took down to zero are left out, as a rebuild does not write them
+        return {
+            name: round(value, 2)
+            for name, value in DashboardCounter.objects.values_list('name', 'value') if round(value, 2)
+        }
+
+    def assertCountersRebuilt(self, step):
+        current = self.counters()
+        rebuild_counters()
+        self.assertEqual(current, self.counters(), step)
+
+    def run_step(self, step, action):
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+        self.assertCountersRebuilt(step)
+
+    def test_bill_views(self):
+        self.assertCountersRebuilt('setup')
+        self.run_step('add', lambda: self.client.post(reverse('core:add_bill'), {
+            'customer': self.asha.pk, f'quantity_{self.plastic.pk}': 2,
+        }))
+        bill = Bill.objects.get(customer=self.asha)
+        self.run_step('edit', lambda: self.client.post(reverse('core:edit_bill', args=[bill.pk]), {
+            'customer': self.ravi.pk, 'total_amount': 1, 'status': 'Unpaid',
+            f'quantity_{self.plastic.pk}': 1, f'quantity_{self.paper.pk}': 3,
+        }))
+        self.assertEqual(Bill.objects.get(pk=bill.pk).total_amount, 27.0)
+        self.run_step('mark paid', lambda: self.client.get(reverse('core:mark_bill_paid', args=[bill.pk])))
+        self.assertTrue(Bill.objects.get(pk=bill.pk).paid)
+        self.run_step('delete', lambda: self.client.get(reverse('core:delete_bill', args=[bill.pk])))
+        self.assertFalse(Bill.objects.exists())
+
+    def test_bill_services(self):
+        def create():
+            self.first = build_bill(self.asha, {self.plastic: 2}, month=3, year=2031)
+            self.second = build_bill(self.ravi, {self.paper: 4}, month=3, year=2031, paid=True)
+
+        self.run_step('build', create)
+        self.run_step('set items', lambda: set_bill_items(self.first, {self.paper: 1}))
+
+        def move():
+            self.first.month = 4
+            self.first.total_amount = 80
+            self.first.save()
+
+        self.run_step('change period', move)
+        self.run_step('monthly run', lambda: generate_monthly_bills(5, 2031, chunk_size=1))
+        self.run_step('mark paid', lambda: mark_bills_paid(Bill.objects.values_list('pk', flat=True)))
+
+        def unpay():
+            bill = Bill.objects.get(pk=self.second.pk)
+            bill.paid = False
+            bill.save()
+
+        self.run_step('unpay', unpay)
+        self.run_step('delete customer', lambda: Customer.objects.get(pk=self.ravi.pk).delete())
+
+    def test_customers_and_feedback(self):
+        self.run_step('feedback', lambda: Feedback.objects.create(customer=self.asha, comment='Great pickup'))
+        self.run_step('more customers', lambda: Customer.objects.create(name='Mina', email='mina@example.com'))
+        self.run_step('delete feedback', lambda: Feedback.objects.get().delete())
+        self.run_step('delete customer', lambda: Customer.objects.get(name='Mina').delete())
@@ -0,0 +1,115 @@
+"""
+OTP store tests.
+
+The same cases run against both stores: issuing, verifying, expiry, the
+attempt limit and single use of a code.
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import OTP
+from .otp_store import CacheOTPStore, DatabaseOTPStore
+from .otp_utils import create_otp, verify_otp
+
+OTP_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-default'},
+    'otp': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-otp'},
+}
+
+
+class OTPStoreCases:
+    """Mixed into one TestCase per store; ``make_store`` builds the store."""
+
+    def setUp(self):
+        self.store = self.make_store()
+        patcher = mock.patch('core.otp_utils.get_otp_store', return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def issue(self, contact='asha@example.com', otp_type='email', minutes=5, max_attempts=3):
+        email, phone = (contact, None) if otp_type == 'email' else (None, contact)
+        return self.store.create(
+            email=email, phone=phone, otp_type=otp_type, otp_code='123456',
+            expires_at=timezone.now() + timedelta(minutes=minutes), max_attempts=max_attempts,
+        )
+
+    def test_latest_is_the_newest_code(self):
+        self.issue()
+        newer = self.store.create(
+            email='asha@example.com', phone=None, otp_type='email', otp_code='654321',
+            expires_at=timezone.now() + timedelta(minutes=5), max_attempts=3,
+        )
+        self.issue(contact='9800000001', otp_type='phone')
+        latest = self.store.latest('asha@example.com', 'email')
+        self.assertEqual((latest.otp_code, latest.created_at), ('654321', newer.created_at))
+        self.assertEqual(self.store.latest('9800000001', 'phone').otp_code, '123456')
+        self.assertIsNone(self.store.latest('9800000001', 'email'))
+
+    def test_verify_consumes_the_code(self):
+        self.issue()
+        otp = self.store.latest('asha@example.com', 'email')
+        self.assertTrue(self.store.verify(otp, '123456'))
+        self.assertFalse(verify_otp('asha@example.com', '123456')['success'])
+
+    def test_expired_code_is_rejected(self):
+        self.issue(minutes=-1)
+        result = verify_otp('asha@example.com', '123456')
+        self.assertFalse(result['success'])
+        self.assertIn('expired', result['message'])
+
+    def test_attempt_limit(self):
+        self.issue(max_attempts=3)
+        messages = [verify_otp('asha@example.com', '000000')['message'] for _ in range(3)]
+        self.assertEqual(messages[-1], 'Invalid OTP. Attempts remaining: 0')
+        self.assertEqual(self.store.latest('asha@example.com', 'email').attempts, 3)
+        self.assertFalse(verify_otp('asha@example.com', '123456')['success'])
+
+    def test_code_verifies_once_across_readers(self):
+        self.issue()
+        first = self.store.latest('asha@example.com', 'email')
+        second = self.store.latest('asha@example.com', 'email')
+        self.assertTrue(self.store.verify(first, '123456'))
+        self.assertFalse(self.store.verify(second, '123456'))
+
+    def test_create_otp_uses_the_store(self):
+        with override_settings(OTP_MAX_ATTEMPTS=4):
+            otp = create_otp(email='ravi@example.com')
+        self.assertEqual(otp.max_attempts, 4)
+        self.assertTrue(verify_otp('ravi@example.com', otp.otp_code)['success'])
+
+
+class DatabaseOTPStoreTests(OTPStoreCases, TestCase):
+
+    def make_store(self):
+        return DatabaseOTPStore()
+
+    def test_stale_reader_cannot_beat_the_attempt_limit(self):
+        self.issue(max_attempts=2)
+        stale = self.store.latest('asha@example.com', 'email')
+        for _ in range(2):
+            verify_otp('asha@example.com', '000000')
+        # This instance still thinks no attempts were made; the conditional
+        # UPDATE reads the row's own counter
+        self.assertEqual(stale.attempts, 0)
+        self.assertFalse(stale.verify('123456'))
+        self.assertFalse(OTP.objects.get().is_verified)
+
+
+@override_settings(CACHES=OTP_CACHES, OTP_CACHE_ALIAS='otp')
+class CacheOTPStoreTests(OTPStoreCases, TestCase):
+
+    def make_store(self):
+        return CacheOTPStore()
+
+    def setUp(self):
+        super().setUp()
+        self.store.cache.clear()
+        self.addCleanup(self.store.cache.clear)
+
+    def test_nothing_is_written_to_the_database(self):
+        self.issue()
+        verify_otp('asha@example.com', '000000')
+        self.assertFalse(OTP.objects.exists())
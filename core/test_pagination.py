@@ -0,0 +1,110 @@
+"""
+Keyset pagination tests: walking both ways, ties on the leading keys, bad
+cursors and the has_next/has_previous flags at either end.
+"""
+import base64
+import json
+
+from django.test import TestCase
+
+from .models import Customer
+from .pagination import InvalidCursor, KeysetPaginator
+
+
+def cursor_of(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+class KeysetPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Types repeat, so every page boundary falls inside a run of ties
+        types = ['Shop', 'Household', 'Hotel', 'Household', 'Shop', 'Household', 'Hotel', 'Shop']
+        cls.customers = [
+            Customer.objects.create(name=f'Customer {n}', email=f'c{n}@example.com', customer_type=kind)
+            for n, kind in enumerate(types)
+        ]
+
+    def expected(self, ordering):
+        return list(Customer.objects.order_by(*ordering).values_list('pk', flat=True))
+
+    def walk_forward(self, paginator):
+        pages, page = [], paginator.page()
+        pages.append(page)
+        while page.has_next:
+            page = paginator.page(after=page.next_cursor)
+            pages.append(page)
+        return pages
+
+    def pks(self, page):
+        return [customer.pk for customer in page]
+
+    def test_forward_walk_visits_every_row_once(self):
+        for ordering in (('customer_type', 'id'), ('-customer_type', 'id'), ('-customer_type', '-id')):
+            paginator = KeysetPaginator(Customer.objects.all(), ordering, per_page=3)
+            pages = self.walk_forward(paginator)
+            self.assertEqual([len(page) for page in pages], [3, 3, 2], ordering)
+            self.assertEqual([pk for page in pages for pk in self.pks(page)], self.expected(ordering), ordering)
+
+    def test_backward_walk_returns_the_same_pages(self):
+        paginator = KeysetPaginator(Customer.objects.all(), ('customer_type', '-id'), per_page=3)
+        forward = self.walk_forward(paginator)
+        page, backward = forward[-1], []
+        while page.has_previous:
+            page = paginator.page(before=page.previous_cursor)
+            backward.append(self.pks(page))
+        self.assertEqual(backward, [self.pks(page) for page in reversed(forward[:-1])])
+
+    def test_flags_at_the_edges(self):
+        paginator = KeysetPaginator(Customer.objects.all(), ('customer_type', 'id'), per_page=3)
+        first, middle, last = self.walk_forward(paginator)
+        self.assertEqual((first.has_previous, first.has_next), (False, True))
+        self.assertEqual((middle.has_previous, middle.has_next), (True, True))
+        self.assertEqual((last.has_previous, last.has_next), (True, False))
+        # Back to the start from the middle page
+        again = paginator.page(before=middle.previous_cursor)
+        self.assertEqual(self.pks(again), self.pks(first))
+        self.assertEqual((again.has_previous, again.has_next), (False, True))
+
+    def test_exact_fit_has_no_empty_last_page(self):
+        paginator = KeysetPaginator(Customer.objects.all(), ('id',), per_page=4)
+        self.assertEqual([len(page) for page in self.walk_forward(paginator)], [4, 4])
+        single = KeysetPaginator(Customer.objects.all(), ('id',), per_page=8).page()
+        self.assertEqual((single.has_previous, single.has_next), (False, False))
+
+    def test_empty_page(self):
+        paginator = KeysetPaginator(Customer.objects.none(), ('id',))
+        page = paginator.page()
+        self.assertEqual((len(page), page.has_previous, page.has_next), (0, False, False))
+        past_the_end = KeysetPaginator(Customer.objects.all(), ('id',)).page(after=cursor_of([10 ** 9]))
+        self.assertEqual(len(past_the_end), 0)
+
+    def test_rows_added_behind_the_cursor_do_not_shift_the_page(self):
+        paginator = KeysetPaginator(Customer.objects.all(), ('-id',), per_page=3)
+        first = paginator.page()
+        Customer.objects.create(name='Newest', email='new@example.com')
+        second = paginator.page(after=first.next_cursor)
+        self.assertEqual(self.pks(second), self.expected(('-id',))[4:7])
+
+    def test_invalid_and_tampered_cursors(self):
+        paginator = KeysetPaginator(Customer.objects.all(), ('customer_type', 'id'), per_page=3)
+        bad = [
+            'not base64 !',
+            base64.urlsafe_b64encode(b'{not json').decode(),
+            cursor_of(['Shop']),                # Too few values
+            cursor_of(['Shop', 1, 2]),          # Too many values
+            cursor_of(['Shop', 'one']),         # Not an id
+            cursor_of({'customer_type': 'Shop'}),
+            cursor_of(42),
+        ]
+        for cursor in bad:
+            with self.assertRaises(InvalidCursor, msg=cursor):
+                paginator.page(after=cursor)
+            with self.assertRaises(InvalidCursor, msg=cursor):
+                paginator.page(before=cursor)
+
+    def test_cursor_round_trip(self):
+        paginator = KeysetPaginator(Customer.objects.all(), ('-customer_type', 'id'))
+        customer = self.customers[3]
+        self.assertEqual(paginator.decode_cursor(paginator.encode_cursor(customer)), ['Household', customer.pk])
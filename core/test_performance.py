@@ -0,0 +1,308 @@
+"""
+Query-count and latency budgets for every page.
+
+The data set is grown in steps from 10 to 10,000 customers (each with a bill,
+two bill items and a feedback; one customer also collects a bill history
+that grows with the step). At every step each URL of core/urls.py and the
+admin changelists is requested once with a cold cache, recording the number
+of queries and the wall-clock time. Form pages are also POSTed, and every
+request runs its transaction.on_commit callbacks (which TestCase would
+otherwise drop) inside the measurement.
+
+Each page then has to stay within a fixed query budget at every size. A
+failure prints the growth curve and the SQL of the worst request, so an N+1
+shows up as a query count that climbs with the row count.
+
+Wall-clock time depends on the machine, so the time budgets at the largest
+size are only checked when PERF_TIME_BUDGETS=1 is set. They are for a
+developer laptop; set PERF_TIME_SCALE (e.g. 3) to loosen them on slower
+machines.
+"""
+import os
+import time
+import unittest
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import urls as core_urls
+from .ids import allocate_customer_ids
+from .metrics import rebuild_counters
+from .models import Bill, BillItem, Customer, Feedback, WasteItem
+from .reports import rebuild_rollups
+from .summaries import rebuild_summaries
+
+SIZES = (10, 100, 1000, 10000)
+SEED_YEAR = 2031
+TIME_BUDGETS = os.environ.get('PERF_TIME_BUDGETS') == '1'
+TIME_SCALE = float(os.environ.get('PERF_TIME_SCALE', 1))
+
+
+# -------------------------
+# Data
+# -------------------------
+class Seeder:
+    """Grows the data set step by step; bulk inserts, then rebuilds the derived tables."""
+
+    def __init__(self):
+        self.size = 0
+        self.items = WasteItem.objects.bulk_create([
+            WasteItem(name='Plastic', unit_price=12),
+            WasteItem(name='Paper', unit_price=5),
+            WasteItem(name='Glass', unit_price=8),
+        ])
+        self.busy = self.customers(1)[0]
+        self.busy_bills = 0
+
+    def customers(self, count):
+        types = [name for name, _ in Customer.CUSTOMER_TYPES]
+        customers = []
+        for n, customer_id in enumerate(allocate_customer_ids(count), start=self.size):
+            customer_type = types[n % len(types)]
+            customers.append(Customer(
+                customer_id=customer_id,
+                name=f'Customer {n}',
+                email=f'customer{n}@example.com',
+                phone=f'98{n:08d}',
+                customer_type=customer_type,
+                monthly_rate=Customer.rate_for_type(customer_type, 0),
+            ))
+        return Customer.objects.bulk_create(customers)
+
+    def bills(self, entries, paid=None):
+        """Bill (customer, year, month) entries with two items each; every third is paid."""
+        bills = Bill.objects.bulk_create([
+            Bill(customer=customer, year=year, month=month, total_amount=0,
+                 paid=n % 3 == 0 if paid is None else paid)
+            for n, (customer, year, month) in enumerate(entries)
+        ])
+        items = []
+        for n, bill in enumerate(bills):
+            quantity = 1 + n % 7
+            for item in (self.items[n % 3], self.items[(n + 1) % 3]):
+                items.append(BillItem(bill=bill, waste_item=item, quantity=quantity,
+                                      amount=item.unit_price * quantity))
+                bill.total_amount += item.unit_price * quantity
+        BillItem.objects.bulk_create(items)
+        Bill.objects.bulk_update(bills, ['total_amount'], batch_size=1000)
+        return bills
+
+    def grow_to(self, size):
+        customers = self.customers(size - self.size)
+        self.bills([(c, SEED_YEAR, 1 + n % 12) for n, c in enumerate(customers)])
+        Feedback.objects.bulk_create([
+            Feedback(customer=c, comment=f'Pickup was {word} this week',
+                     sentiment=sentiment)
+            for c, (word, sentiment) in zip(customers, self._comments(len(customers)))
+        ])
+
+        # The busy customer's history grows with the data set
+        wanted = max(1, size // 10)
+        periods = [(SEED_YEAR - 1 - n // 12, 12 - n % 12) for n in range(self.busy_bills, wanted)]
+        self.bills([(self.busy, year, month) for year, month in periods])
+        self.busy_bills = wanted
+
+        rebuild_summaries()
+        rebuild_counters()
+        rebuild_rollups()
+        self.size = size
+
+    @staticmethod
+    def _comments(count):
+        words = [('on time', 'Positive'), ('late', 'Negative'), ('fine', 'Neutral')]
+        return [words[n % 3] for n in range(count)]
+
+    def fresh_bill(self, paid=False):
+        customer = self.customers(1)[0]
+        bill = self.bills([(customer, SEED_YEAR, 1)], paid=paid)[0]
+        # As after any bill write: later saves update the summary by delta
+        rebuild_summaries([customer.pk])
+        return bill
+
+    # Form posts
+    def customer_form(self, args):
+        self.posted = getattr(self, 'posted', 0) + 1
+        return {
+            'name': f'Posted Customer {self.posted}',
+            'email': f'posted{self.posted}@example.com',
+            'phone': f'97{self.posted:08d}',
+            'address': '12 Ward Chowk',
+            'customer_type': 'Shop',
+            'monthly_rate': 500,
+        }
+
+    def bill_form(self, args):
+        return {'customer': self.customers(1)[0].pk, f'quantity_{self.items[0].pk}': 2}
+
+    def edit_bill_form(self, args):
+        bill = Bill.objects.get(pk=args[0])
+        return {
+            'customer': bill.customer_id,
+            'total_amount': 100,
+            'status': 'Paid',
+            'paid': 'on',
+            f'quantity_{self.items[0].pk}': 3,
+            f'quantity_{self.items[2].pk}': 1,
+        }
+
+
+# -------------------------
+# Budgets
+# -------------------------
+class Page:
+    """
+    A URL with its budget.
+
+    Args:
+        name (str): URL name
+        queries (int): Most queries allowed at any size
+        seconds (float): Most wall-clock time allowed at the largest size
+        args (callable): Seeder -> URL arguments; may create a throwaway
+            object for pages that delete or change what they are given
+        anonymous (bool): Request without logging in
+        settings (dict): Settings overridden for the request
+        data (callable): (Seeder, URL arguments) -> form data; the page is
+            then POSTed and has to redirect
+    """
+
+    def __init__(self, name, queries, seconds, args=None, anonymous=False, settings=None, data=None):
+        self.name = name
+        self.key = f'{name} POST' if data else name
+        self.queries = queries
+        self.seconds = seconds
+        self.args = args or (lambda seeder: [])
+        self.anonymous = anonymous
+        self.settings = settings or {}
+        self.data = data
+
+
+PAGES = [
+    # Authentication
+    Page('core:admin_login', 0, 0.1, anonymous=True),
+    Page('core:admin_logout', 4, 0.1),
+    Page('core:admin_verify_otp', 0, 0.1, anonymous=True),
+    Page('core:admin_resend_otp', 0, 0.1, anonymous=True),
+    Page('core:debug_sent_emails', 4, 0.1, settings={'DEBUG': True}),
+    Page('core:debug_profiles', 2, 0.2),
+    # Home
+    Page('core:home', 3, 0.1),
+    # Feedback
+    Page('core:feedback_list', 3, 0.15),
+    # Forms with a <select> of every customer grow with the table
+    Page('core:add_feedback', 3, 5.0),
+    # Customers
+    Page('core:customer_list', 4, 0.2),
+    Page('core:add_customer', 2, 0.1),
+    Page('core:customer_suggest', 0, 0.1),
+    Page('core:edit_customer', 3, 0.1, args=lambda s: [s.busy.pk]),
+    # Deletes read the bill's items and type to take it out of the rollups
+    Page('core:delete_customer', 14, 0.15, args=lambda s: [s.fresh_bill().customer_id]),
+    Page('core:customer_detail', 5, 0.15, args=lambda s: [s.busy.pk]),
+    Page('core:customer_qr_code', 1, 0.5, args=lambda s: [s.busy.pk]),
+    # Bills
+    Page('core:bill_list', 3, 0.15),
+    Page('core:add_bill', 4, 1.0),
+    Page('core:bill_detail', 4, 0.1, args=lambda s: [s.fresh_bill().pk]),
+    Page('core:edit_bill', 6, 5.0, args=lambda s: [s.fresh_bill().pk]),
+    Page('core:delete_bill', 8, 0.15, args=lambda s: [s.fresh_bill().pk]),
+    # Summary, rollup and counter updates of the now paid bill
+    Page('core:mark_bill_paid', 10, 0.1, args=lambda s: [s.fresh_bill().pk]),
+    # Form posts, with what they do on commit
+    Page('core:add_customer', 10, 0.1, data=Seeder.customer_form),
+    Page('core:add_bill', 20, 0.15, data=Seeder.bill_form),
+    Page('core:edit_bill', 21, 0.2, args=lambda s: [s.fresh_bill().pk], data=Seeder.edit_bill_form),
+    # Reports
+    Page('core:revenue_report', 6, 0.15),
+    # Exports stream every row, so only the time grows
+    Page('core:export_data', 3, 2.0, args=lambda s: ['bills']),
+    # Admin changelists
+    Page('admin:core_customer_changelist', 5, 0.5),
+    Page('admin:core_bill_changelist', 7, 0.5),
+    Page('admin:core_feedback_changelist', 5, 0.5),
+]
+
+
+class Measurement:
+    def __init__(self, size, status, queries, seconds):
+        self.size = size
+        self.status = status
+        self.queries = [q['sql'] for q in queries]
+        self.seconds = seconds
+
+
+def measure(page, user, seeder):
+    """
+    Request ``page`` once with a cold cache and record what it cost,
+    including the on-commit callbacks the request scheduled.
+    """
+    args = page.args(seeder)
+    url = reverse(page.name, args=args)
+    data = page.data(seeder, args) if page.data else None
+    client = Client()
+    if not page.anonymous:
+        client.force_login(user)
+    cache.clear()
+    with override_settings(**page.settings), CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        with TestCase.captureOnCommitCallbacks(execute=True):
+            response = client.post(url, data) if data is not None else client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        seconds = time.perf_counter() - start
+    return Measurement(seeder.size, response.status_code, queries.captured_queries, seconds)
+
+
+def report(page, curve):
+    """Growth curve plus the SQL of the worst request."""
+    lines = [f'{page.key}: budget {page.queries} queries, {page.seconds * 1000:.0f} ms',
+             f'{"rows":>8} {"status":>7} {"queries":>8} {"ms":>9}']
+    for m in curve:
+        lines.append(f'{m.size:>8} {m.status:>7} {len(m.queries):>8} {m.seconds * 1000:>9.1f}')
+    worst = max(curve, key=lambda m: (len(m.queries), m.size))
+    lines.append(f'Queries at {worst.size} rows:')
+    lines.extend(f'  {n}. {sql}' for n, sql in enumerate(worst.queries, start=1))
+    return '\n'.join(lines)
+
+
+class PageBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('perf', 'perf@example.com', 'perf')
+        seeder = Seeder()
+        cls.curves = {page.key: [] for page in PAGES}
+        for size in SIZES:
+            seeder.grow_to(size)
+            for page in PAGES:
+                cls.curves[page.key].append(measure(page, cls.user, seeder))
+
+    def test_every_url_has_a_budget(self):
+        names = {f'core:{pattern.name}' for pattern in core_urls.urlpatterns}
+        self.assertEqual(names - {page.name for page in PAGES}, set())
+
+    def test_pages_respond(self):
+        for page in PAGES:
+            with self.subTest(page=page.key):
+                statuses = {m.status for m in self.curves[page.key]}
+                # A form post that answers 200 re-rendered the form with errors
+                expected = {302} if page.data else {200, 302}
+                self.assertTrue(statuses <= expected, report(page, self.curves[page.key]))
+
+    def test_query_budgets(self):
+        for page in PAGES:
+            with self.subTest(page=page.key):
+                curve = self.curves[page.key]
+                most = max(len(m.queries) for m in curve)
+                self.assertLessEqual(most, page.queries, report(page, curve))
+
+    @unittest.skipUnless(TIME_BUDGETS, "Set PERF_TIME_BUDGETS=1 to check wall-clock budgets")
+    def test_time_budgets(self):
+        for page in PAGES:
+            with self.subTest(page=page.key):
+                curve = self.curves[page.key]
+                self.assertLessEqual(curve[-1].seconds, page.seconds * TIME_SCALE, report(page, curve))
+
@@ -0,0 +1,37 @@
+"""
+Request profiling middleware tests.
+"""
+from django.contrib.auth.models import User
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from . import profiling
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0, PROFILING_SLOW_MS=0)
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        profiling.clear_profiles()
+        self.addCleanup(profiling.clear_profiles)
+        # The middleware reads PROFILING_ENABLED when the client builds its handler
+        self.client = Client()
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+
+    def test_slow_request_profiles_the_next_one(self):
+        for _ in range(2):
+            self.client.get(reverse('core:home'))
+        slow, profiled = profiling.recent_profiles()
+        self.assertIsNone(slow['profile'])
+        self.assertIn('function calls', profiled['profile'])
+        self.assertEqual(profiled['profile_trigger'], slow['id'])
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client.get(reverse('core:home'))
+        self.assertEqual(profiling.recent_profiles(), [])
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        Client().get(reverse('core:admin_login'))
+        self.assertEqual(profiling.recent_profiles(), [])
@@ -0,0 +1,108 @@
+"""
+Customer QR code tests: the cache backends and the image view's ETags.
+"""
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .models import Customer
+from .qr import FileSystemQRCache, LocMemQRCache, payload_digest, qr_payload
+
+
+class LocMemQRCacheTests(SimpleTestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LocMemQRCache(max_entries=2)
+        cache.set('a', b'A')
+        cache.set('b', b'B')
+        cache.get('a')
+        cache.set('c', b'C')
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (b'A', None, b'C'))
+
+
+class FileSystemQRCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.location = temp.name
+
+    def files(self):
+        return sorted(os.listdir(self.location))
+
+    def test_round_trip(self):
+        cache = FileSystemQRCache(self.location)
+        self.assertIsNone(cache.get('abc'))
+        cache.set('abc', b'PNG')
+        self.assertEqual(cache.get('abc'), b'PNG')
+        self.assertEqual(self.files(), ['abc.png'])
+
+    def test_directory_is_scanned_once_per_tenth_of_max_entries(self):
+        cache = FileSystemQRCache(self.location, max_entries=100)
+        with mock.patch('core.qr.os.scandir', wraps=os.scandir) as scandir:
+            for n in range(25):
+                cache.set(f'{n:02d}', b'PNG')
+        self.assertEqual(scandir.call_count, 2)
+        self.assertEqual(len(self.files()), 25)
+
+    def test_cull_keeps_the_recently_used(self):
+        cache = FileSystemQRCache(self.location, max_entries=10)
+        for n in range(10):
+            cache.set(f'{n:02d}', b'PNG')
+            os.utime(cache._path(f'{n:02d}'), (1000 + n, 1000 + n))
+        cache.get('00')
+        cache.set('10', b'PNG')
+        self.assertEqual(len(self.files()), 9)
+        self.assertIn('00.png', self.files())
+        self.assertNotIn('01.png', self.files())
+
+    def test_failed_write_leaves_no_temp_file(self):
+        cache = FileSystemQRCache(self.location)
+        with mock.patch('core.qr.os.replace', side_effect=OSError('disk full')), self.assertRaises(OSError):
+            cache.set('abc', b'PNG')
+        self.assertEqual(self.files(), [])
+
+
+@override_settings(QR_HTTP_MAX_AGE=300)
+class CustomerQRCodeViewTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone='9800000001')
+        self.url = reverse('core:customer_qr_code', args=[self.customer.pk])
+        patcher = mock.patch('core.views.get_qr_png', return_value=b'PNG')
+        self.get_qr_png = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def etag(self):
+        customer = Customer.objects.get(pk=self.customer.pk)
+        return f'"{payload_digest(qr_payload(customer))}"'
+
+    def test_image_carries_the_payload_digest_as_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'PNG')
+        self.assertEqual(response['ETag'], self.etag())
+        self.assertIn('max-age=300', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"other", {self.etag()}')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], self.etag())
+        self.assertEqual(response.content, b'')
+        self.get_qr_png.assert_not_called()
+
+    def test_changed_customer_gets_a_new_image(self):
+        old = self.etag()
+        self.customer.phone = '9800000009'
+        self.customer.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=old)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], old)
+
+    def test_unknown_customer(self):
+        response = self.client.get(reverse('core:customer_qr_code', args=[self.customer.pk + 1]))
+        self.assertEqual(response.status_code, 404)
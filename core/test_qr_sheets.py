@@ -0,0 +1,181 @@
+"""
+QR sheet tests: the background job bookkeeping behind the customer admin
+action, and the PDFs the command writes.
+"""
+import importlib.util
+import io
+import json
+import os
+import re
+import zlib
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from .models import Customer
+from .qr_sheets import PdfPageStream, SheetJobLimit, SheetWriter, sheet_jobs, start_sheet_job, write_job_status
+
+HAS_PIL = importlib.util.find_spec('PIL') is not None and importlib.util.find_spec('qrcode') is not None
+
+
+def read_pdf(data):
+    """
+    Check a PDF's cross-reference table and return {object number: body}.
+
+    Every xref offset has to point at its own ``N 0 obj`` header and
+    startxref at the table itself.
+    """
+    startxref = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', data).group(1))
+    assert data[startxref:].startswith(b'xref\n'), "startxref does not point at the xref table"
+    table = data[startxref:].split(b'trailer')[0].splitlines()
+    first, count = map(int, table[1].split())
+    size = int(re.search(rb'/Size (\d+)', data[startxref:]).group(1))
+    assert (first, count) == (0, size), f"xref covers {count} objects, trailer says {size}"
+    objects = {}
+    for number, entry in enumerate(table[3:3 + count - 1], start=1):
+        offset = int(entry[:10])
+        header = b'%d 0 obj\n' % number
+        assert data[offset:].startswith(header), f"object {number} is not at offset {offset}"
+        objects[number] = data[offset + len(header):data.index(b'endobj', offset)]
+    return objects
+
+
+class SheetJobTests(TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.dir = Path(temp.name)
+        overrides = override_settings(QR_SHEETS_DIR=self.dir, QR_SHEET_JOBS_MAX=2, QR_SHEET_JOB_TIMEOUT=60)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for n in range(3):
+            Customer.objects.create(name=f'Customer {n}', email=f'customer{n}@example.com')
+
+    def job(self, name, status, age=0, pdf=False, **details):
+        path = self.dir / f'{name}.json'
+        write_job_status(path, status, **details)
+        (self.dir / f'{name}.ids').write_text('CUST000001\n')
+        if pdf:
+            (self.dir / name).write_bytes(b'%PDF-1.4 ')
+        if age:
+            data = json.loads(path.read_text())
+            data['updated_at'] -= age
+            path.write_text(json.dumps(data))
+            os.utime(path, (time.time() - age, time.time() - age))
+        return name
+
+    def statuses(self):
+        return {job['name']: job['status'] for job in sheet_jobs()}
+
+    def test_status_comes_from_the_status_file(self):
+        self.job('qr_sheets_1.pdf', 'ready', pdf=True)
+        self.job('qr_sheets_2.pdf', 'failed', error='Cannot read ids')
+        self.job('qr_sheets_3.pdf', 'running')
+        self.job('qr_sheets_4.pdf', 'running', age=120)
+        jobs = {job['name']: job for job in sheet_jobs()}
+        self.assertEqual({name: job['status'] for name, job in jobs.items()}, {
+            'qr_sheets_1.pdf': 'ready', 'qr_sheets_2.pdf': 'failed',
+            'qr_sheets_3.pdf': 'running', 'qr_sheets_4.pdf': 'failed',
+        })
+        self.assertEqual(jobs['qr_sheets_1.pdf']['size'], 9)
+        self.assertEqual(jobs['qr_sheets_2.pdf']['log'], 'Cannot read ids')
+        self.assertEqual(jobs['qr_sheets_4.pdf']['log'], 'Stopped reporting progress')
+
+    def test_finished_jobs_are_cleaned_up(self):
+        self.job('qr_sheets_1.pdf', 'ready', pdf=True)
+        self.job('qr_sheets_2.pdf', 'running')
+        self.job('qr_sheets_3.pdf', 'ready', pdf=True, age=8 * 86400)
+        self.assertEqual(set(self.statuses()), {'qr_sheets_1.pdf', 'qr_sheets_2.pdf'})
+        self.assertEqual(sorted(path.name for path in self.dir.iterdir()), [
+            'qr_sheets_1.pdf', 'qr_sheets_1.pdf.json', 'qr_sheets_2.pdf.ids', 'qr_sheets_2.pdf.json',
+        ])
+
+    def test_start_runs_the_command_by_path(self):
+        with mock.patch('core.qr_sheets.subprocess.Popen') as popen:
+            name = start_sheet_job(Customer.objects.all())
+        argv = popen.call_args.args[0]
+        self.assertEqual(argv[1], str(Path(settings.BASE_DIR) / 'manage.py'))
+        self.assertEqual(argv[argv.index('--status-file') + 1], str(self.dir / f'{name}.json'))
+        self.assertIn('--processes', argv)
+        self.assertEqual(len((self.dir / f'{name}.ids').read_text().split()), 3)
+        self.assertEqual(self.statuses(), {name: 'queued'})
+
+    def test_running_jobs_are_capped(self):
+        self.job('qr_sheets_1.pdf', 'running')
+        self.job('qr_sheets_2.pdf', 'queued')
+        self.job('qr_sheets_3.pdf', 'running', age=120)
+        with mock.patch('core.qr_sheets.subprocess.Popen') as popen, self.assertRaises(SheetJobLimit):
+            start_sheet_job(Customer.objects.all())
+        popen.assert_not_called()
+
+    @unittest.skipUnless(HAS_PIL, "Pillow and qrcode are not installed")
+    def test_command_records_the_outcome(self):
+        ids = self.dir / 'ids.txt'
+        ids.write_text('\n'.join(Customer.objects.values_list('customer_id', flat=True)))
+        status = self.dir / 'qr_sheets_1.pdf.json'
+        call_command('generate_qr_sheets', str(self.dir / 'qr_sheets_1.pdf'), '--ids-file', str(ids),
+                     '--status-file', str(status), '--processes', '1', stdout=io.StringIO())
+        data = json.loads(status.read_text())
+        self.assertEqual((data['status'], data['customers'], data['pages']), ('ready', 3, 1))
+
+        with self.assertRaises(CommandError):
+            call_command('generate_qr_sheets', str(self.dir / 'qr_sheets_2.pdf'), '--ids-file', 'missing.txt',
+                         '--status-file', str(status), stdout=io.StringIO())
+        data = json.loads(status.read_text())
+        self.assertEqual(data['status'], 'failed')
+        self.assertIn('missing.txt', data['error'])
+
+
+@unittest.skipUnless(HAS_PIL, "Pillow and qrcode are not installed")
+class PdfPageStreamTests(unittest.TestCase):
+
+    def setUp(self):
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.dir = Path(temp.name)
+
+    def test_pages_and_cross_references(self):
+        from PIL import Image
+
+        path = self.dir / 'sheet.pdf'
+        pdf = PdfPageStream(path)
+        pages = [Image.new('1', (120, 80), color) for color in (0, 1, 0)]
+        for page in pages:
+            pdf.add_page(page)
+        pdf.close()
+
+        objects = read_pdf(path.read_bytes())
+        catalog = objects[PdfPageStream.CATALOG]
+        self.assertIn(b'/Pages 2 0 R', catalog)
+        tree = objects[PdfPageStream.PAGES]
+        kids = [int(n) for n in re.findall(rb'(\d+) 0 R', tree)]
+        self.assertIn(b'/Count 3', tree)
+        self.assertEqual(len(kids), 3)
+        for kid, page in zip(kids, pages):
+            body = objects[kid]
+            self.assertIn(b'/Type /Page ', body)
+            self.assertIn(b'/MediaBox [0 0 57.60 38.40]', body)
+            image = objects[int(re.search(rb'/image (\d+) 0 R', body).group(1))]
+            length = int(re.search(rb'/Length (\d+)', image).group(1))
+            stream = image.split(b'stream\n', 1)[1][:length]
+            self.assertEqual(zlib.decompress(stream), page.tobytes())
+
+    def test_sheet_writer_fills_pages_then_renames(self):
+        output = self.dir / 'stickers.pdf'
+        writer = SheetWriter(output, columns=2, rows=2)
+        tile = (writer.tile_size, bytes(writer.tile_size[0] * writer.tile_size[1]))
+        for _ in range(9):
+            writer.add(tile)
+        self.assertFalse(output.exists())
+        writer.close()
+        self.assertEqual(writer.pages, 3)
+        self.assertFalse(Path(f'{output}.part').exists())
+        objects = read_pdf(output.read_bytes())
+        self.assertIn(b'/Count 3', objects[PdfPageStream.PAGES])
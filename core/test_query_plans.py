@@ -0,0 +1,141 @@
+"""
+Query-plan regression tests.
+
+Each hot query is run through SQLite's EXPLAIN QUERY PLAN and the test fails
+if any table in it is read with a full scan (a bare ``SCAN <table>`` step) or
+if a paginated list needs a temporary B-tree to sort. A dropped or reordered
+index shows up here long before it shows up as a slow page.
+"""
+import re
+import unittest
+from datetime import timedelta
+
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.utils import timezone
+
+from .billing import DuplicateBillError, bill_period_guard, build_bill, generate_monthly_bills
+from .models import OTP, Bill, BillItem, Customer, Feedback, OutboundEmail, WasteItem
+from .retention import expired_otps, old_outbound_emails, old_sent_emails
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN output is SQLite specific")
+class QueryPlanTests(TestCase):
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexed(self, queryset, sorted_by_index=False):
+        steps = self.plan(queryset)
+        scans = [step for step in steps if FULL_SCAN.match(step)]
+        self.assertFalse(scans, f"Full table scan in:\n{queryset.query}\nPlan: {steps}")
+        if sorted_by_index:
+            sorts = [step for step in steps if 'TEMP B-TREE' in step]
+            self.assertFalse(sorts, f"Sort without an index in:\n{queryset.query}\nPlan: {steps}")
+
+    # -------------------------
+    # Bills
+    # -------------------------
+    def test_bill_for_customer_period(self):
+        self.assertIndexed(Bill.objects.filter(customer_id=1, month=3, year=2031))
+
+    def test_bill_list_pages(self):
+        bills = Bill.objects.select_related('customer').order_by('-year', '-month', '-id')
+        self.assertIndexed(bills[:25], sorted_by_index=True)
+        self.assertIndexed(bills.filter(year=2031, month=3)[:25], sorted_by_index=True)
+        self.assertIndexed(bills.filter(paid=False, year=2031, month=3)[:25], sorted_by_index=True)
+
+    def test_admin_paid_filter(self):
+        self.assertIndexed(Bill.objects.filter(paid=True))
+        self.assertIndexed(Bill.objects.filter(paid=False, year=2031))
+
+    def test_reconciliation_bill_lookup(self):
+        self.assertIndexed(
+            Bill.objects.filter(customer_id__in=[1, 2, 3], year__in=[2031], month__in=[2, 3])
+            .order_by('paid', 'id')
+        )
+
+    def test_bill_items_of_bill(self):
+        self.assertIndexed(BillItem.objects.filter(bill_id=1))
+
+    # -------------------------
+    # Customers
+    # -------------------------
+    def test_customer_lookups(self):
+        self.assertIndexed(Customer.objects.filter(email='a@example.com'))
+        self.assertIndexed(Customer.objects.filter(phone='9800000000'))
+        self.assertIndexed(Customer.objects.filter(customer_id='HH-000001'))
+
+    # -------------------------
+    # OTPs
+    # -------------------------
+    def test_latest_otp(self):
+        self.assertIndexed(
+            OTP.objects.filter(otp_type='login', email='a@example.com').order_by('-created_at')[:1],
+            sorted_by_index=True,
+        )
+        self.assertIndexed(
+            OTP.objects.filter(otp_type='login', phone='9800000000').order_by('-created_at')[:1],
+            sorted_by_index=True,
+        )
+
+    # -------------------------
+    # Feedback and mail queue
+    # -------------------------
+    def test_feedback_list_pages(self):
+        feedbacks = Feedback.objects.select_related('customer').order_by('-created_at', '-id')
+        self.assertIndexed(feedbacks[:25], sorted_by_index=True)
+        self.assertIndexed(feedbacks.filter(sentiment='Negative')[:25], sorted_by_index=True)
+
+    def test_outbound_due_queue(self):
+        self.assertIndexed(
+            OutboundEmail.objects.filter(status='queued', next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at'),
+            sorted_by_index=True,
+        )
+        self.assertIndexed(
+            OutboundEmail.objects.filter(status='sending', claimed_at__lt=timezone.now() - timedelta(minutes=5))
+        )
+
+    def test_retention_purges(self):
+        # purge_in_chunks bounds its primary-key walk with an indexed MAX(pk)
+        for target in (expired_otps, old_sent_emails, old_outbound_emails):
+            self.assertIndexed(target().order_by())
+            self.assertIndexed(target().filter(pk__gt=1, pk__lte=1000).order_by('pk'))
+
+
+class DuplicateBillTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Asha', email='asha@example.com', phone='9800000001')
+        self.item = WasteItem.objects.create(name='Plastic', unit_price=10)
+
+    def test_second_bill_for_period_is_rejected(self):
+        build_bill(self.customer, {self.item: 2}, month=3, year=2031)
+        with self.assertRaises(DuplicateBillError):
+            build_bill(self.customer, {self.item: 1}, month=3, year=2031)
+        self.assertEqual(Bill.objects.filter(customer=self.customer).count(), 1)
+        self.assertEqual(BillItem.objects.filter(bill__customer=self.customer).count(), 1)
+
+    def test_other_integrity_errors_are_not_duplicates(self):
+        bill = build_bill(self.customer, {self.item: 2}, month=3, year=2031)
+        # A primary key clash is not a second bill for the period
+        clash = Bill(id=bill.id, customer=self.customer, month=4, year=2031, total_amount=0)
+        with self.assertRaises(IntegrityError):
+            with bill_period_guard([clash]):
+                clash.save(force_insert=True)
+
+    def test_other_periods_are_allowed(self):
+        build_bill(self.customer, {self.item: 2}, month=3, year=2031)
+        build_bill(self.customer, {self.item: 2}, month=4, year=2031)
+        self.assertEqual(Bill.objects.filter(customer=self.customer).count(), 2)
+
+    def test_monthly_run_skips_billed_customers(self):
+        build_bill(self.customer, {self.item: 2}, month=3, year=2031)
+        stats = generate_monthly_bills(3, 2031)
+        self.assertEqual((stats['created'], stats['skipped']), (0, 1))
@@ -0,0 +1,149 @@
+"""
+Payment reconciliation tests.
+
+Statements are built in memory and run through reconcile_payments; the
+tests check which bills end up paid, what lands in the exceptions report,
+and that the summaries, dashboard counters and revenue rollups the bulk
+UPDATE bypasses still agree with a full rebuild afterwards.
+"""
+import csv
+import io
+from decimal import Decimal
+
+from django.test import TestCase
+
+from .billing import build_bill
+from .models import Bill, Customer, CustomerBillingSummary, WasteItem
+from .reconciliation import reconcile_payments
+from .testing import DerivedStateMixin, derived_state
+
+
+def statement(*lines):
+    """A statement CSV (as a binary file) from (customer_id, month, year, amount) tuples."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['reference', 'customer_id', 'month', 'year', 'amount'])
+    for n, line in enumerate(lines, 1):
+        writer.writerow([f'TXN{n}', *line])
+    return io.BytesIO(out.getvalue().encode('utf-8'))
+
+
+class ReconciliationTests(DerivedStateMixin, TestCase):
+
+    def setUp(self):
+        self.item = WasteItem.objects.create(name='Plastic', unit_price=10)
+        self.asha = Customer.objects.create(name='Asha', email='asha@example.com', phone='9800000001')
+        self.ravi = Customer.objects.create(name='Ravi', email='ravi@example.com', phone='9800000002')
+        # 100.00 each
+        self.bill = build_bill(self.asha, {self.item: 10}, month=3, year=2031)
+        self.other = build_bill(self.ravi, {self.item: 10}, month=3, year=2031)
+
+    def reconcile(self, *lines, **kwargs):
+        report = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = reconcile_payments(statement(*lines), report=report, **kwargs)
+        report.seek(0)
+        return stats, list(csv.DictReader(report))
+
+    def assertPaid(self, bill, paid=True):
+        bill.refresh_from_db()
+        self.assertEqual(bill.paid, paid)
+        self.assertEqual(bill.status, 'Paid' if paid else 'Unpaid')
+
+    # -------------------------
+    # Matching
+    # -------------------------
+    def test_full_payment_marks_bill_paid(self):
+        stats, exceptions = self.reconcile((self.asha.customer_id, 3, 2031, '100.00'))
+        self.assertPaid(self.bill)
+        self.assertPaid(self.other, paid=False)
+        self.assertEqual(stats['bills_paid'], 1)
+        self.assertEqual(stats['amount'], Decimal('100.00'))
+        self.assertEqual(exceptions, [])
+
+    def test_split_payment_across_chunks(self):
+        stats, exceptions = self.reconcile(
+            (self.asha.customer_id, 3, 2031, '60'),
+            (self.ravi.customer_id, 3, 2031, '100'),
+            (self.asha.customer_id, 3, 2031, '40'),
+            chunk_size=1,
+        )
+        self.assertPaid(self.bill)
+        self.assertPaid(self.other)
+        self.assertEqual(stats['matched'], 3)
+        self.assertEqual(stats['bills_paid'], 2)
+        self.assertEqual(exceptions, [])
+
+    def test_partial_payment_leaves_bill_unpaid(self):
+        stats, exceptions = self.reconcile(
+            (self.asha.customer_id, 3, 2031, '30'),
+            (self.asha.customer_id, 3, 2031, '20'),
+            chunk_size=1,
+        )
+        self.assertPaid(self.bill, paid=False)
+        self.assertEqual(stats['bills_paid'], 0)
+        self.assertEqual(stats['exceptions'], {'partial': 2})
+        self.assertEqual({row['received'] for row in exceptions}, {'50.00'})
+
+    def test_overpayment_is_paid_and_reported(self):
+        stats, exceptions = self.reconcile((self.asha.customer_id, 3, 2031, '150'))
+        self.assertPaid(self.bill)
+        self.assertEqual(stats['amount'], Decimal('100.00'))
+        self.assertEqual(stats['exceptions'], {'overpaid': 1})
+        self.assertEqual(exceptions[0]['bill_id'], str(self.bill.pk))
+
+    def test_paid_bill_is_a_duplicate(self):
+        stats, exceptions = self.reconcile(
+            (self.asha.customer_id, 3, 2031, '100'),
+            (self.asha.customer_id, 3, 2031, '100'),
+            chunk_size=1,
+        )
+        self.assertEqual(stats['bills_paid'], 1)
+        self.assertEqual(stats['exceptions'], {'duplicate': 1})
+        self.assertEqual(exceptions[0]['line'], '3')
+
+        stats, _ = self.reconcile((self.asha.customer_id, 3, 2031, '100'))
+        self.assertEqual(stats['bills_paid'], 0)
+        self.assertEqual(stats['exceptions'], {'duplicate': 1})
+
+    def test_unmatched_and_invalid_lines(self):
+        stats, exceptions = self.reconcile(
+            ('NOSUCHID', 3, 2031, '100'),
+            (self.asha.customer_id, 4, 2031, '100'),
+            (self.asha.customer_id, 13, 2031, '100'),
+            (self.asha.customer_id, 3, 2031, 'ten'),
+        )
+        self.assertEqual(stats['bills_paid'], 0)
+        self.assertEqual(stats['exceptions'], {'unmatched': 2, 'invalid': 2})
+        self.assertEqual([row['kind'] for row in exceptions], ['invalid', 'invalid', 'unmatched', 'unmatched'])
+        self.assertPaid(self.bill, paid=False)
+
+    def test_dry_run_marks_nothing(self):
+        before = derived_state()
+        stats, exceptions = self.reconcile(
+            (self.asha.customer_id, 3, 2031, '100'),
+            (self.ravi.customer_id, 3, 2031, '50'),
+            dry_run=True,
+        )
+        self.assertEqual(stats['bills_paid'], 1)
+        self.assertEqual(stats['exceptions'], {'partial': 1})
+        self.assertPaid(self.bill, paid=False)
+        self.assertEqual(derived_state(), before)
+
+    def test_missing_column_is_rejected(self):
+        with self.assertRaises(ValueError):
+            reconcile_payments(io.BytesIO(b'customer_id,month,year\nC1,3,2031\n'))
+
+    # -------------------------
+    # Derived Tables
+    # -------------------------
+    def test_derived_tables_match_a_rebuild(self):
+        self.reconcile(
+            (self.asha.customer_id, 3, 2031, '100'),
+            (self.ravi.customer_id, 3, 2031, '120'),
+            chunk_size=1,
+        )
+        self.assertEqual(Bill.objects.filter(paid=True).count(), 2)
+        self.assertDerivedConsistent()
+        summary = CustomerBillingSummary.objects.get(customer=self.asha)
+        self.assertEqual((summary.paid_count, summary.outstanding), (1, 0))
@@ -0,0 +1,88 @@
+"""
+Retention purge tests: only rows past their window go, in bounded chunks.
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import OTP, OutboundEmail, SentEmail
+from .retention import expired_otps, purge_all, purge_in_chunks
+
+
+@override_settings(OTP_RETENTION_HOURS=24, SENT_EMAIL_RETENTION_DAYS=30, OUTBOUND_EMAIL_RETENTION_DAYS=7)
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def otp(self, code, expires_in, verified=False, age=timedelta(0)):
+        otp = OTP.objects.create(
+            email=f'{code}@example.com', otp_code=code, otp_type='email',
+            expires_at=self.now + expires_in, is_verified=verified,
+        )
+        OTP.objects.filter(pk=otp.pk).update(created_at=self.now - age)
+        return otp
+
+    def aged(self, model, days, **fields):
+        row = model.objects.create(to_email='a@example.com', subject='Hi', body='Hi', **fields)
+        model.objects.filter(pk=row.pk).update(created_at=self.now - timedelta(days=days))
+        return row
+
+    def test_only_rows_past_their_window_are_purged(self):
+        kept = [
+            self.otp('100001', timedelta(minutes=5)),
+            self.otp('100002', -timedelta(hours=2)),
+            self.otp('100003', timedelta(minutes=5), verified=True, age=timedelta(hours=2)),
+            self.aged(SentEmail, 29),
+            self.aged(OutboundEmail, 8, status='queued'),
+            self.aged(OutboundEmail, 6, status='sent'),
+        ]
+        self.otp('100004', -timedelta(hours=30))
+        self.otp('100005', timedelta(minutes=5), verified=True, age=timedelta(hours=30))
+        self.aged(SentEmail, 31)
+        self.aged(OutboundEmail, 8, status='sent')
+        self.aged(OutboundEmail, 8, status='failed')
+
+        results = purge_all(pause=0)
+        self.assertEqual(results, {'OTP': 2, 'SentEmail': 1, 'OutboundEmail': 2})
+        remaining = [*OTP.objects.all(), *SentEmail.objects.all(), *OutboundEmail.objects.all()]
+        self.assertEqual({(type(row), row.pk) for row in remaining}, {(type(row), row.pk) for row in kept})
+
+    def test_chunks_walk_forward_and_stop(self):
+        for n in range(7):
+            self.otp(f'2000{n:02d}', -timedelta(hours=30))
+        fresh = self.otp('300000', timedelta(minutes=5))
+        with mock.patch('core.retention.time.sleep') as sleep, \
+                CaptureQueriesContext(connection) as queries:
+            self.assertEqual(purge_in_chunks(expired_otps(), chunk_size=3, pause=0.5), 7)
+        # Chunks of 3, 3 and 1; the short last chunk ends the walk
+        self.assertEqual(sleep.call_count, 2)
+        selects = [q['sql'] for q in queries.captured_queries
+                   if q['sql'].startswith('SELECT "core_otp"."id" FROM')]
+        self.assertEqual(len(selects), 3)
+        self.assertNotIn('"core_otp"."id" >', selects[0])
+        self.assertTrue(all('"core_otp"."id" >' in sql for sql in selects[1:]))
+        self.assertEqual(list(OTP.objects.values_list('pk', flat=True)), [fresh.pk])
+
+    def test_rows_expiring_during_a_purge_wait_for_the_next_one(self):
+        first = self.otp('400001', -timedelta(hours=30))
+        later = self.otp('400002', -timedelta(hours=30))
+        queryset = expired_otps()
+
+        def expire_new_row(seconds):
+            OTP.objects.filter(pk=later.pk).delete()
+            self.newer = self.otp('400003', -timedelta(hours=30))
+
+        with mock.patch('core.retention.time.sleep', side_effect=expire_new_row):
+            self.assertEqual(purge_in_chunks(queryset, chunk_size=1, pause=0.5), 1)
+        self.assertFalse(OTP.objects.filter(pk=first.pk).exists())
+        self.assertTrue(OTP.objects.filter(pk=self.newer.pk).exists())
+
+    def test_nothing_to_purge(self):
+        self.otp('500001', timedelta(minutes=5))
+        with self.assertNumQueries(1):
+            self.assertEqual(purge_in_chunks(expired_otps(), pause=0), 0)
@@ -0,0 +1,161 @@
+"""
+Full-text search tests: ranking, the sync triggers and the fallback backend.
+"""
+import unittest
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import checks
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from .models import Customer, Feedback
+from .search import BasicSearchBackend, SQLiteFTSBackend, check_search_triggers, search_customers
+
+
+def ids(queryset):
+    return list(queryset.order_by('search_rank', 'id').values_list('id', flat=True))
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "FTS5 is SQLite specific")
+class SQLiteFTSTests(TestCase):
+
+    def setUp(self):
+        self.backend = SQLiteFTSBackend()
+        self.asha = Customer.objects.create(name='Asha Rai', email='asha@example.com', phone='9800000001')
+        self.ravi = Customer.objects.create(name='Ravi Shah', email='ravi.asha@example.com', phone='9800000002')
+        self.mina = Customer.objects.create(name='Mina Thapa', email='mina@example.com', phone='9800000003')
+
+    def test_match_expression_quotes_every_word(self):
+        self.assertEqual(self.backend.match_expression('asha  "rai" OR'), '"asha" """rai""" "OR"')
+        self.assertEqual(self.backend.match_expression('as ra', prefix=True), '"as"* "ra"*')
+
+    def test_name_hits_rank_above_email_hits(self):
+        self.assertEqual(ids(search_customers('asha')), [self.asha.pk, self.ravi.pk])
+
+    def test_prefixes_and_every_word_must_match(self):
+        self.assertEqual(ids(search_customers('as')), [self.asha.pk, self.ravi.pk])
+        self.assertEqual(ids(search_customers('ravi sh')), [self.ravi.pk])
+        self.assertEqual(ids(search_customers('asha thapa')), [])
+
+    def test_operators_are_searched_literally(self):
+        for query in ('asha OR', 'NEAR(', '"', 'mina*', '-ravi'):
+            list(search_customers(query))
+
+    def test_exact_customer_id_short_circuits(self):
+        results = search_customers(self.mina.customer_id.lower())
+        self.assertEqual(list(results.values_list('id', 'search_rank')), [(self.mina.pk, 0.0)])
+
+    def test_rank_joins_the_index(self):
+        sql = str(self.backend.rank_customers(Customer.objects.all(), 'asha').query)
+        self.assertIn('INNER JOIN "core_customer_fts"', sql)
+        self.assertIn('"core_customer_fts"."core_customer_fts" MATCH', sql)
+
+    def test_triggers_follow_edits(self):
+        self.asha.name = 'Asmita Karki'
+        self.asha.save()
+        self.ravi.delete()
+        self.assertEqual(ids(search_customers('rai')), [])
+        self.assertEqual(ids(search_customers('shah')), [])
+        self.assertEqual(ids(search_customers('asmita')), [self.asha.pk])
+        Customer.objects.filter(pk=self.mina.pk).update(phone='9811111111')
+        self.assertEqual(ids(search_customers('98111')), [self.mina.pk])
+
+    def test_feedback_follows_comment_and_customer_name(self):
+        feedback = Feedback.objects.create(customer=self.asha, comment='Truck came late again')
+        Feedback.objects.create(customer=self.ravi, comment='Pickup on time')
+        ranked = self.backend.rank_feedback(Feedback.objects.all(), 'late')
+        self.assertEqual(list(ranked.values_list('id', flat=True)), [feedback.pk])
+        self.asha.name = 'Asmita Rai'
+        self.asha.save()
+        ranked = self.backend.rank_feedback(Feedback.objects.all(), 'asmita')
+        self.assertEqual(list(ranked.values_list('id', flat=True)), [feedback.pk])
+        filtered = self.backend.filter_feedback(Feedback.objects.all(), 'pickup')
+        self.assertEqual(filtered.get().comment, 'Pickup on time')
+
+    def test_rebuild_reindexes_every_row(self):
+        self.assertEqual(self.backend.rebuild(['customer']), {'customer': 3})
+
+    # -------------------------
+    # Triggers after migrations
+    # -------------------------
+    def test_migrations_leave_the_triggers_in_place(self):
+        # Fails when a later migration rebuilds core_customer or core_feedback
+        # without reinstalling the search index
+        self.assertEqual(self.backend.missing_triggers(), [])
+        self.assertEqual(check_search_triggers(databases=['default']), [])
+
+    def test_check_reports_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER core_customer_fts_update')
+        self.assertEqual(self.backend.missing_triggers(), ['core_customer_fts_update'])
+        warnings = check_search_triggers(databases=['default'])
+        self.assertEqual([w.id for w in warnings], ['core.W001'])
+        self.assertIsInstance(warnings[0], checks.Warning)
+        self.assertEqual(check_search_triggers(databases=None), [])
+
+
+class BasicSearchBackendTests(TestCase):
+
+    def test_every_word_matches_some_field(self):
+        asha = Customer.objects.create(name='Asha Rai', email='asha@example.com', phone='9800000001')
+        Customer.objects.create(name='Ravi Shah', email='ravi@example.com', phone='9800000002')
+        ranked = BasicSearchBackend().rank_customers(Customer.objects.all(), 'rai 0001')
+        self.assertEqual(list(ranked.values_list('id', 'search_rank')), [(asha.pk, 0.0)])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "FTS5 is SQLite specific")
+class CustomerSearchViewTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        self.asha = Customer.objects.create(name='Asha Rai', email='asha@example.com', phone='9800000001')
+        self.ravi = Customer.objects.create(
+            name='Ravi Shah', email='ravi.asha@example.com', phone='9800000002', customer_type='Shop'
+        )
+        Customer.objects.create(name='Mina Thapa', email='mina@example.com', phone='9800000003')
+
+    def suggest(self, query):
+        response = self.client.get(reverse('core:customer_suggest'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_suggestions_are_ranked_with_links(self):
+        results = self.suggest('ash')
+        self.assertEqual([r['name'] for r in results], ['Asha Rai', 'Ravi Shah'])
+        self.assertEqual(results[0]['url'], reverse('core:customer_detail', args=[self.asha.pk]))
+        self.assertEqual(set(results[0]), {'id', 'customer_id', 'name', 'phone', 'url'})
+
+    def test_suggestions_need_two_characters(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest(' a '), [])
+
+    def test_suggestions_by_exact_phone_and_id(self):
+        self.assertEqual([r['id'] for r in self.suggest('9800000002')], [self.ravi.pk])
+        self.assertEqual([r['id'] for r in self.suggest(self.asha.customer_id)], [self.asha.pk])
+
+    def test_suggestions_are_capped(self):
+        Customer.objects.bulk_create([
+            Customer(name=f'Asha {n}', email=f'asha{n}@example.com', customer_id=f'CUST9{n:05d}')
+            for n in range(12)
+        ])
+        self.assertEqual(len(self.suggest('asha')), 10)
+
+    @mock.patch('core.views.CUSTOMERS_PER_PAGE', 1)
+    def test_search_pages_follow_the_rank(self):
+        url = reverse('core:customer_list')
+        first = self.client.get(url, {'q': 'asha'}).context['page_obj']
+        self.assertEqual([c.pk for c in first], [self.asha.pk])
+        second = self.client.get(url, {'q': 'asha', 'after': first.next_cursor}).context['page_obj']
+        self.assertEqual([c.pk for c in second], [self.ravi.pk])
+        self.assertFalse(second.has_next)
+
+    def test_total_card_is_labelled_global_when_filtered(self):
+        url = reverse('core:customer_list')
+        response = self.client.get(url)
+        self.assertContains(response, 'Total Customers')
+        for params in ({'q': 'asha'}, {'type': 'Shop'}):
+            response = self.client.get(url, params)
+            self.assertContains(response, 'All Customers (not just these results)')
+            self.assertEqual(response.context['total_customers'], 3)
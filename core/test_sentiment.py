@@ -0,0 +1,115 @@
+"""
+Feedback sentiment tests: which rows are pending, when a process pool is
+started and the analyze_feedback_sentiment command.
+"""
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .models import Customer, Feedback
+from .sentiment import analyze_pending_feedback, pending_feedback, score_rows
+
+
+def fake_score(comment):
+    return ('Negative', -0.5) if 'late' in comment else ('Positive', 0.5)
+
+
+@override_settings(SENTIMENT_POOL_MIN_ROWS=3)
+class SentimentTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('core.utils.score_feedback', side_effect=fake_score)
+        self.score = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.asha = Customer.objects.create(name='Asha', email='asha@example.com')
+        self.ravi = Customer.objects.create(name='Ravi', email='ravi@example.com')
+
+    def feedback(self, *comments):
+        return [Feedback.objects.create(customer=self.asha, comment=comment) for comment in comments]
+
+    def pending(self):
+        return sorted(pending_feedback().values_list('pk', flat=True))
+
+    # -------------------------
+    # Pending rows
+    # -------------------------
+    def test_only_comment_edits_queue_a_row_again(self):
+        first, second = self.feedback('Truck came late', 'Pickup on time')
+        self.assertEqual(self.pending(), [first.pk, second.pk])
+        self.assertEqual(analyze_pending_feedback(processes=1), 2)
+        self.assertEqual(self.pending(), [])
+
+        moved = Feedback.objects.get(pk=first.pk)
+        moved.customer = self.ravi
+        moved.save()
+        Feedback.objects.get(pk=second.pk).save(update_fields=['customer'])
+        self.assertEqual(self.pending(), [])
+
+        edited = Feedback.objects.get(pk=second.pk)
+        edited.comment = 'Pickup was late'
+        edited.save(update_fields=['comment'])
+        self.assertEqual(self.pending(), [second.pk])
+        analyze_pending_feedback(processes=1)
+        self.assertEqual(Feedback.objects.get(pk=second.pk).sentiment, 'Negative')
+
+    def test_saving_an_unchanged_comment_is_not_an_edit(self):
+        feedback, = self.feedback('Pickup on time')
+        analyze_pending_feedback(processes=1)
+        stamped = Feedback.objects.get(pk=feedback.pk)
+        stamped.save()
+        self.assertEqual(Feedback.objects.get(pk=feedback.pk).comment_updated_at, stamped.comment_updated_at)
+        self.assertEqual(self.pending(), [])
+
+    def test_edit_during_scoring_is_picked_up_again(self):
+        feedback, = self.feedback('Pickup on time')
+
+        def edit_while_scoring(rows):
+            edited = Feedback.objects.get(pk=feedback.pk)
+            edited.comment = 'Truck came late'
+            edited.save()
+            return score_rows(rows)
+
+        with mock.patch('core.sentiment.score_rows', side_effect=edit_while_scoring):
+            analyze_pending_feedback(processes=1)
+        self.assertEqual(self.pending(), [feedback.pk])
+        analyze_pending_feedback(processes=1)
+        self.assertEqual(Feedback.objects.get(pk=feedback.pk).sentiment, 'Negative')
+
+    # -------------------------
+    # Process pool
+    # -------------------------
+    def test_small_batches_are_scored_inline(self):
+        self.feedback('Truck came late', 'Pickup on time')
+        with mock.patch('core.sentiment.Pool') as pool:
+            self.assertEqual(analyze_pending_feedback(processes=4), 2)
+        pool.assert_not_called()
+        self.assertEqual(
+            sorted(Feedback.objects.values_list('sentiment', 'sentiment_score')),
+            [('Negative', -0.5), ('Positive', 0.5)],
+        )
+
+    def test_large_batches_start_one_pool(self):
+        self.feedback('Truck came late', 'Pickup on time', 'Bins emptied', 'Late again')
+        with mock.patch('core.sentiment.Pool') as pool:
+            pool.return_value.imap.side_effect = map
+            self.assertEqual(analyze_pending_feedback(chunk_size=3, processes=4), 4)
+        pool.assert_called_once_with(4)
+        self.assertEqual(pool.return_value.imap.call_count, 2)
+        pool.return_value.join.assert_called_once()
+        self.assertEqual(self.pending(), [])
+
+    def test_single_process_never_starts_a_pool(self):
+        self.feedback('Truck came late', 'Pickup on time', 'Bins emptied')
+        with mock.patch('core.sentiment.Pool') as pool:
+            analyze_pending_feedback(processes=1)
+        pool.assert_not_called()
+
+    def test_command_reports_progress(self):
+        self.feedback('Truck came late', 'Pickup on time', 'Bins emptied')
+        out = io.StringIO()
+        call_command('analyze_feedback_sentiment', '--chunk-size', '2', '--processes', '1', stdout=out)
+        self.assertIn('2 feedback analysed', out.getvalue())
+        self.assertIn('Done: 3 feedback rows analysed.', out.getvalue())
+        self.assertEqual(self.score.call_count, 3)
@@ -0,0 +1,80 @@
+"""
+SQLite backend tests: which blocks take the write lock at BEGIN.
+
+The lock tests open their own connections to a scratch file, because the
+test database is in memory and shares one connection.
+"""
+import os
+import sqlite3
+import tempfile
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection, transaction
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Customer
+from .sqlite_backend.base import deferred_transactions
+
+
+def begins(queries):
+    return [q['sql'] for q in queries.captured_queries if q['sql'].startswith('BEGIN')]
+
+
+class BeginTests(TransactionTestCase):
+
+    def test_atomic_blocks_begin_immediate(self):
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                Customer.objects.exists()
+            with deferred_transactions(), transaction.atomic():
+                Customer.objects.exists()
+            Customer.objects.exists()
+        self.assertEqual(begins(queries), ['BEGIN IMMEDIATE', 'BEGIN'])
+
+    def test_admin_forms_only_lock_when_posted(self):
+        customer = Customer.objects.create(name='Asha', email='asha@example.com', phone='9800000001')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        for name in ('admin:core_customer_change', 'admin:core_customer_delete'):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(reverse(name, args=[customer.pk])).status_code, 200)
+            self.assertNotIn('BEGIN IMMEDIATE', begins(queries), name)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('admin:core_customer_delete', args=[customer.pk]), {'post': 'yes'})
+        self.assertIn('BEGIN IMMEDIATE', begins(queries))
+        self.assertFalse(Customer.objects.exists())
+
+
+@override_settings(SQLITE_BUSY_TIMEOUT_MS=50)
+class LockTests(SimpleTestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        for suffix in ('-wal', '-shm'):
+            self.addCleanup(lambda path=self.path + suffix: os.path.exists(path) and os.remove(path))
+        handler = ConnectionHandler({'default': {'ENGINE': 'core.sqlite_backend', 'NAME': self.path}})
+        self.reader = handler['default']
+        self.addCleanup(self.reader.close)
+        self.reader.cursor().execute('CREATE TABLE t (x INTEGER)')  # Also switches the file to WAL
+
+        # Another process is in the middle of a write transaction
+        self.writer = sqlite3.connect(self.path, isolation_level=None)
+        self.addCleanup(self.writer.close)
+        self.writer.execute('BEGIN IMMEDIATE')
+        self.writer.execute('INSERT INTO t VALUES (1)')
+
+    def test_reads_are_not_held_up_by_a_writer(self):
+        self.reader.deferred_begin = True
+        self.reader._start_transaction_under_autocommit()
+        with self.reader.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM t')
+            self.assertEqual(cursor.fetchone(), (0,))
+        self.reader.connection.rollback()
+
+    def test_write_transactions_wait_for_the_lock(self):
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            self.reader._start_transaction_under_autocommit()
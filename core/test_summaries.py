@@ -0,0 +1,103 @@
+"""
+Customer billing summary tests.
+
+Every bill write path adjusts CustomerBillingSummary by delta; each test
+compares the row it leaves behind with one recomputed from the Bill table.
+"""
+from django.test import TestCase, TransactionTestCase
+
+from .billing import build_bill, mark_bills_paid
+from .models import Bill, Customer, CustomerBillingSummary, WasteItem
+from .summaries import get_summary, rebuild_summaries
+
+
+class SummaryTests(TestCase):
+
+    def setUp(self):
+        self.item = WasteItem.objects.create(name='Plastic', unit_price=10)
+        self.asha = Customer.objects.create(name='Asha', email='asha@example.com', phone='9800000001')
+        self.ravi = Customer.objects.create(name='Ravi', email='ravi@example.com', phone='9800000002')
+
+    def summary(self, customer):
+        row = CustomerBillingSummary.objects.get(customer=customer)
+        return row.bill_count, row.paid_count, row.total_billed, row.outstanding, row.last_bill_date
+
+    def assertSummary(self, customer, bill_count, paid_count, total_billed, outstanding):
+        stored = self.summary(customer)
+        self.assertEqual(stored[:4], (bill_count, paid_count, total_billed, outstanding))
+        rebuild_summaries([customer.pk])
+        self.assertEqual(self.summary(customer), stored)
+
+    def test_bills_are_added_by_delta(self):
+        build_bill(self.asha, {self.item: 3}, month=3, year=2031)
+        build_bill(self.asha, {self.item: 2}, month=4, year=2031, paid=True)
+        self.assertSummary(self.asha, 2, 1, 50.0, 30.0)
+
+    def test_paid_flag_and_total_changes(self):
+        bill = build_bill(self.asha, {self.item: 3}, month=3, year=2031)
+        bill.total_amount = 45
+        bill.save()
+        self.assertSummary(self.asha, 1, 0, 45.0, 45.0)
+        bill.paid = True
+        bill.save()
+        self.assertSummary(self.asha, 1, 1, 45.0, 0.0)
+
+    def test_saves_from_the_same_loaded_state_count_once(self):
+        bill = build_bill(self.asha, {self.item: 3}, month=3, year=2031)
+        first, second = Bill.objects.get(pk=bill.pk), Bill.objects.get(pk=bill.pk)
+        first.paid = second.paid = True
+        first.save()
+        second.save()
+        self.assertSummary(self.asha, 1, 1, 30.0, 0.0)
+
+    def test_bill_moved_to_another_customer(self):
+        bill = build_bill(self.asha, {self.item: 3}, month=3, year=2031)
+        build_bill(self.ravi, {self.item: 1}, month=3, year=2031)
+        bill.customer = self.ravi
+        bill.month = 4
+        bill.save()
+        self.assertSummary(self.asha, 0, 0, 0.0, 0.0)
+        self.assertSummary(self.ravi, 2, 0, 40.0, 40.0)
+
+    def test_delete_recomputes_last_bill_date(self):
+        older = build_bill(self.asha, {self.item: 1}, month=3, year=2031)
+        newer = build_bill(self.asha, {self.item: 2}, month=4, year=2031)
+        newer.delete()
+        self.assertSummary(self.asha, 1, 0, 10.0, 10.0)
+        self.assertEqual(self.summary(self.asha)[4], older.date_created)
+
+    def test_mark_bills_paid_without_a_summary_row(self):
+        bills = [build_bill(customer, {self.item: 2}, month=3, year=2031) for customer in (self.asha, self.ravi)]
+        CustomerBillingSummary.objects.filter(customer=self.ravi).delete()
+        self.assertEqual(sorted(mark_bills_paid([b.pk for b in bills])), sorted(b.pk for b in bills))
+        self.assertEqual(mark_bills_paid([b.pk for b in bills]), [])
+        self.assertSummary(self.asha, 1, 1, 20.0, 0.0)
+        self.assertSummary(self.ravi, 1, 1, 20.0, 0.0)
+
+    def test_get_summary_builds_missing_row(self):
+        build_bill(self.asha, {self.item: 2}, month=3, year=2031)
+        CustomerBillingSummary.objects.all().delete()
+        summary = get_summary(self.asha)
+        self.assertEqual((summary.bill_count, summary.outstanding), (1, 20.0))
+        self.assertEqual(get_summary(self.ravi).bill_count, 0)
+
+    def test_rebuild_overwrites_rows_it_finds(self):
+        build_bill(self.asha, {self.item: 2}, month=3, year=2031)
+        CustomerBillingSummary.objects.filter(customer=self.asha).update(bill_count=7, outstanding=-1)
+        self.assertEqual(rebuild_summaries([self.asha.pk, self.ravi.pk]), 2)
+        self.assertEqual(self.summary(self.asha)[:4], (1, 0, 20.0, 20.0))
+        self.assertEqual(self.summary(self.ravi)[:4], (0, 0, 0.0, 0.0))
+
+
+class SummaryRebuildTests(TransactionTestCase):
+    """Outside a test transaction, so the deferred foreign key checks run."""
+
+    def test_deleted_customer_does_not_discard_the_chunk(self):
+        item = WasteItem.objects.create(name='Plastic', unit_price=10)
+        asha = Customer.objects.create(name='Asha', email='asha@example.com', phone='9800000001')
+        build_bill(asha, {item: 2}, month=3, year=2031)
+        CustomerBillingSummary.objects.all().delete()
+        with self.assertLogs('core.summaries', 'WARNING') as logs:
+            rebuild_summaries([asha.pk, asha.pk + 1000])
+        self.assertIn(str(asha.pk + 1000), logs.output[0])
+        self.assertEqual(CustomerBillingSummary.objects.get(customer=asha).outstanding, 20.0)
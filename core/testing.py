@@ -0,0 +1,44 @@
+"""
+Helpers shared by the test modules.
+
+The summaries, dashboard counters and revenue rollups are kept up to date
+by deltas; derived_state() and DerivedStateMixin let a test check that the
+deltas left them where a full rebuild would.
+"""
+from .metrics import rebuild_counters
+from .models import CustomerBillingSummary, DashboardCounter, RevenueRollup
+from .reports import rebuild_rollups
+from .summaries import rebuild_summaries
+
+
+def derived_state():
+    """
+    Summaries, counters and rollups, rounded so they compare across float
+    sums. Counters and rollup rows that deltas took down to zero are left
+    out, as a rebuild does not write them.
+    """
+    return {
+        'summaries': sorted(
+            (s.customer_id, s.bill_count, s.paid_count, round(s.total_billed, 2), round(s.outstanding, 2))
+            for s in CustomerBillingSummary.objects.all()
+        ),
+        'counters': sorted(
+            (c.name, round(c.value, 2)) for c in DashboardCounter.objects.all() if round(c.value, 2)
+        ),
+        'rollups': sorted(
+            (r.year, r.month, r.customer_type, r.waste_item_id or 0, r.bill_count,
+             round(r.billed, 2), round(r.collected, 2))
+            for r in RevenueRollup.objects.all() if r.bill_count or round(r.billed, 2)
+        ),
+    }
+
+
+class DerivedStateMixin:
+    """TestCase mixin comparing the derived tables against a full rebuild."""
+
+    def assertDerivedConsistent(self):
+        current = derived_state()
+        rebuild_summaries()
+        rebuild_counters()
+        rebuild_rollups()
+        self.assertEqual(current, derived_state())
@@ -9,8 +9,9 @@ urlpatterns = [
     path('logout/', views.admin_logout, name='admin_logout'),
     path('verify-otp/', views.admin_verify_otp, name='admin_verify_otp'),
     path('resend-otp/', views.admin_resend_otp, name='admin_resend_otp'),
-    # Development-only debug outbox
+    # Development-only debug outbox and request profiles (DEBUG or staff)
     path('debug/sent-emails/', views.debug_sent_emails, name='debug_sent_emails'),
+    path('debug/profiles/', views.debug_profiles, name='debug_profiles'),
 
     # Home
     path('', views.home, name='home'),
@@ -22,6 +23,7 @@ urlpatterns = [
     # Customers
     path('customers/', views.customer_list, name='customer_list'),
     path('customers/add/', views.add_customer, name='add_customer'),
+    path('customers/suggest/', views.customer_suggest, name='customer_suggest'),
     path('customers/<int:customer_id>/edit/', views.edit_customer, name='edit_customer'),
     path('customers/<int:customer_id>/delete/', views.delete_customer, name='delete_customer'),
     path('customers/<int:customer_id>/', views.customer_detail, name='customer_detail'),
@@ -37,6 +39,12 @@ urlpatterns = [
     path('bills/<int:bill_id>/delete/', views.delete_bill, name='delete_bill'),
     path('bills/<int:bill_id>/mark_paid/', views.mark_bill_paid, name='mark_bill_paid'),
 
+    # Reports
+    path('reports/revenue/', views.revenue_report, name='revenue_report'),
+
+    # Exports (staff only)
+    path('exports/<str:kind>/', views.export_data, name='export_data'),
+
     
 
 
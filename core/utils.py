@@ -1,13 +1,20 @@
 # core/utils.py
-from textblob import TextBlob
 
-def analyze_feedback(feedback_text: str) -> str:
+def get_textblob():
+    """Import TextBlob on first use (it loads NLTK, which is slow to import)."""
+    from textblob import TextBlob
+    return TextBlob
+
+def score_feedback(feedback_text: str) -> tuple:
+    """Return (label, polarity) for a feedback comment."""
     if not feedback_text:
-        return "Neutral"
-    polarity = TextBlob(feedback_text).sentiment.polarity
+        return "Neutral", 0.0
+    polarity = get_textblob()(feedback_text).sentiment.polarity
     if polarity > 0.05:
-        return "Positive"
+        return "Positive", polarity
     elif polarity < -0.05:
-        return "Negative"
-    return "Neutral"
+        return "Negative", polarity
+    return "Neutral", polarity
 
+def analyze_feedback(feedback_text: str) -> str:
+    return score_feedback(feedback_text)[0]
@@ -5,18 +5,28 @@ from .forms import FeedbackForm
 from .forms import CustomerForm
 from .models import Customer
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.timezone import make_aware
+from datetime import datetime, time, timedelta
 from .forms import BillForm
-from decimal import Decimal
-from django.db import transaction
-from django.db.models import Q
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.http import HttpResponse
-import qrcode
-from io import BytesIO
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 from .otp_utils import create_otp, send_otp_email, send_otp_sms, verify_otp
+from .billing import bill_period_guard, build_bill, parse_quantities, set_bill_items
+from .pagination import InvalidCursor, KeysetPaginator
+from .summaries import get_summary
+from .metrics import get_dashboard_metrics
+from .qr import get_qr_png, payload_digest, qr_payload
+from .search import get_search_backend, search_customers, suggest_customers
+from .exports import FORMATS as EXPORT_FORMATS, ExportError, export
+from .reports import revenue_by_customer_type, revenue_by_waste_item, revenue_trend
 from django.conf import settings
 
 # Authentication Views
@@ -183,9 +193,55 @@ def debug_sent_emails(request):
     if not getattr(settings, 'DEBUG', False):
         return redirect('core:home')
 
-    from .models import SentEmail
+    from .models import OutboundEmail, SentEmail
+    from django.db.models import Count
     emails = SentEmail.objects.all()[:30]
-    return render(request, 'core/debug_sent_emails.html', {'emails': emails})
+    queue = dict(
+        OutboundEmail.objects.exclude(status='sent').values_list('status').annotate(n=Count('id')).order_by()
+    )
+    return render(request, 'core/debug_sent_emails.html', {'emails': emails, 'queue': queue})
+
+
+PROFILES_SHOWN = 100
+
+def debug_profiles(request):
+    """Recent request profiles from core.profiling (DEBUG or staff only).
+
+    ``?format=json`` downloads the whole buffer for offline analysis and
+    ``?id=<n>`` shows the cProfile output captured for a request.
+    """
+    if not (getattr(settings, 'DEBUG', False) or request.user.is_staff):
+        return redirect('core:home')
+
+    from . import profiling
+    if request.method == 'POST':
+        profiling.clear_profiles()
+        return redirect('core:debug_profiles')
+
+    records = profiling.recent_profiles()
+    if request.GET.get('format') == 'json':
+        response = JsonResponse({
+            'enabled': getattr(settings, 'PROFILING_ENABLED', False),
+            'sample_rate': getattr(settings, 'PROFILING_SAMPLE_RATE', profiling.DEFAULT_SAMPLE_RATE),
+            'slow_ms': getattr(settings, 'PROFILING_SLOW_MS', None),
+            'records': records,
+        }, json_dumps_params={'indent': 2})
+        stamp = timezone.localtime().strftime('%Y%m%d_%H%M%S')
+        response['Content-Disposition'] = f'attachment; filename="profiles_{stamp}.json"'
+        return response
+
+    selected = None
+    if request.GET.get('id', '').isdigit():
+        wanted = int(request.GET['id'])
+        selected = next((entry for entry in records if entry['id'] == wanted), None)
+
+    return render(request, 'core/debug_profiles.html', {
+        'enabled': getattr(settings, 'PROFILING_ENABLED', False),
+        'summary': profiling.summarize(records),
+        'records': records[::-1][:PROFILES_SHOWN],
+        'total': len(records),
+        'selected': selected,
+    })
 
 @login_required
 def home(request):
@@ -193,19 +249,66 @@ def home(request):
     if 'customer_id' in request.session:
         return redirect('core:customer_dashboard')
 
-    total_customers = Customer.objects.count()
-    total_bills = Bill.objects.count()
-    total_feedbacks = Feedback.objects.count()
-    context = {
-        'total_customers': total_customers,
-        'total_bills': total_bills,
-        'total_feedbacks': total_feedbacks
-    }
+    # Counters are maintained on write and cached; no table scans here
+    context = get_dashboard_metrics()
     return render(request, 'core/home.html', context)
 
+FEEDBACK_PER_PAGE = 25
+
+def _date_filter(value):
+    """A YYYY-MM-DD filter value, or None when blank or not a real date."""
+    try:
+        return parse_date(value) if value else None
+    except ValueError:  # well formed but impossible, e.g. 2024-02-30
+        return None
+
 def feedback_list(request):
-	feedbacks = Feedback.objects.order_by('-created_at')
-	return render(request, 'core/feedback_list.html', {'feedbacks': feedbacks})
+    feedbacks = Feedback.objects.select_related('customer')
+
+    filters = {
+        'q': request.GET.get('q', '').strip(),
+        'start': request.GET.get('start', ''),
+        'end': request.GET.get('end', ''),
+        'sentiment': request.GET.get('sentiment', ''),
+    }
+    start = _date_filter(filters['start'])
+    end = _date_filter(filters['end'])
+    # An invalid date is dropped, and its field shows empty
+    if start is None:
+        filters['start'] = ''
+    if end is None:
+        filters['end'] = ''
+    if start:
+        feedbacks = feedbacks.filter(created_at__gte=make_aware(datetime.combine(start, time.min)))
+    if end:
+        feedbacks = feedbacks.filter(created_at__lt=make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+    if filters['sentiment'] in dict(Feedback.SENTIMENT_CHOICES):
+        feedbacks = feedbacks.filter(sentiment=filters['sentiment'])
+
+    # Best matches first when searching, otherwise newest first
+    if filters['q']:
+        feedbacks = get_search_backend().rank_feedback(feedbacks, filters['q'])
+        ordering = ('search_rank', '-id')
+    else:
+        ordering = ('-created_at', '-id')
+
+    paginator = KeysetPaginator(feedbacks, ordering, per_page=FEEDBACK_PER_PAGE)
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        page = paginator.page()
+
+    query = request.GET.copy()
+    query.pop('after', None)
+    query.pop('before', None)
+
+    return render(request, 'core/feedback_list.html', {
+        'feedbacks': page,
+        'page': page,
+        'filters': filters,
+        'filter_query': query.urlencode(),
+        'sentiments': Feedback.SENTIMENT_CHOICES,
+    })
 
 def add_feedback(request):
     if request.method == 'POST':
@@ -227,38 +330,54 @@ def feedback_create(request):
 		form = FeedbackForm()
 	return render(request, 'core/feedback_form.html', {'form': form})
 
+CUSTOMERS_PER_PAGE = 10
+
 def customer_list(request):
     customers = Customer.objects.all()
-    
-    # Search functionality
-    query = request.GET.get('q')
-    if query:
-        customers = customers.filter(
-            Q(name__icontains=query) | 
-            Q(email__icontains=query) | 
-            Q(customer_id__icontains=query) |
-            Q(phone__icontains=query)
-        )
-    
+
     # Filter by customer type
     customer_type = request.GET.get('type')
     if customer_type:
         customers = customers.filter(customer_type=customer_type)
-    
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(customers, 10)  # 10 customers per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
+
+    # Search: exact ID/phone first, then the ranked full-text index
+    query = (request.GET.get('q') or '').strip()
+    if query:
+        customers = search_customers(query, customers)
+        ordering = ('search_rank', 'id')
+    else:
+        ordering = ('id',)
+
+    # Keyset pagination (no COUNT(*) over the whole table)
+    paginator = KeysetPaginator(customers, ordering, per_page=CUSTOMERS_PER_PAGE)
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        page = paginator.page()
+
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+
     context = {
-        'page_obj': page_obj,
+        'page_obj': page,
         'query': query,
         'selected_type': customer_type,
-        'customer_types': Customer.CUSTOMER_TYPES
+        'customer_types': Customer.CUSTOMER_TYPES,
+        'filter_query': params.urlencode(),
+        # The dashboard counter covers every customer, not just the filtered ones
+        'total_customers': get_dashboard_metrics()['total_customers'],
+        'filtered': bool(query or customer_type),
     }
     return render(request, 'core/customers.html', context)
 
+def customer_suggest(request):
+    """Type-ahead endpoint for the customer search box."""
+    results = suggest_customers(request.GET.get('q', ''))
+    for result in results:
+        result['url'] = reverse('core:customer_detail', args=[result['id']])
+    return JsonResponse({'results': results})
+
 def add_customer(request):
     if request.method == 'POST':
         form = CustomerForm(request.POST)
@@ -291,60 +410,83 @@ def delete_customer(request, customer_id):
     return redirect('core:customer_list')
 
 # View customer details
+RECENT_BILLS_LIMIT = 24
+
 def customer_detail(request, customer_id):
     customer = get_object_or_404(Customer, id=customer_id)
-    bills = customer.bill_set.all()  # All bills of this customer
-    
-    # Calculate statistics
-    total_bills = bills.count()
-    paid_bills = bills.filter(paid=True).count()
-    total_billed = sum(bill.total_amount for bill in bills) if bills else 0
+    # Latest bills only; the totals come from the maintained summary row
+    bills = list(customer.bill_set.order_by('-year', '-month', '-id')[:RECENT_BILLS_LIMIT])
+    summary = get_summary(customer)
     
     context = {
         'customer': customer,
         'bills': bills,
-        'total_bills': total_bills,
-        'paid_bills': paid_bills,
-        'total_billed': total_billed,
+        'total_bills': summary.bill_count,
+        'paid_bills': summary.paid_count,
+        'total_billed': summary.total_billed,
+        'outstanding': summary.outstanding,
+        'last_bill_date': summary.last_bill_date,
+        'bills_truncated': summary.bill_count > len(bills),
     }
     return render(request, 'core/customer_detail.html', context)
 
 # Generate QR code for customer
 def customer_qr_code(request, customer_id):
     customer = get_object_or_404(Customer, id=customer_id)
-    
-    # Create QR code data
-    qr_data = f"""Customer ID: {customer.customer_id}
-Name: {customer.name}
-Email: {customer.email}
-Phone: {customer.phone or 'N/A'}
-Type: {customer.customer_type}
-Monthly Rate: Rs{customer.monthly_rate}"""
-    
-    # Generate QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    
-    # Create image
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Save to BytesIO
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    
-    # Return as HTTP response
-    return HttpResponse(buffer.getvalue(), content_type='image/png')
+    payload = qr_payload(customer)
+    digest = payload_digest(payload)
+    etag = quote_etag(digest)
+
+    # The image only changes with the payload, so the digest is its ETag
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(get_qr_png(payload, digest), content_type='image/png')
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=getattr(settings, 'QR_HTTP_MAX_AGE', 300))
+    return response
+
+BILLS_PER_PAGE = 25
 
 def bill_list(request):
-    bills = Bill.objects.all()
-    return render(request, 'core/bill_list.html', {'bills': bills})
+    bills = Bill.objects.select_related('customer')
+
+    # Server-side filters
+    filters = {
+        'month': request.GET.get('month', ''),
+        'year': request.GET.get('year', ''),
+        'paid': request.GET.get('paid', ''),
+        'type': request.GET.get('type', ''),
+    }
+    if filters['month'].isdigit():
+        bills = bills.filter(month=int(filters['month']))
+    if filters['year'].isdigit():
+        bills = bills.filter(year=int(filters['year']))
+    if filters['paid'] in ('paid', 'unpaid'):
+        bills = bills.filter(paid=filters['paid'] == 'paid')
+    if filters['type']:
+        bills = bills.filter(customer__customer_type=filters['type'])
+
+    # Keyset pagination, newest billing period first
+    paginator = KeysetPaginator(bills, ('-year', '-month', '-id'), per_page=BILLS_PER_PAGE)
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        page = paginator.page()
+
+    query = request.GET.copy()
+    query.pop('after', None)
+    query.pop('before', None)
+
+    return render(request, 'core/bill_list.html', {
+        'bills': page,
+        'page': page,
+        'filters': filters,
+        'filter_query': query.urlencode(),
+        'months': range(1, 13),
+        'customer_types': Customer.CUSTOMER_TYPES,
+    })
 
 def add_bill(request):
     customers = Customer.objects.all()
@@ -356,51 +498,15 @@ def add_bill(request):
         
        
         now = timezone.now()
-       # ❗ Prevent duplicate bill
-        if Bill.objects.filter(customer=customer, month=now.month, year=now.year).exists():
-            messages.error(request, "Bill for this customer for this month already exists.")
+        try:
+            quantities = parse_quantities(request.POST, waste_items)
+            # A second bill for the month fails on the unique constraint
+            # (DuplicateBillError) instead of a racy exists() check
+            build_bill(customer, quantities, month=now.month, year=now.year)
+        except ValueError as e:
+            messages.error(request, str(e))
             return redirect('core:add_bill')
 
-        total = Decimal('0')
-        bill_items_created = False
-
-        with transaction.atomic():
-            bill = Bill.objects.create(
-                customer=customer,
-                total_amount=0,
-                paid=False,
-                month=now.month,
-                year=now.year
-            )
-
-            for item in waste_items:
-                qty_str = request.POST.get(f'quantity_{item.id}')
-
-                if qty_str:
-                    qty = Decimal(qty_str)
-
-                    if qty < 0:
-                        bill.delete()  # Clean up the bill
-                        messages.error(request, "Quantity cannot be negative.")
-                        return redirect('core:add_bill')
-
-                    if qty > 0:
-                        BillItem.objects.create(
-                            bill=bill,
-                            waste_item=item,
-                            quantity=qty
-                        )
-                        total += (item.unit_price or 0) * qty
-                        bill_items_created = True
-
-            if not bill_items_created:
-                bill.delete()  # Clean up the empty bill
-                messages.error(request, "At least one waste item must have quantity greater than zero.")
-                return redirect('core:add_bill')
-
-            bill.total_amount = total
-            bill.save()
-
         return redirect('core:bill_list')
 
     return render(
@@ -412,24 +518,49 @@ def add_bill(request):
         }
     )
 def bill_detail(request, bill_id):
-    bill = get_object_or_404(Bill, id=bill_id)
-    items = BillItem.objects.filter(bill=bill)
+    bill = get_object_or_404(Bill.objects.select_related('customer'), id=bill_id)
+    items = BillItem.objects.filter(bill=bill).select_related('waste_item')
     return render(request, 'core/bill_detail.html', {'bill': bill, 'items': items})
 
 def edit_bill(request, bill_id):
     bill = get_object_or_404(Bill, id=bill_id)
+    waste_items = list(WasteItem.objects.all())
+    current = dict(bill.items.values_list('waste_item_id', 'quantity'))
+
     if request.method == 'POST':
         form = BillForm(request.POST, instance=bill)
         if form.is_valid():
-            form.save()
-            return redirect('core:bill_list')
+            try:
+                quantities = parse_quantities(request.POST, waste_items)
+                # Itemised bills keep their total in step with the items;
+                # flat bills (no items) keep the total entered on the form.
+                if current and not quantities:
+                    raise ValueError("At least one waste item must have quantity greater than zero.")
+                with bill_period_guard([bill]):
+                    # One save for the form's changes and the new total
+                    bill = form.save(commit=False)
+                    if quantities:
+                        set_bill_items(bill, quantities, update_fields=None)
+                    else:
+                        bill.save()
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                return redirect('core:bill_list')
     else:
         form = BillForm(instance=bill)
-    return render(request, 'core/edit_bill.html', {'form': form, 'bill': bill})
+
+    item_quantities = [(item, current.get(item.id, 0)) for item in waste_items]
+    return render(request, 'core/edit_bill.html', {
+        'form': form,
+        'bill': bill,
+        'item_quantities': item_quantities,
+    })
 
 
 def delete_bill(request, bill_id):
-    bill = get_object_or_404(Bill, id=bill_id)
+    # The customer's type is needed to take the bill out of the rollups
+    bill = get_object_or_404(Bill.objects.select_related('customer'), id=bill_id)
     bill.delete()
     return redirect('core:bill_list')
 
@@ -439,3 +570,51 @@ def mark_bill_paid(request, bill_id):
     bill.save()
     return redirect('core:bill_detail', bill_id=bill.id)
 
+
+# -------------------------
+# Reports
+# -------------------------
+REPORT_DEFAULT_YEARS = 3
+
+@login_required
+def revenue_report(request):
+    """Billed vs collected by month, customer type and waste item, read from RevenueRollup."""
+    this_year = timezone.localdate().year
+    filters = {
+        'start': request.GET.get('start', ''),
+        'end': request.GET.get('end', ''),
+        'type': request.GET.get('type', ''),
+    }
+    end = int(filters['end']) if filters['end'].isdigit() else this_year
+    start = int(filters['start']) if filters['start'].isdigit() else end - REPORT_DEFAULT_YEARS + 1
+    start, end = min(start, end), max(start, end)
+    customer_type = filters['type'] if filters['type'] in dict(Customer.CUSTOMER_TYPES) else None
+
+    months, years = revenue_trend(start, end, customer_type)
+    return render(request, 'core/revenue_report.html', {
+        'start': start,
+        'end': end,
+        'filters': filters,
+        'customer_types': Customer.CUSTOMER_TYPES,
+        'months': months,
+        'years': years,
+        'by_type': revenue_by_customer_type(start, end),
+        'by_item': revenue_by_waste_item(start, end, customer_type),
+    })
+
+
+# -------------------------
+# Exports
+# -------------------------
+@staff_member_required
+def export_data(request, kind):
+    """Stream a CSV/NDJSON dump of customers, bills or feedback (staff only)."""
+    fmt = request.GET.get('format', 'csv')
+    try:
+        lines = export(kind, request.GET, fmt=fmt)
+    except ExportError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain')
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[fmt])
+    stamp = timezone.localtime().strftime('%Y%m%d')
+    response['Content-Disposition'] = f'attachment; filename="{kind}_{stamp}.{fmt}"'
+    return response
@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
 
+from decouple import config
+
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -19,11 +21,13 @@ INSTALLED_APPS = [
 'django.contrib.sessions',
 'django.contrib.messages',
 'django.contrib.staticfiles',
+'rest_framework',
 'core',
 ]
 
 
 MIDDLEWARE = [
+'core.profiling.ProfilingMiddleware',  # outermost, so its timings cover the rest
 'django.middleware.security.SecurityMiddleware',
 'django.contrib.sessions.middleware.SessionMiddleware',
 'django.middleware.common.CommonMiddleware',
@@ -58,13 +62,26 @@ WSGI_APPLICATION = 'waste_billing.wsgi.application'
 
 
 # Use SQLite for simplicity (no DB server required). If you want MySQL, I can provide config.
+# The DB_* and SQLITE_* values can be overridden from the environment or a .env file.
 DATABASES = {
 'default': {
-'ENGINE': 'django.db.backends.sqlite3',
-'NAME': BASE_DIR / 'db.sqlite3',
+'ENGINE': 'core.sqlite_backend',  # django.db.backends.sqlite3 with BEGIN IMMEDIATE transactions
+'NAME': config('DB_PATH', default=str(BASE_DIR / 'db.sqlite3')),
+'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),  # Seconds a connection is reused (e.g. 600); 0 = one per request
+'CONN_HEALTH_CHECKS': True,  # Reconnect if a reused connection went bad
 }
 }
 
+# Connection tuning (core.db_tuning), applied to every new SQLite connection
+SQLITE_TUNING = config('SQLITE_TUNING', default=True, cast=bool)  # False = plain Django defaults
+SQLITE_BEGIN_IMMEDIATE = config('SQLITE_BEGIN_IMMEDIATE', default=True, cast=bool)  # Take the write lock at BEGIN (core.sqlite_backend)
+SQLITE_BUSY_TIMEOUT_MS = config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int)  # Wait for a lock instead of "database is locked"
+SQLITE_JOURNAL_MODE = config('SQLITE_JOURNAL_MODE', default='WAL')  # Readers and the writer don't block each other
+SQLITE_SYNCHRONOUS = config('SQLITE_SYNCHRONOUS', default='NORMAL')  # fsync at checkpoints, not every commit
+SQLITE_TEMP_STORE = config('SQLITE_TEMP_STORE', default='MEMORY')
+SQLITE_MMAP_SIZE = config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)  # Bytes; 0 = no memory map
+SQLITE_OPTIMIZE_INTERVAL = config('SQLITE_OPTIMIZE_INTERVAL', default=3600, cast=int)  # Seconds between PRAGMA optimize; 0 = never
+
 
 AUTH_PASSWORD_VALIDATORS = []
 
@@ -96,8 +113,74 @@ EMAIL_HOST_USER = 'YOUR_GMAIL@gmail.com'       # <-- Replace with your Gmail add
 EMAIL_HOST_PASSWORD = 'xxxx xxxx xxxx xxxx'     # <-- Replace with your Gmail App Password
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Outbound mail queue (core.mail_queue)
+MAIL_QUEUE_WORKERS = 0           # 0 = run `manage.py process_mail_queue`; >0 = in-process worker threads
+MAIL_QUEUE_BATCH_SIZE = 50       # Messages sent per SMTP connection
+MAIL_QUEUE_MAX_ATTEMPTS = 5      # Give up (status 'failed') after this many tries
+MAIL_QUEUE_RETRY_BACKOFF = 30    # Seconds before the first retry, doubled each attempt
+MAIL_QUEUE_POLL_INTERVAL = 5     # Seconds between idle worker polls
+MAIL_QUEUE_CLAIM_TIMEOUT = 300   # Seconds before a message claimed by a dead worker is requeued
+MAIL_QUEUE_REQUEUE_INTERVAL = 60 # Seconds between checks for such messages
+
 # ========================
 # OTP SETTINGS
 # ========================
 OTP_EXPIRY_MINUTES = 5  # OTP validity duration
 OTP_MAX_ATTEMPTS = 5     # Maximum verification attempts
+OTP_RETENTION_HOURS = 24  # Expired/verified OTPs older than this are purged
+OTP_STORE = 'core.otp_store.DatabaseOTPStore'  # or 'core.otp_store.CacheOTPStore'
+OTP_CACHE_ALIAS = 'default'  # Cache used by CacheOTPStore
+
+# Retention purges (manage.py purge_old_records)
+SENT_EMAIL_RETENTION_DAYS = 30      # Development outbox rows
+OUTBOUND_EMAIL_RETENTION_DAYS = 7   # Sent/failed mail queue rows
+RETENTION_CHUNK_SIZE = 500          # Rows per DELETE
+RETENTION_CHUNK_PAUSE = 0.1         # Seconds between chunks, lets other writers in
+
+# ========================
+# DASHBOARD SETTINGS
+# ========================
+DASHBOARD_METRICS_MAX_AGE = 60  # Seconds the home page figures may be stale
+SENTIMENT_POOL_MIN_ROWS = 500   # Smaller sentiment batches are scored inline, without a process pool
+
+# ========================
+# QR CODE SETTINGS
+# ========================
+QR_CACHE = {
+    'BACKEND': 'core.qr.LocMemQRCache',  # or 'core.qr.FileSystemQRCache'
+    'OPTIONS': {'max_entries': 1000},
+}
+QR_HTTP_MAX_AGE = 300  # Seconds clients may reuse a QR image before revalidating
+QR_SHEETS_DIR = BASE_DIR / 'qr_sheets'  # PDFs generated by the customer admin action
+QR_SHEET_JOBS_MAX = 2         # Sheet jobs the admin may run at once
+QR_SHEET_JOB_PROCESSES = 2    # Render processes per job
+QR_SHEET_JOB_TIMEOUT = 300    # Seconds without progress before a job counts as failed
+QR_SHEETS_KEEP_DAYS = 7       # Finished jobs (PDF, log, status) are deleted after this
+QR_SHEET_JOB_COMMAND = None   # argv that runs manage.py; default [sys.executable, BASE_DIR / 'manage.py']
+
+# ========================
+# PROFILING (core.profiling)
+# ========================
+PROFILING_ENABLED = DEBUG     # Record requests for /debug/profiles/ (DEBUG or staff only)
+PROFILING_SAMPLE_RATE = 1.0 if DEBUG else 0.05  # Share of requests recorded
+PROFILING_BUFFER_SIZE = 500   # Requests kept in memory per process
+# NOTE: cProfile runs on the view's NEXT request after one slower than this,
+# not on the slow request itself; None = never profile
+PROFILING_SLOW_MS = 500
+
+# ========================
+# REST API SETTINGS (core.api)
+# ========================
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    # JSON only in production; the browsable API renders templates per request
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'] + (
+        ['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []
+    ),
+}
+API_PAGE_SIZE = 100  # Default page size; clients may ask for up to API_MAX_PAGE_SIZE
+API_MAX_PAGE_SIZE = 5000
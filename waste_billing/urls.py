@@ -6,6 +6,7 @@ from django.conf.urls.static import static
 
 urlpatterns = [
 path('admin/', admin.site.urls),
+path('api/', include('core.api_urls')),
 path('', include('core.urls', namespace='core')),
 ]
 